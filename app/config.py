@@ -4,7 +4,7 @@ Configuration management for the application
 import json
 import os
 from functools import lru_cache
-from typing import List
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 from pydantic import validator
 
@@ -18,15 +18,77 @@ class Settings(BaseSettings):
     tmp_path: str = "./dtmp/"
     upload_tmp_path: str = "./utmp/"
     share_path: str = "./share/"
+    index_path: str = "./index/"
+    sync_path: str = "./staging/"
     port: int = 8000
     log_level: str = "INFO"
+    transfer_chunk_size: int = 262144
+    transfer_pipeline_depth: int = 16
+    transfer_channels: int = 4
+    transfer_parallel_threshold: int = 67108864
+    executor_max_workers: int = 32
+    max_ops_per_connection: int = 4
+    upload_chunk_size: int = 8388608
+    upload_session_ttl: int = 86400
+    dir_cache_ttl: float = 30.0
+    dir_cache_max_entries: int = 256
+    pool_max_sessions: int = 100
+    pool_idle_timeout: int = 1800
+    pool_keepalive_interval: int = 30
+    compression: str = "auto"
+    compression_min_size: int = 1048576
+    compression_max_bandwidth: int = 20971520
+    compression_max_ratio: float = 0.9
+    archive_prefetch_files: int = 4
+    archive_prefetch_blocks: int = 4
+    archive_queue_blocks: int = 16
+    bulk_upload_files: int = 4
+    bulk_upload_queue_blocks: int = 4
+    copy_parallel_files: int = 4
+    relay_buffers: int = 8
+    jobs_max_concurrent: int = 4
+    jobs_host_max_concurrent: int = 2
+    jobs_max_bandwidth: int = 0
+    jobs_host_max_bandwidth: int = 0
+    jobs_small_file_size: int = 16777216
+    jobs_progress_interval: float = 0.5
+    jobs_history_ttl: int = 3600
+    events_flush_interval: float = 0.1
+    events_queue_size: int = 1000
+    events_keepalive: float = 15.0
+    walk_workers: int = 4
+    sync_parallel_files: int = 4
+    metrics_loop_interval: float = 0.5
+    transport_profile: str = "wan"
+    transport_profiles: Dict[str, Dict[str, Any]] = {}
+    transport_host_profiles: Dict[str, str] = {}
+    transport_probe_seconds: float = 1.0
+    transport_probe_bytes: int = 67108864
+    ssh_backend: str = "paramiko"
+    workers: int = 1
+    router_workers: int = 1
+    worker_socket_path: str = "./run/"
     
-    @validator("tmp_path", "upload_tmp_path", "share_path")
+    @validator("tmp_path", "upload_tmp_path", "share_path", "index_path", "sync_path", "worker_socket_path")
     def validate_paths(cls, v):
         """Ensure paths end with a trailing slash"""
         if not v.endswith("/"):
             v = v + "/"
         return v
+    
+    @validator("compression")
+    def validate_compression(cls, v):
+        """Ensure the compression policy is one of off, on or auto"""
+        if v not in ("off", "on", "auto"):
+            raise ValueError("compression must be 'off', 'on' or 'auto'")
+        return v
+    
+    @validator("ssh_backend")
+    def validate_ssh_backend(cls, v):
+        """Ensure the SSH backend is paramiko or asyncssh"""
+        if v not in ("paramiko", "asyncssh"):
+            raise ValueError("ssh_backend must be 'paramiko' or 'asyncssh'")
+        return v
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -1,7 +1,7 @@
 """
 Data models and schemas for request/response validation
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 
 class Client(BaseModel):
@@ -11,6 +11,14 @@ class Client(BaseModel):
     hostIp: str = Field(..., description="Hostname or IP address, optionally with port (e.g. 192.168.1.1:22)")
     username: str = Field(..., description="SSH username")
     password: str = Field(..., description="SSH password")
+    compression: Optional[Literal["off", "on", "auto"]] = Field(
+        None, description="Transport compression policy (default from config)"
+    )
+    transportProfile: Optional[str] = Field(
+        None,
+        description="Transport profile: lan, wan, high-bdp, low-cpu, one defined in config, "
+                    "or auto to tune from the measured link (default from config)"
+    )
 
 class ConnectionInfo(BaseModel):
     """
@@ -35,6 +43,76 @@ class ListFilesRequest(BaseModel):
     hostIp: str = Field(..., description="Hostname or IP address")
     username: str = Field(..., description="Username")
     location: str = Field(..., description="Directory path to list")
+    refresh: bool = Field(False, description="Bypass the directory cache and re-read the listing")
+    stream: bool = Field(False, description="Stream entries as NDJSON while the directory is read")
+    limit: Optional[int] = Field(None, ge=1, le=10000, description="Page size; enables cursor pagination")
+    cursor: Optional[str] = Field(None, description="Cursor returned with the previous page")
+    sortBy: Optional[Literal["name", "size", "mtime", "type"]] = Field(None, description="Sort field")
+    order: Literal["asc", "desc"] = Field("asc", description="Sort order")
+    pattern: Optional[str] = Field(None, description="Glob matched against entry names, e.g. *.log")
+    fileType: Optional[Literal["file", "dir"]] = Field(None, description="Only return files or directories")
+    minSize: Optional[int] = Field(None, ge=0, description="Minimum size in bytes")
+    maxSize: Optional[int] = Field(None, ge=0, description="Maximum size in bytes")
+    mtimeAfter: Optional[float] = Field(None, description="Only entries modified at or after this Unix time")
+    mtimeBefore: Optional[float] = Field(None, description="Only entries modified at or before this Unix time")
+
+class SearchRequest(BaseModel):
+    """
+    Request model for searching a remote directory tree
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    location: str = Field(..., description="Directory to search below")
+    pattern: Optional[str] = Field(None, description="Glob matched against entry names, e.g. *.log")
+    fileType: Optional[Literal["file", "dir"]] = Field(None, description="Only return files or directories")
+    minSize: Optional[int] = Field(None, ge=0, description="Minimum size in bytes")
+    maxSize: Optional[int] = Field(None, ge=0, description="Maximum size in bytes")
+    mtimeAfter: Optional[float] = Field(None, description="Only entries modified at or after this Unix time")
+    mtimeBefore: Optional[float] = Field(None, description="Only entries modified at or before this Unix time")
+    maxDepth: Optional[int] = Field(None, ge=1, description="Deepest level to search, 1 being the directory itself")
+    limit: Optional[int] = Field(None, ge=1, description="Stop after this many matches")
+    method: Literal["auto", "exec", "sftp"] = Field(
+        "auto", description="Remote find, parallel SFTP walk, or find when available"
+    )
+
+class DiskUsageRequest(BaseModel):
+    """
+    Request model for the total size of a remote directory tree
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    location: str = Field(..., description="Directory to measure")
+    maxDepth: Optional[int] = Field(None, ge=1, description="Deepest level to count")
+    top: int = Field(10, ge=0, le=1000, description="Number of largest files to report")
+    method: Literal["auto", "exec", "sftp"] = Field(
+        "auto", description="Remote find, parallel SFTP walk, or find when available"
+    )
+
+class IndexCrawlRequest(BaseModel):
+    """
+    Request model for indexing a remote directory tree
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    location: str = Field(..., description="Directory to index")
+    full: bool = Field(False, description="Relist every directory, not only those whose mtime changed")
+
+class IndexSearchRequest(BaseModel):
+    """
+    Request model for searching the metadata index
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    location: str = Field("/", description="Directory to search below")
+    pattern: Optional[str] = Field(None, description="Glob matched against entry names, e.g. *.log")
+    fileType: Optional[Literal["file", "dir"]] = Field(None, description="Only return files or directories")
+    minSize: Optional[int] = Field(None, ge=0, description="Minimum size in bytes")
+    maxSize: Optional[int] = Field(None, ge=0, description="Maximum size in bytes")
+    mtimeAfter: Optional[float] = Field(None, description="Only entries modified at or after this Unix time")
+    mtimeBefore: Optional[float] = Field(None, description="Only entries modified at or before this Unix time")
+    sortBy: Optional[Literal["name", "path", "size", "mtime"]] = Field(None, description="Sort field")
+    descending: bool = Field(False, description="Sort in descending order")
+    limit: int = Field(1000, ge=1, le=100000, description="Maximum number of entries to return")
 
 class GetFileRequest(BaseModel):
     """
@@ -43,6 +121,7 @@ class GetFileRequest(BaseModel):
     hostIp: str = Field(..., description="Hostname or IP address")
     username: str = Field(..., description="Username")
     remotePath: str = Field(..., description="Path to the remote file")
+    stream: bool = Field(True, description="Stream directly from the remote file instead of staging it in tmp_path")
 
 class GetFileAfterRequest(BaseModel):
     """
@@ -59,6 +138,57 @@ class PathOperationRequest(BaseModel):
     oldPath: str = Field(..., description="Source path")
     newPath: str = Field(..., description="Destination path")
 
+class TransferRequest(BaseModel):
+    """
+    Request model for transferring a file between two logged-in hosts
+    """
+    hostIp: str = Field(..., description="Source hostname or IP address")
+    username: str = Field(..., description="Source username")
+    path: str = Field(..., description="Path to the source file")
+    destHostIp: str = Field(..., description="Destination hostname or IP address")
+    destUsername: str = Field(..., description="Destination username")
+    destPath: str = Field(..., description="Destination file path, or an existing directory to copy into")
+    progress: bool = Field(False, description="Stream NDJSON progress lines while the file is transferred")
+
+class SyncRequest(BaseModel):
+    """
+    Request model for synchronizing a staging directory to a remote directory
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    source: str = Field(..., description="Local directory, relative to the staging area")
+    destination: str = Field(..., description="Remote directory to update")
+    checksum: bool = Field(False, description="Compare files of equal size by SHA-256 instead of mtime")
+    delete: bool = Field(False, description="Delete remote entries missing from the source")
+    dryRun: bool = Field(False, description="Only report the planned operations")
+
+class JobRequest(BaseModel):
+    """
+    Request model for queueing a background transfer job
+    """
+    kind: Literal["download", "transfer"] = Field(
+        ..., description="'download' fetches the file into the share directory, 'transfer' copies it to another host"
+    )
+    hostIp: str = Field(..., description="Source hostname or IP address")
+    username: str = Field(..., description="Source username")
+    path: str = Field(..., description="Path to the source file")
+    destHostIp: Optional[str] = Field(None, description="Destination hostname or IP address (transfer only)")
+    destUsername: Optional[str] = Field(None, description="Destination username (transfer only)")
+    destPath: Optional[str] = Field(None, description="Destination file path or existing directory (transfer only)")
+    priority: Optional[Literal["high", "normal", "low"]] = Field(
+        None, description="Queue lane (default: 'high' for small files, 'normal' otherwise)"
+    )
+
+class UploadInitRequest(BaseModel):
+    """
+    Request model for starting a resumable chunked upload
+    """
+    hostIp: str = Field(..., description="Hostname or IP address")
+    username: str = Field(..., description="Username")
+    location: str = Field(..., description="Upload destination directory")
+    fileName: str = Field(..., description="Name of the file being uploaded")
+    size: int = Field(..., ge=0, description="Total file size in bytes")
+
 class FileInfo(BaseModel):
     """
     File or directory information model
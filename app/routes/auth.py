@@ -2,12 +2,15 @@
 Authentication routes for the SFTP client
 """
 from fastapi import APIRouter, HTTPException, Depends
+from app.config import get_settings
 from app.models.schemas import Client, ConnectionInfo
 from app.services.client_manager import client_manager
+from app.services.executor import run_blocking
 from app.utils.response import success_response, error_response
 from app.utils.logger import get_logger
 
 logger = get_logger()
+settings = get_settings()
 router = APIRouter(tags=["Authentication"])
 
 @router.post("/login", summary="Login to SSH server")
@@ -23,17 +26,31 @@ async def login(client: Client):
     """
     try:
         # Attempt to create SSH client
-        key, ssh_client = client_manager.add_client(
-            client.hostIp, 
-            client.username, 
-            client.password
-        )
+        if settings.ssh_backend == "asyncssh":
+            key, ssh_client = await client_manager.add_async_client(
+                client.hostIp,
+                client.username,
+                client.password,
+                client.compression,
+                client.transportProfile
+            )
+        else:
+            key, ssh_client = await run_blocking(
+                None,
+                client_manager.add_client,
+                client.hostIp, 
+                client.username, 
+                client.password,
+                client.compression,
+                client.transportProfile
+            )
         
         # Create response data
         connection_info = {
             "key": key,
             "hostIp": client.hostIp,
-            "username": client.username
+            "username": client.username,
+            "transport": ssh_client.transport_info()
         }
         
         logger.info(f"Successful login: {client.username}@{client.hostIp}")
@@ -56,7 +73,7 @@ async def logout(client: ConnectionInfo):
     """
     try:
         # Remove the client
-        if client_manager.remove_client(client.key):
+        if await run_blocking(None, client_manager.remove_client, client.key):
             logger.info(f"Successful logout: {client.username}@{client.hostIp}")
             return success_response(message="Logout successful")
         else:
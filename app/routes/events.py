@@ -0,0 +1,59 @@
+"""
+Server-sent event routes for the SFTP client
+"""
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.client_manager import client_manager
+from app.services.event_hub import encode_event, event_hub
+from app.services.transfer_jobs import transfer_scheduler
+from app.utils.response import error_response
+from app.utils.logger import get_logger
+
+logger = get_logger()
+router = APIRouter(tags=["Events"])
+
+@router.get("/events", summary="Subscribe to live session events")
+async def events(
+    hostIp: str = Query(..., description="Hostname or IP address"),
+    username: str = Query(..., description="Username")
+):
+    """
+    Stream the events of a login session as Server-Sent Events
+
+    Event types:
+        job: State, progress, throughput and ETA of a background transfer
+            that reads from or writes to this session
+        upload: Received/missing ranges after each chunk of a chunked upload
+        dir: A directory was changed through this session; 'path' is the
+            directory and 'recursive' marks changes to a whole tree
+        overflow: The client fell behind and events were dropped; it should
+            reload its state
+
+    The stream starts with the current state of the session's active jobs,
+    so a reconnecting client is up to date without polling.
+
+    Args:
+        hostIp: Hostname or IP address of the session
+        username: Username of the session
+
+    Returns:
+        text/event-stream response
+    """
+    ssh_client = client_manager.get_client(hostIp, username)
+
+    if not ssh_client:
+        logger.warning(f"Client not found: {username}@{hostIp}")
+        return error_response("Not logged in")
+
+    initial = [
+        encode_event("job", job.to_dict())
+        for job in transfer_scheduler.list(hostIp, username)
+        if not job.done
+    ]
+
+    return StreamingResponse(
+        event_hub.stream([ssh_client.key], initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
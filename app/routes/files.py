@@ -3,21 +3,46 @@ File operation routes for the SFTP client
 """
 import os
 import json
+import asyncio
+import tarfile
+import stat
+import uuid
+import posixpath
 import mimetypes
-from typing import Optional
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, BackgroundTasks
-from fastapi.responses import FileResponse
+from typing import Literal, Optional
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Form, Request, BackgroundTasks, Query
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 from pydantic import ValidationError
+from starlette.background import BackgroundTask
 
 from app.models.schemas import (
     ListFilesRequest, 
     GetFileRequest, 
     PathRequest, 
     PathOperationRequest,
+    SearchRequest,
+    DiskUsageRequest,
+    TransferRequest,
+    SyncRequest,
     UploadParams
 )
+from app.services.archive import ARCHIVE_FORMATS, EXEC_FORMATS, archive_name, stream_archive
+from app.services.bulk_upload import TAR_MEDIA_TYPES, BulkUploader, unpack_tar
 from app.services.client_manager import client_manager
+from app.services.dir_sync import DirectorySync, staging_path
+from app.services.executor import run_blocking, iterate_blocking
+from app.services.listing import ListingQuery, InvalidCursor, filter_entries, sort_entries, paginate
+from app.services.remote_search import batched, disk_usage, tree_entries
 from app.utils.response import success_response, error_response
+from app.utils.http_range import (
+    make_etag,
+    make_last_modified,
+    if_range_matches,
+    parse_range_header,
+    RangeNotSatisfiable
+)
+from app.utils.streaming_form import iter_multipart, MultipartStreamError, PART_BEGIN, PART_DATA, PART_END
 from app.utils.logger import get_logger
 from app.config import get_settings
 
@@ -25,6 +50,9 @@ logger = get_logger()
 router = APIRouter(tags=["File Operations"])
 settings = get_settings()
 
+# Minimum seconds between two progress lines of a streamed transfer
+TRANSFER_PROGRESS_INTERVAL = 0.5
+
 def cleanup_temp_file(file_path: str):
     """
     Background task to clean up temporary files
@@ -36,16 +64,69 @@ def cleanup_temp_file(file_path: str):
     except Exception as e:
         logger.error(f"Error cleaning up file {file_path}: {str(e)}")
 
+def content_disposition(file_name: str) -> str:
+    """
+    Build an attachment Content-Disposition header value for a file name
+    """
+    quoted = quote(file_name)
+    if quoted != file_name:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{file_name}"'
+
+def _listing_query(request: ListFilesRequest) -> ListingQuery:
+    """
+    Build the filter and sort options of a listing request
+    """
+    return ListingQuery(
+        pattern=request.pattern,
+        file_type=request.fileType,
+        min_size=request.minSize,
+        max_size=request.maxSize,
+        mtime_after=request.mtimeAfter,
+        mtime_before=request.mtimeBefore,
+        sort_by=request.sortBy,
+        descending=request.order == "desc"
+    )
+
+async def _stream_listing(ssh_client, batches, query: ListingQuery, limit: Optional[int]):
+    """
+    Encode streamed listing batches as NDJSON, one entry per line
+    """
+    sent = 0
+    stream = iterate_blocking(ssh_client, batches)
+    try:
+        async for batch in stream:
+            lines = []
+            for entry in filter_entries(batch, query):
+                lines.append(json.dumps(entry.to_dict()))
+                sent += 1
+                if limit is not None and sent >= limit:
+                    break
+            if lines:
+                yield ("\n".join(lines) + "\n").encode()
+            if limit is not None and sent >= limit:
+                return
+    finally:
+        # Stop the scan now rather than when the generator is collected,
+        # which would wait for its walker threads on the event loop
+        await stream.aclose()
+
 @router.post("/listFiles", summary="List files in a directory")
 async def list_files(request: ListFilesRequest):
     """
     List files and directories in a specified path
     
+    Without paging options the whole listing is returned as before. With
+    ``limit`` the filtered, sorted listing is returned one page at a time
+    together with a cursor for the next page. With ``stream`` entries are
+    sent as NDJSON while the directory is still being read; sorting is not
+    applied in that mode.
+    
     Args:
-        request: ListFilesRequest with connection and path information
+        request: ListFilesRequest with connection, path and listing options
         
     Returns:
-        List of file and directory information
+        List of file and directory information, a page of it, or an NDJSON stream
     """
     try:
         # Get the client
@@ -54,13 +135,53 @@ async def list_files(request: ListFilesRequest):
         if not ssh_client:
             logger.warning(f"Client not found: {request.username}@{request.hostIp}")
             return error_response("Not logged in")
+        
+        query = _listing_query(request)
             
         # Get file listing
         try:
-            all_files = ssh_client.get_all_files_in_remote_dir(request.location)
+            if request.stream:
+                batches = await run_blocking(ssh_client, ssh_client.open_dir_stream, request.location)
+                logger.info(f"Streaming listing of {request.location}")
+                return StreamingResponse(
+                    _stream_listing(ssh_client, batches, query, request.limit),
+                    media_type="application/x-ndjson"
+                )
+            
+            if request.limit is None and not query.has_filters and not query.sort_by:
+                all_files = await run_blocking(
+                    ssh_client,
+                    ssh_client.get_all_files_in_remote_dir,
+                    request.location,
+                    use_cache=not request.refresh
+                )
+                
+                logger.info(f"Listed {len(all_files)} files in {request.location}")
+                return success_response(all_files)
+            
+            entries = await run_blocking(
+                ssh_client,
+                ssh_client.list_dir_entries,
+                request.location,
+                use_cache=not request.refresh
+            )
+            
+            if request.limit is None:
+                matched = sort_entries(entries, query)
+                logger.info(f"Listed {len(matched)} of {len(entries)} files in {request.location}")
+                return success_response([entry.to_dict() for entry in matched])
             
-            logger.info(f"Listed {len(all_files)} files in {request.location}")
-            return success_response(all_files)
+            try:
+                page, next_cursor, total = paginate(entries, query, request.cursor, request.limit)
+            except InvalidCursor as e:
+                return error_response(str(e), [])
+            
+            logger.info(f"Listed {len(page)} of {total} files in {request.location}")
+            return success_response({
+                "items": [entry.to_dict() for entry in page],
+                "nextCursor": next_cursor,
+                "total": total
+            })
             
         except PermissionError:
             logger.error(f"Permission denied accessing {request.location}")
@@ -74,6 +195,102 @@ async def list_files(request: ListFilesRequest):
         logger.error(f"Error listing files in {request.location}: {str(e)}")
         return error_response(str(e), [])
 
+@router.post("/search", summary="Search a directory tree")
+async def search(request: SearchRequest):
+    """
+    Find files and directories anywhere below a directory
+    
+    Matches are streamed as NDJSON, in no particular order, while the tree
+    is still being scanned. The scan uses a remote ``find`` when the server
+    allows it and a parallel SFTP walk otherwise.
+    
+    Args:
+        request: SearchRequest with the directory, filters and limits
+        
+    Returns:
+        NDJSON stream of matching entries
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+        
+        # Tree scans run on paramiko channels; the asyncssh client has no equivalent
+        if ssh_client.backend != "paramiko":
+            return error_response(f"search is not supported by the {ssh_client.backend} backend", [])
+        
+        query = ListingQuery(
+            pattern=request.pattern,
+            file_type=request.fileType,
+            min_size=request.minSize,
+            max_size=request.maxSize,
+            mtime_after=request.mtimeAfter,
+            mtime_before=request.mtimeBefore
+        )
+        entries = await run_blocking(
+            ssh_client,
+            tree_entries,
+            ssh_client,
+            request.location,
+            request.maxDepth,
+            request.fileType,
+            request.pattern,
+            request.method
+        )
+        
+        logger.info(f"Searching {request.location} for {request.pattern or '*'}")
+        return StreamingResponse(
+            _stream_listing(ssh_client, batched(entries), query, request.limit),
+            media_type="application/x-ndjson"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error searching {request.location}: {str(e)}")
+        return error_response(str(e), [])
+
+@router.post("/du", summary="Measure the size of a directory tree")
+async def du(request: DiskUsageRequest):
+    """
+    Add up file sizes below a directory, per child and in total
+    
+    Args:
+        request: DiskUsageRequest with the directory and options
+        
+    Returns:
+        Total size and counts, the sizes of the directory's children
+        (largest first) and the largest files
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+        
+        # Tree scans run on paramiko channels; the asyncssh client has no equivalent
+        if ssh_client.backend != "paramiko":
+            return error_response(f"du is not supported by the {ssh_client.backend} backend")
+        
+        summary = await run_blocking(
+            ssh_client,
+            disk_usage,
+            ssh_client,
+            request.location,
+            request.maxDepth,
+            request.top,
+            request.method
+        )
+        logger.info(f"Measured {summary['path']}: {summary['size']} bytes in {summary['files']} files")
+        return success_response(summary)
+        
+    except Exception as e:
+        logger.error(f"Error measuring {request.location}: {str(e)}")
+        return error_response(str(e))
+
 @router.post("/getFile", summary="Download a file")
 async def get_file(request: GetFileRequest, background_tasks: BackgroundTasks):
     """
@@ -98,8 +315,34 @@ async def get_file(request: GetFileRequest, background_tasks: BackgroundTasks):
         pos = request.remotePath.rfind('/')
         file_name = request.remotePath[pos:]
         
+        # Stream straight from the remote file without a temp copy
+        if request.stream:
+            try:
+                reader = await run_blocking(ssh_client, ssh_client.open_reader, request.remotePath)
+            except IOError as e:
+                logger.error(f"Failed to open {request.remotePath}: {str(e)}")
+                return error_response("Failed to download file")
+            
+            content_type = mimetypes.guess_type(request.remotePath)[0]
+            if not content_type:
+                content_type = "application/octet-stream"
+            
+            logger.info(f"Streaming {request.remotePath} ({reader.size} bytes)")
+            
+            return StreamingResponse(
+                iterate_blocking(ssh_client, reader),
+                media_type=content_type,
+                headers={
+                    "Content-Disposition": content_disposition(file_name.lstrip('/')),
+                    "Content-Length": str(reader.length)
+                },
+                # iterate_blocking closes the reader; this covers a response
+                # cancelled before its body was ever iterated
+                background=BackgroundTask(run_blocking, ssh_client, reader.close)
+            )
+        
         # Download the file
-        success = ssh_client.get_file(request.remotePath, settings.tmp_path)
+        success = await run_blocking(ssh_client, ssh_client.get_file, request.remotePath, settings.tmp_path)
         
         if not success:
             logger.error(f"Failed to download {request.remotePath}")
@@ -130,18 +373,221 @@ async def get_file(request: GetFileRequest, background_tasks: BackgroundTasks):
         logger.error(f"Error downloading {request.remotePath}: {str(e)}")
         return error_response(str(e))
 
+async def _stream_ranges(ssh_client, remote_path: str, ranges, boundary: str, content_type: str, size: int):
+    """
+    Stream several byte ranges of a remote file as multipart/byteranges
+    """
+    for start, end in ranges:
+        yield _byterange_part_header(boundary, content_type, start, end, size)
+        reader = await run_blocking(ssh_client, ssh_client.open_reader, remote_path, start, end - start + 1)
+        try:
+            async for chunk in iterate_blocking(ssh_client, reader):
+                yield chunk
+        finally:
+            await run_blocking(ssh_client, reader.close)
+        yield b"\r\n"
+    yield f"--{boundary}--\r\n".encode()
+
+def _byterange_part_header(boundary: str, content_type: str, start: int, end: int, size: int) -> bytes:
+    """
+    Build the header block that precedes one part of a multipart/byteranges body
+    """
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+    ).encode()
+
+@router.api_route("/download", methods=["GET", "HEAD"], summary="Download a file with HTTP Range support")
+async def download(
+    request: Request,
+    hostIp: str = Query(..., description="Hostname or IP address"),
+    username: str = Query(..., description="Username"),
+    path: str = Query(..., description="Path to the remote file")
+):
+    """
+    Download a remote file, honouring Range and If-Range headers
+    
+    Only the requested byte ranges are read from the remote file. The
+    ETag and Last-Modified validators are derived from the remote size and
+    mtime so clients can resume interrupted downloads safely.
+    
+    Args:
+        request: FastAPI request carrying the Range/If-Range headers
+        hostIp: Hostname or IP address
+        username: Username
+        path: Path to the remote file
+        
+    Returns:
+        Full (200), partial (206) or unsatisfiable (416) file response
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(hostIp, username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {username}@{hostIp}")
+            return JSONResponse(error_response("Not logged in"), status_code=401)
+        
+        try:
+            attributes = await run_blocking(ssh_client, ssh_client.stat_file, path)
+        except IOError as e:
+            logger.error(f"Failed to stat {path}: {str(e)}")
+            return JSONResponse(error_response("File not found"), status_code=404)
+        
+        if stat.S_ISDIR(attributes.st_mode):
+            return JSONResponse(error_response("Path is a directory"), status_code=400)
+        
+        size = attributes.st_size
+        etag = make_etag(size, attributes.st_mtime)
+        last_modified = make_last_modified(attributes.st_mtime)
+        file_name = posixpath.basename(path)
+        content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Last-Modified": last_modified,
+            "Content-Disposition": content_disposition(file_name)
+        }
+        
+        # Work out which bytes to send
+        ranges = None
+        if if_range_matches(request.headers.get("if-range"), etag, last_modified):
+            try:
+                ranges = parse_range_header(request.headers.get("range"), size)
+            except RangeNotSatisfiable:
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+        
+        if ranges is None:
+            status_code = 200
+            offset, length = 0, size
+            headers["Content-Length"] = str(size)
+        elif len(ranges) == 1:
+            status_code = 206
+            start, end = ranges[0]
+            offset, length = start, end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(length)
+        else:
+            status_code = 206
+            boundary = uuid.uuid4().hex
+            body_length = len(f"--{boundary}--\r\n") + sum(
+                len(_byterange_part_header(boundary, content_type, start, end, size)) + (end - start + 1) + 2
+                for start, end in ranges
+            )
+            headers["Content-Length"] = str(body_length)
+            media_type = f"multipart/byteranges; boundary={boundary}"
+            
+            if request.method == "HEAD":
+                return Response(status_code=status_code, headers=headers, media_type=media_type)
+            
+            logger.info(f"Streaming {len(ranges)} ranges of {path}")
+            return StreamingResponse(
+                _stream_ranges(ssh_client, path, ranges, boundary, content_type, size),
+                status_code=status_code,
+                media_type=media_type,
+                headers=headers
+            )
+        
+        if request.method == "HEAD":
+            return Response(status_code=status_code, headers=headers, media_type=content_type)
+        
+        reader = await run_blocking(ssh_client, ssh_client.open_reader, path, offset, length)
+        
+        logger.info(f"Streaming {path} bytes {offset}-{offset + length - 1} of {size}")
+        return StreamingResponse(
+            iterate_blocking(ssh_client, reader),
+            status_code=status_code,
+            media_type=content_type,
+            headers=headers,
+            # iterate_blocking closes the reader; this covers a response
+            # cancelled before its body was ever iterated
+            background=BackgroundTask(run_blocking, ssh_client, reader.close)
+        )
+        
+    except Exception as e:
+        logger.error(f"Error downloading {path}: {str(e)}")
+        return JSONResponse(error_response(str(e)), status_code=500)
+
+@router.get("/downloadDir", summary="Download a directory as a streamed archive")
+async def download_dir(
+    hostIp: str = Query(..., description="Hostname or IP address"),
+    username: str = Query(..., description="Username"),
+    path: str = Query(..., description="Path to the remote directory"),
+    format: Literal["zip", "tar", "tgz"] = Query("zip", description="Archive format"),
+    method: Literal["auto", "exec", "sftp"] = Query(
+        "auto", description="Build the archive with remote tar (exec), over SFTP, or pick automatically"
+    )
+):
+    """
+    Download a remote directory tree as a zip, tar or tar.gz archive
+    
+    The archive is streamed while it is being built; nothing is staged in
+    tmp_path. With method 'auto', tar formats are produced by tar on the
+    remote host when it is available, which avoids one SFTP round trip per
+    file.
+    
+    Args:
+        hostIp: Hostname or IP address
+        username: Username
+        path: Path to the remote directory
+        format: Archive format
+        method: How to build the archive
+        
+    Returns:
+        Streaming archive response
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(hostIp, username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {username}@{hostIp}")
+            return JSONResponse(error_response("Not logged in"), status_code=401)
+        
+        if method == "exec" and format not in EXEC_FORMATS:
+            return JSONResponse(error_response("Remote archiving supports tar and tgz only"), status_code=400)
+        
+        try:
+            attributes = await run_blocking(ssh_client, ssh_client.stat_file, path)
+        except IOError as e:
+            logger.error(f"Failed to stat {path}: {str(e)}")
+            return JSONResponse(error_response("Directory not found"), status_code=404)
+        
+        if not stat.S_ISDIR(attributes.st_mode):
+            return JSONResponse(error_response("Path is not a directory"), status_code=400)
+        
+        logger.info(f"Streaming {format} archive of {path}")
+        return StreamingResponse(
+            stream_archive(ssh_client, path, format, method),
+            media_type=ARCHIVE_FORMATS[format][0],
+            headers={"Content-Disposition": content_disposition(archive_name(path, format))}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error archiving {path}: {str(e)}")
+        return JSONResponse(error_response(str(e)), status_code=500)
+
 @router.post("/uploadfile", summary="Upload a file")
-async def upload_file(request: Request, file: UploadFile = File(...)):
+async def upload_file(request: Request):
     """
     Upload a file to the remote server
     
+    The multipart body is parsed as it arrives and each block is written
+    straight into the remote file, so memory use stays fixed regardless of
+    the file size and nothing is staged in upload_tmp_path.
+    
     Args:
-        request: FastAPI request with upload parameters in headers
-        file: File to upload
+        request: FastAPI request with upload parameters in headers and the
+            file in a multipart field named "file"
         
     Returns:
         Success or error message with filename
     """
+    writer = None
+    
     try:
         # Parse upload parameters from headers
         try:
@@ -157,12 +603,6 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
         except (ValidationError, json.JSONDecodeError) as e:
             logger.error(f"Invalid upload parameters: {str(e)}")
             return error_response("Invalid upload parameters")
-        
-        # Get file size from headers
-        try:
-            file_size = int(request.headers.get('file-size', '0'))
-        except ValueError:
-            file_size = 0
             
         # Get the client
         ssh_client = client_manager.get_client(host_ip, username)
@@ -170,31 +610,156 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
         if not ssh_client:
             logger.warning(f"Client not found: {username}@{host_ip}")
             return error_response("Not logged in")
-            
-        # Save file to temporary location
-        local_path = os.path.join(settings.upload_tmp_path, file.filename)
         
-        with open(local_path, 'wb') as f:
-            contents = await file.read()
-            f.write(contents)
+        # Pipe the file part into the remote file as it is received
+        filename = None
+        receiving = False
+        complete = False
+        
+        async for event in iter_multipart(request):
+            if event[0] == PART_BEGIN:
+                receiving = writer is None and event[1] == 'file' and bool(event[2])
+                if receiving:
+                    filename = event[2]
+                    remote_path = f"{location}/{filename}"
+                    writer = await run_blocking(ssh_client, ssh_client.open_writer, remote_path)
+            elif event[0] == PART_DATA and receiving:
+                await run_blocking(ssh_client, writer.write, event[1])
+            elif event[0] == PART_END:
+                complete = complete or receiving
+                receiving = False
+        
+        if writer is None:
+            logger.error("Upload request did not contain a file")
+            return error_response("No file provided")
+        
+        if not complete:
+            logger.error(f"Upload body ended in the middle of {filename}")
+            await run_blocking(ssh_client, writer.abort)
+            return error_response("Incomplete upload body")
+        
+        # Wait for the remaining pipelined writes to be acknowledged
+        await run_blocking(ssh_client, writer.close)
+        
+        logger.info(f"Uploaded {filename} to {writer.remote_path} ({writer.bytes_written} bytes)")
+        return success_response({"filename": filename}, "File uploaded successfully")
+    
+    except MultipartStreamError as e:
+        logger.error(f"Invalid upload body: {str(e)}")
+        if writer is not None:
+            await run_blocking(ssh_client, writer.abort)
+        return error_response("Invalid upload body")
             
-        # Upload to remote server
-        remote_path = f"{location}/{file.filename}"
-        success = ssh_client.put(local_path, remote_path)
+    except Exception as e:
+        logger.error(f"Error uploading file: {str(e)}")
+        if writer is not None:
+            await run_blocking(ssh_client, writer.abort)
+        return error_response(str(e))
+
+@router.post("/uploadBatch", summary="Upload many files at once")
+async def upload_batch(request: Request):
+    """
+    Upload many files, or a tar archive unpacked on the fly, into a directory
+    
+    The body is either multipart/form-data with one "file" part per file,
+    named by its path relative to the location, or a (optionally compressed)
+    tar archive. A multipart body may start with a "manifest" field holding
+    the JSON list of those paths, so that every directory is created before
+    the first file arrives. Files are written concurrently on a bounded
+    number of SFTP channels while the body is still being received.
+    
+    Args:
+        request: FastAPI request with upload parameters in headers
         
-        # Clean up temporary file
-        cleanup_temp_file(local_path)
+    Returns:
+        Per-file results; the response is an error if any file failed
+    """
+    uploader = None
+    incoming = None
+    
+    try:
+        # Parse upload parameters from headers
+        try:
+            upload_params = json.loads(request.headers.get('upload-params', '{}'))
+            params = UploadParams(**upload_params)
+        except (ValidationError, json.JSONDecodeError) as e:
+            logger.error(f"Invalid upload parameters: {str(e)}")
+            return error_response("Invalid upload parameters")
         
-        if success:
-            logger.info(f"Uploaded {file.filename} to {remote_path}")
-            return success_response({"filename": file.filename}, "File uploaded successfully")
+        # Get the client
+        ssh_client = client_manager.get_client(params.hostIp, params.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {params.username}@{params.hostIp}")
+            return error_response("Not logged in")
+        
+        try:
+            uploader = await run_blocking(ssh_client, BulkUploader, ssh_client, params.location)
+        except IOError as e:
+            logger.error(f"Invalid upload location {params.location}: {str(e)}")
+            return error_response("Upload location is not a directory")
+        
+        media_type = request.headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        if media_type in TAR_MEDIA_TYPES:
+            await run_blocking(ssh_client, unpack_tar, uploader, request.stream(), asyncio.get_running_loop())
         else:
-            logger.error(f"Failed to upload {file.filename} to {remote_path}")
-            return error_response("Failed to upload file")
+            manifest = None
+            async for event in iter_multipart(request, keep_paths=True):
+                if event[0] == PART_BEGIN:
+                    if event[1] == 'file' and event[2]:
+                        incoming = await run_blocking(ssh_client, uploader.open_file, event[2])
+                    elif event[1] == 'manifest':
+                        manifest = bytearray()
+                elif event[0] == PART_DATA:
+                    if incoming is not None:
+                        await run_blocking(ssh_client, incoming.write, event[1])
+                    elif manifest is not None:
+                        manifest += event[1]
+                elif event[0] == PART_END:
+                    if incoming is not None:
+                        await run_blocking(ssh_client, incoming.close)
+                        incoming = None
+                    elif manifest is not None:
+                        await run_blocking(ssh_client, uploader.prepare, json.loads(manifest))
+                        manifest = None
             
+            # A file part left open would keep its writer waiting for data
+            if incoming is not None:
+                raise MultipartStreamError("Upload body ended in the middle of a file")
+        
+        summary = await run_blocking(ssh_client, uploader.close)
+        uploader = None
+        
+        logger.info(
+            f"Batch upload to {summary['location']}: {summary['uploaded']} uploaded, "
+            f"{summary['failed']} failed, {summary['skipped']} skipped ({summary['bytes']} bytes)"
+        )
+        if summary['failed']:
+            return error_response(f"{summary['failed']} files failed to upload", summary)
+        return success_response(summary, f"Uploaded {summary['uploaded']} files")
+    
+    except MultipartStreamError as e:
+        logger.error(f"Invalid upload body: {str(e)}")
+        return error_response("Invalid upload body")
+    
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid upload manifest: {str(e)}")
+        return error_response("Invalid upload manifest")
+    
+    except tarfile.TarError as e:
+        logger.error(f"Invalid tar upload: {str(e)}")
+        return error_response("Invalid tar archive")
+    
     except Exception as e:
-        logger.error(f"Error uploading file: {str(e)}")
+        logger.error(f"Error in batch upload: {str(e)}")
         return error_response(str(e))
+    
+    finally:
+        # On failure, drop the file being received and wait for the rest
+        if uploader is not None:
+            if incoming is not None:
+                await run_blocking(ssh_client, incoming.abort)
+            await run_blocking(ssh_client, uploader.close)
 
 @router.post("/mkdir", summary="Create a directory")
 async def mkdir(request: PathRequest):
@@ -216,7 +781,7 @@ async def mkdir(request: PathRequest):
             return error_response("Not logged in")
             
         # Create directory
-        success = ssh_client.mkdir(request.path)
+        success = await run_blocking(ssh_client, ssh_client.mkdir, request.path)
         
         if success:
             logger.info(f"Created directory {request.path}")
@@ -249,7 +814,7 @@ async def remove(request: PathRequest):
             return error_response("Not logged in")
             
         # Remove file or directory
-        success = ssh_client.remove(request.path)
+        success = await run_blocking(ssh_client, ssh_client.remove, request.path)
         
         if success:
             logger.info(f"Removed {request.path}")
@@ -282,7 +847,7 @@ async def rename(request: PathOperationRequest):
             return error_response("Not logged in")
             
         # Rename file or directory
-        success = ssh_client.rename(request.oldPath, request.newPath)
+        success = await run_blocking(ssh_client, ssh_client.rename, request.oldPath, request.newPath)
         
         if success:
             logger.info(f"Renamed {request.oldPath} to {request.newPath}")
@@ -293,4 +858,189 @@ async def rename(request: PathOperationRequest):
             
     except Exception as e:
         logger.error(f"Error renaming {request.oldPath} to {request.newPath}: {str(e)}")
-        return error_response(str(e))
\ No newline at end of file
+        return error_response(str(e))
+
+@router.post("/copy", summary="Copy a file or directory")
+async def copy(request: PathOperationRequest):
+    """
+    Copy a file or directory on the remote server
+    
+    The data is copied on the server (remote cp, or the SFTP copy-data
+    extension) or streamed between two remote files; it never passes
+    through local disk.
+    
+    Args:
+        request: PathOperationRequest with source and destination paths
+        
+    Returns:
+        Success or error message with the copy method used
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+        
+        summary = await run_blocking(ssh_client, ssh_client.copy, request.oldPath, request.newPath)
+        logger.info(f"Copied {request.oldPath} to {request.newPath} ({summary['method']})")
+        return success_response(summary, "File/directory copied successfully")
+        
+    except Exception as e:
+        logger.error(f"Error copying {request.oldPath} to {request.newPath}: {str(e)}")
+        return error_response(str(e))
+
+@router.post("/move", summary="Move a file or directory")
+async def move(request: PathOperationRequest):
+    """
+    Move a file or directory on the remote server, also across filesystems
+    
+    Args:
+        request: PathOperationRequest with source and destination paths
+        
+    Returns:
+        Success or error message with the move method used
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+        
+        summary = await run_blocking(ssh_client, ssh_client.move, request.oldPath, request.newPath)
+        logger.info(f"Moved {request.oldPath} to {request.newPath} ({summary['method']})")
+        return success_response(summary, "File/directory moved successfully")
+        
+    except Exception as e:
+        logger.error(f"Error moving {request.oldPath} to {request.newPath}: {str(e)}")
+        return error_response(str(e))
+
+async def _run_transfer(src_client, dst_client, path: str, dest_path: str, callback=None):
+    """
+    Relay a file between two connections and build the response body
+    """
+    try:
+        size = await run_blocking(src_client, src_client.send_file, dst_client, path, dest_path, callback)
+        logger.info(f"Transferred {path} to {dst_client.username}@{dst_client.ip}:{dest_path} ({size} bytes)")
+        return success_response({"bytes": size, "path": dest_path}, "File transferred successfully")
+    except Exception as e:
+        logger.error(f"Error transferring {path} to {dest_path}: {str(e)}")
+        return error_response(str(e))
+
+async def _stream_transfer(src_client, dst_client, path: str, dest_path: str):
+    """
+    Run a transfer while sending NDJSON progress lines, then the response body
+    """
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+    last_sent = 0.0
+    
+    def on_progress(transferred: int, total: int):
+        nonlocal last_sent
+        now = loop.time()
+        if transferred < total and now - last_sent < TRANSFER_PROGRESS_INTERVAL:
+            return
+        last_sent = now
+        loop.call_soon_threadsafe(updates.put_nowait, {"transferred": transferred, "total": total})
+    
+    # The transfer finishes even if the client stops reading the progress
+    task = asyncio.ensure_future(_run_transfer(src_client, dst_client, path, dest_path, on_progress))
+    task.add_done_callback(lambda _: updates.put_nowait(None))
+    
+    while True:
+        update = await updates.get()
+        if update is None:
+            break
+        yield (json.dumps(update) + "\n").encode()
+    yield (json.dumps(task.result()) + "\n").encode()
+
+@router.post("/transfer", summary="Transfer a file between two hosts")
+async def transfer(request: TransferRequest):
+    """
+    Copy a file from one logged-in host to another
+    
+    The file is streamed directly between the two sessions: reads from the
+    source are pipelined into writes to the destination through a bounded
+    set of buffers, with large files split into parallel ranges. Nothing is
+    staged on local disk.
+    
+    Args:
+        request: TransferRequest with both connections and paths
+        
+    Returns:
+        Success or error message with the bytes transferred, or with
+        ``progress`` an NDJSON stream of progress lines ending with it
+    """
+    try:
+        # Get the clients
+        src_client = client_manager.get_client(request.hostIp, request.username)
+        dst_client = client_manager.get_client(request.destHostIp, request.destUsername)
+        
+        if not src_client or not dst_client:
+            logger.warning(f"Client not found for transfer {request.username}@{request.hostIp} "
+                           f"-> {request.destUsername}@{request.destHostIp}")
+            return error_response("Not logged in")
+        
+        if src_client is dst_client:
+            return error_response("Source and destination are the same connection; use /copy")
+        
+        attr = await run_blocking(src_client, src_client.stat_file, request.path)
+        if not stat.S_ISREG(attr.st_mode):
+            return error_response(f"{request.path} is not a regular file")
+        
+        # Copy into the destination if it is an existing directory
+        dest_path = await run_blocking(
+            dst_client, dst_client.target_path, request.destPath, posixpath.basename(request.path.rstrip('/'))
+        )
+        
+        if request.progress:
+            return StreamingResponse(
+                _stream_transfer(src_client, dst_client, request.path, dest_path),
+                media_type="application/x-ndjson"
+            )
+        
+        return await _run_transfer(src_client, dst_client, request.path, dest_path)
+        
+    except Exception as e:
+        logger.error(f"Error transferring {request.path} to {request.destPath}: {str(e)}")
+        return error_response(str(e))
+
+@router.post("/sync", summary="Synchronize a staging directory to a remote directory")
+async def sync(request: SyncRequest):
+    """
+    Make a remote directory match a directory of the local staging area
+    
+    Only files whose size or mtime differ (or, with ``checksum``, whose
+    contents differ) are uploaded, several at a time. Remote checksums are
+    computed on the server. With ``dryRun`` nothing is changed and the
+    report lists what would be done.
+    
+    Args:
+        request: SyncRequest with the source, destination and options
+        
+    Returns:
+        Report of the planned or performed operations, with any failures
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+        
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+        
+        syncer = DirectorySync(
+            ssh_client, staging_path(request.source), request.destination, request.checksum, request.delete
+        )
+        report = await run_blocking(ssh_client, syncer.run, request.dryRun)
+        
+        if report["failed"]:
+            return error_response(f"{len(report['failed'])} operation(s) failed", report)
+        return success_response(report, "Dry run" if request.dryRun else "Directory synchronized")
+        
+    except Exception as e:
+        logger.error(f"Error synchronizing {request.source} to {request.destination}: {str(e)}")
+        return error_response(str(e))
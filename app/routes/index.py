@@ -0,0 +1,163 @@
+"""
+Metadata index routes for the SFTP client
+"""
+from fastapi import APIRouter, Query
+
+from app.models.schemas import IndexCrawlRequest, IndexSearchRequest
+from app.services.client_manager import client_manager
+from app.services.dir_cache import normalize_dir
+from app.services.executor import run_blocking
+from app.services.metadata_index import index_manager
+from app.utils.response import success_response, error_response
+from app.utils.logger import get_logger
+
+logger = get_logger()
+router = APIRouter(tags=["Metadata Index"])
+
+@router.post("/index/crawl", summary="Index a directory tree in the background")
+async def crawl_index(request: IndexCrawlRequest):
+    """
+    Start a background crawl that adds a tree to the login's metadata index
+
+    The first crawl of a login creates its index. Later crawls only list
+    directories whose mtime changed, unless a full crawl is requested.
+    Progress is reported by GET /index.
+
+    Args:
+        request: IndexCrawlRequest with the directory to index
+
+    Returns:
+        State of the new crawl
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+
+        crawl = index_manager.crawl(ssh_client, request.location, request.full)
+        return success_response(crawl.to_dict(), "Indexing started")
+
+    except Exception as e:
+        logger.error(f"Error starting index crawl of {request.location}: {str(e)}")
+        return error_response(str(e))
+
+@router.get("/index", summary="Get the state of the metadata index")
+async def index_status(
+    hostIp: str = Query(..., description="Hostname or IP address"),
+    username: str = Query(..., description="Username")
+):
+    """
+    Report the indexed roots, entry count and latest crawl of a login
+
+    Args:
+        hostIp: Hostname or IP address of the session
+        username: Username of the session
+
+    Returns:
+        Index statistics, or null if the login has no index
+    """
+    try:
+        ssh_client = client_manager.get_client(hostIp, username)
+
+        if not ssh_client:
+            logger.warning(f"Client not found: {username}@{hostIp}")
+            return error_response("Not logged in")
+
+        index = index_manager.get(ssh_client)
+        if index is None:
+            return success_response(None, "No index")
+
+        stats = await run_blocking(None, index.stats)
+        crawl = index_manager.status(ssh_client)
+        stats["crawl"] = crawl.to_dict() if crawl else None
+        return success_response(stats)
+
+    except Exception as e:
+        logger.error(f"Error reading index of {username}@{hostIp}: {str(e)}")
+        return error_response(str(e))
+
+@router.post("/index/search", summary="Search the metadata index")
+async def search_index(request: IndexSearchRequest):
+    """
+    Find indexed files and directories below a directory
+
+    Answered from the local index without contacting the server, so results
+    are as fresh as the last crawl or listing of each directory.
+
+    Args:
+        request: IndexSearchRequest with the directory, filters and sort
+
+    Returns:
+        Matching entries, plus when the covering root was last crawled
+        (null if the directory lies outside every indexed root)
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+
+        index = index_manager.get(ssh_client)
+        if index is None:
+            return error_response("No index for this login, start a crawl first", [])
+
+        location = normalize_dir(request.location)
+        entries = await run_blocking(
+            None,
+            index.search,
+            location,
+            request.pattern,
+            request.fileType,
+            request.minSize,
+            request.maxSize,
+            request.mtimeAfter,
+            request.mtimeBefore,
+            request.sortBy,
+            request.descending,
+            request.limit
+        )
+
+        root = index.root_for(location)
+        return success_response({
+            "items": [entry.to_dict() for entry in entries],
+            "indexedAt": index.roots[root] if root else None
+        })
+
+    except Exception as e:
+        logger.error(f"Error searching index below {request.location}: {str(e)}")
+        return error_response(str(e), [])
+
+@router.delete("/index", summary="Delete the metadata index")
+async def drop_index(
+    hostIp: str = Query(..., description="Hostname or IP address"),
+    username: str = Query(..., description="Username")
+):
+    """
+    Stop any running crawl and delete the login's index
+
+    Args:
+        hostIp: Hostname or IP address of the session
+        username: Username of the session
+
+    Returns:
+        Success or error message
+    """
+    try:
+        ssh_client = client_manager.get_client(hostIp, username)
+
+        if not ssh_client:
+            logger.warning(f"Client not found: {username}@{hostIp}")
+            return error_response("Not logged in")
+
+        if not await run_blocking(None, index_manager.drop, ssh_client):
+            return error_response("No index")
+        return success_response(message="Index deleted")
+
+    except Exception as e:
+        logger.error(f"Error deleting index of {username}@{hostIp}: {str(e)}")
+        return error_response(str(e))
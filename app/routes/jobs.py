@@ -0,0 +1,171 @@
+"""
+Background transfer job routes for the SFTP client
+"""
+import asyncio
+import json
+import posixpath
+import stat
+from typing import Optional
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.models.schemas import JobRequest
+from app.services.client_manager import client_manager
+from app.services.executor import run_blocking
+from app.services.transfer_jobs import ACTIVE_STATES, transfer_scheduler
+from app.utils.response import success_response, error_response
+from app.utils.logger import get_logger
+
+logger = get_logger()
+router = APIRouter(tags=["Transfer Jobs"])
+
+async def _job_events(job_id: str):
+    """
+    Encode a job's state as NDJSON, one line per change, until it finishes
+    """
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+
+    def on_update(job):
+        if job.id == job_id:
+            loop.call_soon_threadsafe(updates.put_nowait, job.to_dict())
+
+    # Subscribe before taking the first snapshot so no change is missed
+    unsubscribe = transfer_scheduler.subscribe(on_update)
+    try:
+        job = transfer_scheduler.get(job_id)
+        if job is None:
+            return
+        state = job.to_dict()
+        yield (json.dumps(state) + "\n").encode()
+        while state["status"] in ACTIVE_STATES:
+            state = await updates.get()
+            yield (json.dumps(state) + "\n").encode()
+    finally:
+        unsubscribe()
+
+@router.post("/jobs", summary="Queue a background transfer")
+async def create_job(request: JobRequest):
+    """
+    Queue a download into the share directory or a transfer to another host
+
+    The job keeps running when the client goes away. Its state can be
+    polled with GET /jobs/{job_id} or followed with GET /jobs/{job_id}/events.
+
+    Args:
+        request: JobRequest with the source, destination and priority
+
+    Returns:
+        The queued job
+    """
+    try:
+        # Get the clients
+        src_client = client_manager.get_client(request.hostIp, request.username)
+
+        if not src_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+
+        attr = await run_blocking(src_client, src_client.stat_file, request.path)
+        if not stat.S_ISREG(attr.st_mode):
+            return error_response(f"{request.path} is not a regular file")
+
+        source = {"host": request.hostIp, "username": request.username, "path": request.path}
+        destination = None
+
+        if request.kind == "transfer":
+            if not request.destHostIp or not request.destUsername or not request.destPath:
+                return error_response("Transfer jobs need destHostIp, destUsername and destPath")
+
+            dst_client = client_manager.get_client(request.destHostIp, request.destUsername)
+            if not dst_client:
+                logger.warning(f"Client not found: {request.destUsername}@{request.destHostIp}")
+                return error_response("Not logged in")
+            if dst_client is src_client:
+                return error_response("Source and destination are the same connection; use /copy")
+
+            # Copy into the destination if it is an existing directory
+            dest_path = await run_blocking(
+                dst_client, dst_client.target_path, request.destPath, posixpath.basename(request.path.rstrip('/'))
+            )
+            destination = {"host": request.destHostIp, "username": request.destUsername, "path": dest_path}
+
+        job = transfer_scheduler.submit(request.kind, source, destination, attr.st_size, request.priority)
+        return success_response(job.to_dict(), "Job queued")
+
+    except Exception as e:
+        logger.error(f"Error queueing {request.kind} job for {request.path}: {str(e)}")
+        return error_response(str(e))
+
+@router.get("/jobs", summary="List transfer jobs")
+async def list_jobs(
+    hostIp: Optional[str] = Query(None, description="Only jobs involving this host"),
+    username: Optional[str] = Query(None, description="Only jobs involving this user"),
+    status: Optional[str] = Query(None, description="Only jobs in this state")
+):
+    """
+    List queued, running and recently finished jobs
+
+    Returns:
+        Jobs in the order they were queued
+    """
+    jobs = transfer_scheduler.list(hostIp, username, status)
+    return success_response([job.to_dict() for job in jobs])
+
+@router.get("/jobs/{job_id}", summary="Get the state of a transfer job")
+async def get_job(job_id: str):
+    """
+    Report a job's state and progress
+
+    Args:
+        job_id: Job id returned by POST /jobs
+
+    Returns:
+        The job
+    """
+    job = transfer_scheduler.get(job_id)
+    if not job:
+        return error_response("Job not found")
+    return success_response(job.to_dict())
+
+@router.get("/jobs/{job_id}/events", summary="Follow a transfer job")
+async def job_events(job_id: str):
+    """
+    Stream a job's state as NDJSON until it has finished
+
+    The first line is the current state; further lines follow on every
+    state change and, throttled, on progress.
+
+    Args:
+        job_id: Job id returned by POST /jobs
+
+    Returns:
+        NDJSON stream of job states
+    """
+    if not transfer_scheduler.get(job_id):
+        return error_response("Job not found")
+    return StreamingResponse(_job_events(job_id), media_type="application/x-ndjson")
+
+@router.delete("/jobs/{job_id}", summary="Cancel or forget a transfer job")
+async def delete_job(job_id: str):
+    """
+    Cancel an active job, or forget a finished one and delete its output
+
+    A running job stops at its next block and removes its partial file.
+
+    Args:
+        job_id: Job id returned by POST /jobs
+
+    Returns:
+        The job's last state
+    """
+    job = transfer_scheduler.get(job_id)
+    if not job:
+        return error_response("Job not found")
+
+    if job.done:
+        transfer_scheduler.remove(job_id)
+        return success_response(job.to_dict(), "Job removed")
+
+    transfer_scheduler.cancel(job_id)
+    return success_response(job.to_dict(), "Job cancelled")
@@ -1,9 +1,13 @@
 """
 System information routes for the SFTP client
 """
+from datetime import datetime
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
 from app.models.schemas import PathRequest
 from app.services.client_manager import client_manager
+from app.services.executor import run_blocking
+from app.services.metrics import registry
 from app.utils.response import success_response, error_response
 from app.utils.logger import get_logger
 
@@ -30,7 +34,7 @@ async def get_history(request: PathRequest):
             return error_response("Not logged in")
             
         # Get command history
-        history = ssh_client.get_history()
+        history = await run_blocking(ssh_client, ssh_client.get_history)
         
         logger.info(f"Retrieved {len(history)} history entries for {request.username}@{request.hostIp}")
         return success_response(history)
@@ -59,7 +63,7 @@ async def get_df(request: PathRequest):
             return error_response("Not logged in")
             
         # Get disk usage
-        df_info = ssh_client.get_df()
+        df_info = await run_blocking(ssh_client, ssh_client.get_df)
         
         logger.info(f"Retrieved disk usage information for {request.hostIp}")
         return success_response(df_info)
@@ -83,11 +87,17 @@ async def get_status():
         # Create status information
         status = {
             "active_connections": len(clients),
+            "pool": client_manager.get_pool_stats(),
             "connections": [
                 {
                     "host": client.ip,
                     "username": client.username,
-                    "connected_since": "Not implemented"  # Would require tracking connect time
+                    "connected_since": datetime.fromtimestamp(client.connected_at).isoformat(timespec="seconds"),
+                    "last_used": datetime.fromtimestamp(client.last_used).isoformat(timespec="seconds"),
+                    "active_operations": client.active_ops,
+                    "alive": client.is_alive(),
+                    "compression": dict(client.compression.to_dict(), active=client.compression_active),
+                    "transport": client.transport_info()
                 }
                 for key, client in clients.items()
             ]
@@ -98,4 +108,16 @@ async def get_status():
         
     except Exception as e:
         logger.error(f"Error getting status: {str(e)}")
-        return error_response(str(e), {})
\ No newline at end of file
+        return error_response(str(e), {})
+
+@router.get("/metrics", summary="Get metrics in Prometheus format", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Export request and SSH operation latencies, transfer volumes, SFTP
+    round trips, pool occupancy, event-loop lag and temp-dir usage
+    
+    Returns:
+        Prometheus text exposition
+    """
+    body = await run_blocking(None, registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -0,0 +1,210 @@
+"""
+Resumable chunked upload routes for the SFTP client
+"""
+import posixpath
+from fastapi import APIRouter, Request, Query
+from starlette.requests import ClientDisconnect
+
+from app.models.schemas import UploadInitRequest
+from app.services.client_manager import client_manager
+from app.services.event_hub import event_hub
+from app.services.executor import run_blocking
+from app.services.upload_sessions import upload_session_manager
+from app.utils.response import success_response, error_response
+from app.utils.logger import get_logger
+
+logger = get_logger()
+router = APIRouter(tags=["Chunked Uploads"])
+
+def _resolve(upload_id: str):
+    """
+    Look up an upload and the connection that owns it
+
+    Returns:
+        Tuple of (session, ssh_client, error); error is an error response
+        when either is missing
+    """
+    session = upload_session_manager.get(upload_id)
+    if not session:
+        return None, None, error_response("Upload not found")
+
+    ssh_client = client_manager.get_client(session.host_ip, session.username)
+    if not ssh_client:
+        logger.warning(f"Client not found: {session.username}@{session.host_ip}")
+        return session, None, error_response("Not logged in")
+
+    return session, ssh_client, None
+
+@router.post("/upload/init", summary="Start a resumable chunked upload")
+async def init_upload(request: UploadInitRequest):
+    """
+    Create the remote partial file and register a new chunked upload
+
+    Args:
+        request: UploadInitRequest with destination and file size
+
+    Returns:
+        Upload id, chunk size and received/missing ranges
+    """
+    try:
+        # Get the client
+        ssh_client = client_manager.get_client(request.hostIp, request.username)
+
+        if not ssh_client:
+            logger.warning(f"Client not found: {request.username}@{request.hostIp}")
+            return error_response("Not logged in")
+
+        # Clean up partial files left behind by abandoned uploads; the pool
+        # maintenance thread does the same periodically
+        await run_blocking(None, client_manager.expire_uploads)
+
+        file_name = posixpath.basename(request.fileName.replace('\\', '/'))
+        if not file_name:
+            return error_response("Invalid file name")
+
+        remote_path = f"{request.location.rstrip('/')}/{file_name}"
+        session = upload_session_manager.create(request.hostIp, request.username, remote_path, request.size)
+
+        try:
+            await run_blocking(ssh_client, ssh_client.create_file, session.part_path, request.size)
+        except Exception:
+            upload_session_manager.remove(session.id)
+            raise
+
+        return success_response(session.to_dict(), "Upload started")
+
+    except Exception as e:
+        logger.error(f"Error starting upload of {request.fileName}: {str(e)}")
+        return error_response(str(e))
+
+@router.put("/upload/{upload_id}", summary="Upload one chunk at an offset")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk in the file")
+):
+    """
+    Write the raw request body into the remote file at the given offset
+
+    Chunks may arrive in any order and in parallel. Only bytes the server
+    has acknowledged are recorded as received, so a chunk interrupted
+    mid-way can simply be sent again.
+
+    Args:
+        upload_id: Upload id returned by /upload/init
+        request: Request whose body is the chunk data
+        offset: Byte offset of this chunk
+
+    Returns:
+        Updated received/missing ranges
+    """
+    session, ssh_client, error = _resolve(upload_id)
+    if error:
+        return error
+
+    if offset > session.size:
+        return error_response("Offset beyond end of file")
+
+    writer = None
+    try:
+        writer = await run_blocking(ssh_client, ssh_client.open_writer, session.part_path, offset)
+
+        try:
+            async for data in request.stream():
+                if not data:
+                    continue
+                if offset + writer.bytes_written + len(data) > session.size:
+                    await run_blocking(ssh_client, writer.close)
+                    return error_response("Chunk extends beyond end of file")
+                await run_blocking(ssh_client, writer.write, data)
+        except ClientDisconnect:
+            logger.warning(f"Client disconnected during chunk at {offset} of upload {upload_id}")
+
+        # Record only what the server has acknowledged
+        await run_blocking(ssh_client, writer.close)
+        session.add_range(offset, writer.bytes_written)
+
+        state = session.to_dict()
+        event_hub.publish([ssh_client.key], "upload", state, key=f"upload:{upload_id}")
+        return success_response(state)
+
+    except Exception as e:
+        logger.error(f"Error writing chunk at {offset} of upload {upload_id}: {str(e)}")
+        if writer is not None:
+            try:
+                await run_blocking(ssh_client, writer.close)
+            except Exception:
+                pass
+        return error_response(str(e))
+
+@router.get("/upload/{upload_id}", summary="Get the state of a chunked upload")
+async def upload_status(upload_id: str):
+    """
+    Report which byte ranges have been received and which are missing
+
+    Args:
+        upload_id: Upload id returned by /upload/init
+
+    Returns:
+        Received/missing ranges for the upload
+    """
+    session = upload_session_manager.get(upload_id)
+    if not session:
+        return error_response("Upload not found")
+    return success_response(session.to_dict())
+
+@router.post("/upload/{upload_id}/finalize", summary="Complete a chunked upload")
+async def finalize_upload(upload_id: str):
+    """
+    Move a fully received upload into its final location
+
+    Args:
+        upload_id: Upload id returned by /upload/init
+
+    Returns:
+        Success with the final path, or the missing ranges on failure
+    """
+    session, ssh_client, error = _resolve(upload_id)
+    if error:
+        return error
+
+    try:
+        if not session.is_complete():
+            return error_response("Upload incomplete", session.to_dict())
+
+        success = await run_blocking(ssh_client, ssh_client.replace, session.part_path, session.remote_path)
+        if not success:
+            return error_response("Failed to move upload into place")
+
+        upload_session_manager.remove(upload_id)
+        logger.info(f"Completed chunked upload {upload_id} to {session.remote_path}")
+        return success_response(
+            {"filename": posixpath.basename(session.remote_path), "remotePath": session.remote_path},
+            "File uploaded successfully"
+        )
+
+    except Exception as e:
+        logger.error(f"Error finalizing upload {upload_id}: {str(e)}")
+        return error_response(str(e))
+
+@router.delete("/upload/{upload_id}", summary="Abort a chunked upload")
+async def abort_upload(upload_id: str):
+    """
+    Abort an upload and delete its partial remote file
+
+    Args:
+        upload_id: Upload id returned by /upload/init
+
+    Returns:
+        Success or error message
+    """
+    session, ssh_client, error = _resolve(upload_id)
+    if not session:
+        return error
+
+    upload_session_manager.remove(upload_id)
+    if ssh_client:
+        await run_blocking(ssh_client, ssh_client.delete_file, session.part_path)
+
+    logger.info(f"Aborted chunked upload {upload_id}")
+    return success_response(message="Upload aborted")
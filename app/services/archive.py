@@ -0,0 +1,449 @@
+"""
+Streamed tar and zip archives of remote directory trees
+
+The archive is built on a background thread while it is sent to the HTTP
+client. Remote files are read ahead on a bounded number of SFTP channels,
+and both the read-ahead buffers and the output queue are bounded, so memory
+stays flat no matter how large the tree is and nothing is staged on disk.
+When the remote host can run tar, the archive can instead be produced
+server-side and relayed as is.
+"""
+import asyncio
+import posixpath
+import queue
+import shlex
+import tarfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import AsyncIterator, Callable, Deque, Optional, Tuple
+import paramiko
+from app.config import get_settings
+from app.services.compression import is_precompressed
+from app.services.executor import iterate_blocking, run_blocking
+from app.services.remote_io import RemoteFileReader
+from app.services.remote_walk import WalkEntry, walk
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+# Format -> (media type, file extension)
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+    "tgz": ("application/gzip", ".tar.gz"),
+}
+
+# Formats the remote tar command can produce
+EXEC_FORMATS = ("tar", "tgz")
+
+_END = object()
+
+
+class ArchiveCancelled(Exception):
+    """
+    Raised inside the builder when the HTTP client went away
+    """
+
+
+def archive_name(remote_dir: str, fmt: str) -> str:
+    """
+    File name offered to the browser for an archive of a directory
+    """
+    base = posixpath.basename(remote_dir.rstrip('/')) or "root"
+    return base + ARCHIVE_FORMATS[fmt][1]
+
+
+def tar_command(remote_dir: str, fmt: str) -> str:
+    """
+    Build the remote tar command archiving a directory to stdout
+
+    Args:
+        remote_dir: Directory to archive
+        fmt: 'tar' or 'tgz'
+
+    Returns:
+        Shell command string
+    """
+    remote_dir = remote_dir.rstrip('/') or '/'
+    parent, name = posixpath.split(remote_dir)
+    if not name:
+        parent, name = '/', '.'
+    flags = "-czf" if fmt == "tgz" else "-cf"
+    return f"tar -C {shlex.quote(parent or '/')} {flags} - -- {shlex.quote(name)}"
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting archive output into fixed-size blocks
+
+    tarfile and zipfile write many small pieces; they are coalesced into
+    blocks before being handed on. With ``gzip_level`` set the output is
+    gzip-compressed on the way through.
+    """
+    def __init__(self, emit: Callable[[bytes], None], block_size: int, gzip_level: Optional[int] = None):
+        self._emit = emit
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._compressor = None
+        if gzip_level is not None:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def write(self, data) -> int:
+        if self._compressor is not None:
+            self._buffer += self._compressor.compress(data)
+        else:
+            self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._emit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._compressor is not None:
+            self._buffer += self._compressor.flush()
+            self._compressor = None
+        if self._buffer:
+            self._emit(bytes(self._buffer))
+            self._buffer = bytearray()
+
+
+class _PrefetchedFile:
+    """
+    File object over a remote file that is being read ahead on another thread
+
+    Reads never return fewer bytes than the size recorded in the archive
+    header: a file that shrank while being read is padded with zeros, as
+    tar does, so the archive stays well-formed.
+    """
+    def __init__(self, entry: WalkEntry, chunks: "queue.Queue", stopped: threading.Event):
+        self.entry = entry
+        self.remaining = entry.attr.st_size or 0
+        self._chunks = chunks
+        self._stopped = stopped
+        self._buffer = b""
+        self._done = False
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.remaining
+        while len(self._buffer) < size and not self._done:
+            chunk = self._next_chunk()
+            if chunk is _END:
+                self._done = True
+            elif isinstance(chunk, Exception):
+                logger.warning(f"Error reading {self.entry.path} for archive: {str(chunk)}")
+                self._done = True
+            else:
+                self._buffer += chunk
+
+        if len(self._buffer) < size:
+            logger.warning(f"{self.entry.path} shrank while being archived, padding with zeros")
+            self._buffer += b"\0" * (size - len(self._buffer))
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.remaining -= len(data)
+        return data
+
+    def _next_chunk(self):
+        while True:
+            try:
+                return self._chunks.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    raise ArchiveCancelled()
+
+
+class ArchiveBuilder:
+    """
+    Builds an archive of a remote tree on a background thread
+
+    Iterate the builder asynchronously to receive the archive in blocks.
+    The builder thread blocks whenever the output queue is full, so a slow
+    HTTP client throttles the remote reads instead of growing memory.
+    """
+    def __init__(self, ssh_client, remote_dir: str, fmt: str, loop: asyncio.AbstractEventLoop):
+        """
+        Args:
+            ssh_client: Connected SSHClient
+            remote_dir: Directory to archive
+            fmt: One of ARCHIVE_FORMATS
+            loop: Event loop the archive is consumed on
+        """
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unsupported archive format: {fmt}")
+        self.ssh_client = ssh_client
+        self.remote_dir = remote_dir.rstrip('/') or '/'
+        self.fmt = fmt
+        self.files = 0
+        self.bytes_read = 0
+        self.errors = 0
+        self._loop = loop
+        self._output: "asyncio.Queue" = asyncio.Queue(maxsize=settings.archive_queue_blocks)
+        self._cancelled = threading.Event()
+        # Set when the prefetch readers must stop: cancelled or finished
+        self._stopped = threading.Event()
+        # The builder thread's own channel, for the walk and symlink targets
+        self._sftp: Optional[paramiko.SFTPClient] = None
+        self._thread = threading.Thread(target=self._run, name="archive-builder", daemon=True)
+
+    def start(self) -> "ArchiveBuilder":
+        self._thread.start()
+        return self
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """
+        Yield the archive as it is produced
+
+        Raises:
+            Exception: Whatever stopped the builder, after the data produced
+                so far (the HTTP response is then cut short)
+        """
+        try:
+            while True:
+                item = await self._output.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """
+        Stop the builder, e.g. because the HTTP client disconnected
+        """
+        self._cancelled.set()
+        self._stopped.set()
+        # Unblock a builder waiting for room in the output queue
+        while not self._output.empty():
+            self._output.get_nowait()
+
+    def _emit(self, item):
+        """
+        Hand an item to the consumer, waiting while the output queue is full
+        """
+        future = asyncio.run_coroutine_threadsafe(self._output.put(item), self._loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeout:
+                if self._cancelled.is_set():
+                    future.cancel()
+                    raise ArchiveCancelled()
+
+    def _run(self):
+        start = time.monotonic()
+        try:
+            with self.ssh_client.track_operation():
+                self._build()
+            logger.info(
+                f"Archived {self.remote_dir} as {self.fmt}: {self.files} files, "
+                f"{self.bytes_read} bytes, {self.errors} errors in {time.monotonic() - start:.1f}s"
+            )
+            item = _END
+        except ArchiveCancelled:
+            logger.info(f"Archive of {self.remote_dir} cancelled by the client")
+            return
+        except Exception as e:
+            logger.error(f"Error archiving {self.remote_dir}: {str(e)}")
+            item = e
+
+        try:
+            self._emit(item)
+        except ArchiveCancelled:
+            pass
+
+    def _build(self):
+        block_size = settings.transfer_chunk_size
+        if self.fmt == "zip":
+            sink = _ChunkSink(self._emit, block_size)
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                self._add_entries(lambda entry, data: self._add_zip(archive, entry, data))
+        else:
+            sink = _ChunkSink(self._emit, block_size, 6 if self.fmt == "tgz" else None)
+            with tarfile.open(fileobj=sink, mode="w|", format=tarfile.PAX_FORMAT) as archive:
+                self._add_entries(lambda entry, data: self._add_tar(archive, entry, data))
+        sink.close()
+
+    def _add_entries(self, add: Callable[[WalkEntry, Optional[_PrefetchedFile]], None]):
+        """
+        Walk the tree and add every entry, reading files ahead in parallel
+
+        The walk runs on the builder thread's own channel and never shares
+        it with the readers; each reader thread gets its own for the whole
+        build.
+        """
+        workers = max(1, settings.archive_prefetch_files)
+        pending: Deque[Tuple[WalkEntry, Optional[_PrefetchedFile]]] = deque()
+
+        def on_error(path: str, error: Exception):
+            self.errors += 1
+
+        with self.ssh_client.dedicated_channels() as channel, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive-read") as pool:
+            try:
+                self._sftp = channel()
+                for entry in walk(self._sftp, self.remote_dir, on_error):
+                    if self._stopped.is_set():
+                        raise ArchiveCancelled()
+
+                    data = None
+                    if entry.is_file:
+                        chunks = queue.Queue(maxsize=settings.archive_prefetch_blocks)
+                        data = _PrefetchedFile(entry, chunks, self._stopped)
+                        pool.submit(self._prefetch, channel, entry, chunks)
+                    pending.append((entry, data))
+
+                    # Keep at most `workers` files in flight ahead of the writer
+                    while sum(1 for _, d in pending if d is not None) > workers:
+                        add(*pending.popleft())
+
+                while pending:
+                    add(*pending.popleft())
+            finally:
+                # Release readers still feeding files that will not be written
+                self._stopped.set()
+                self._sftp = None
+
+    def _prefetch(self, channel: Callable[[], paramiko.SFTPClient], entry: WalkEntry, chunks: "queue.Queue"):
+        """
+        Read one remote file into its bounded chunk queue
+        """
+        def put(item):
+            while True:
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    if self._stopped.is_set():
+                        raise ArchiveCancelled()
+
+        try:
+            reader = RemoteFileReader(
+                channel(), entry.path, 0, entry.attr.st_size,
+                chunk_size=settings.transfer_chunk_size,
+                pipeline_depth=settings.archive_prefetch_blocks
+            )
+            try:
+                for data in reader:
+                    put(data)
+            finally:
+                reader.close()
+            put(_END)
+        except ArchiveCancelled:
+            pass
+        except Exception as e:
+            try:
+                put(e)
+            except ArchiveCancelled:
+                pass
+
+    def _add_tar(self, archive: tarfile.TarFile, entry: WalkEntry, data: Optional[_PrefetchedFile]):
+        info = tarfile.TarInfo(entry.rel_path)
+        info.mode = (entry.attr.st_mode or 0) & 0o7777
+        info.mtime = entry.attr.st_mtime or 0
+        info.uid = entry.attr.st_uid or 0
+        info.gid = entry.attr.st_gid or 0
+
+        if entry.is_dir:
+            info.type = tarfile.DIRTYPE
+        elif entry.is_link:
+            info.type = tarfile.SYMTYPE
+            try:
+                info.linkname = self._sftp.readlink(entry.path) or ""
+            except IOError as e:
+                logger.warning(f"Cannot read link {entry.path}: {str(e)}")
+                self.errors += 1
+                return
+        elif data is not None:
+            info.size = entry.attr.st_size or 0
+        else:
+            # Sockets, devices and fifos have no content to archive
+            return
+
+        archive.addfile(info, data)
+        self._count(data)
+
+    def _add_zip(self, archive: zipfile.ZipFile, entry: WalkEntry, data: Optional[_PrefetchedFile]):
+        if not (entry.is_dir or data is not None):
+            # zip has no portable symlink or special file entries
+            return
+
+        # zip timestamps cannot predate 1980
+        mtime = time.localtime(max(entry.attr.st_mtime or 0, 315619200))
+        info = zipfile.ZipInfo(entry.rel_path + ('/' if entry.is_dir else ''), mtime[:6])
+        info.external_attr = ((entry.attr.st_mode or 0) & 0xFFFF) << 16
+
+        if entry.is_dir:
+            info.external_attr |= 0x10
+            archive.writestr(info, b"")
+            return
+
+        info.file_size = entry.attr.st_size or 0
+        info.compress_type = zipfile.ZIP_STORED if is_precompressed(entry.path) else zipfile.ZIP_DEFLATED
+        with archive.open(info, "w") as target:
+            while data.remaining > 0:
+                target.write(data.read(min(data.remaining, settings.transfer_chunk_size)))
+        self._count(data)
+
+    def _count(self, data: Optional[_PrefetchedFile]):
+        if data is not None:
+            self.files += 1
+            self.bytes_read += data.entry.attr.st_size or 0
+
+
+async def stream_archive(ssh_client, remote_dir: str, fmt: str, method: str = "auto") -> AsyncIterator[bytes]:
+    """
+    Stream an archive of a remote directory
+
+    With method 'exec' the archive is produced by tar on the remote host and
+    relayed unchanged. 'auto' does the same for tar formats when the host can
+    run tar, and falls back to building the archive over SFTP if tar fails
+    before producing any output. 'sftp' always builds it locally.
+
+    Args:
+        ssh_client: Connected SSHClient
+        remote_dir: Directory to archive
+        fmt: One of ARCHIVE_FORMATS
+        method: 'auto', 'exec' or 'sftp'
+
+    Yields:
+        Blocks of the archive
+    """
+    use_exec = method == "exec" or (
+        method == "auto" and fmt in EXEC_FORMATS
+        and await run_blocking(ssh_client, ssh_client.has_command, "tar")
+    )
+
+    if use_exec:
+        command = await run_blocking(ssh_client, ssh_client.open_command, tar_command(remote_dir, fmt))
+        try:
+            first = await run_blocking(ssh_client, next, command, None)
+            if first is not None:
+                logger.info(f"Streaming {remote_dir} with remote tar")
+                yield first
+                async for data in iterate_blocking(ssh_client, command):
+                    yield data
+                if command.exit_status:
+                    # GNU tar exits with 1 when files changed while being read
+                    logger.warning(f"Remote tar for {remote_dir} exited with {command.exit_status}: {command.stderr}")
+                return
+        finally:
+            command.close()
+
+        if method == "exec":
+            raise IOError(f"Remote tar failed: {command.stderr or command.exit_status}")
+        logger.warning(f"Remote tar failed for {remote_dir} ({command.stderr}), archiving over SFTP")
+
+    builder = ArchiveBuilder(ssh_client, remote_dir, fmt, asyncio.get_running_loop()).start()
+    async for block in builder.stream():
+        yield block
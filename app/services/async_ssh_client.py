@@ -0,0 +1,740 @@
+"""
+asyncio SSH client for file operations, built on asyncssh
+
+An alternative to the paramiko SSHClient selected by settings.ssh_backend.
+Its operations are coroutines that run on the event loop, so an idle or
+waiting session costs no thread and many sessions and transfers multiplex
+on one loop. run_blocking awaits them directly, so routes call both
+backends the same way.
+
+Only the core operations are provided: listing, upload, download (also
+streamed and by range), remove, rename, mkdir, history and disk usage.
+Features built on paramiko's channels (jobs, archives, copies, sync,
+search, the metadata index) raise AttributeError naming the missing
+operation. Search and du scan trees through module functions rather than
+client methods, so their routes check the client's backend instead.
+"""
+import asyncio
+import shlex
+import stat
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+import asyncssh
+from app.config import get_settings
+from app.services.compression import CompressionPolicy
+from app.services.dir_cache import DirectoryCache, normalize_dir
+from app.services.event_hub import event_hub
+from app.services.listing import DirEntry
+from app.services.metrics import ssh_method_seconds, timed, transfer_bytes
+from app.services.transport_profile import AUTO_PROFILE, get_profile
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+
+def _entry(remote_dir: str, name: asyncssh.SFTPName) -> DirEntry:
+    path = f"/{name.filename}" if remote_dir == '/' else f"{remote_dir}/{name.filename}"
+    attrs = name.attrs
+    return DirEntry(name.filename, path, attrs.size or 0, attrs.mtime or 0, stat.S_ISDIR(attrs.permissions or 0))
+
+
+def _io_error(e: asyncssh.SFTPError) -> IOError:
+    """
+    Translate an asyncssh SFTP error into the IOError paramiko would raise
+    """
+    if isinstance(e, asyncssh.SFTPNoSuchFile):
+        return FileNotFoundError(e.reason)
+    if isinstance(e, asyncssh.SFTPPermissionDenied):
+        return PermissionError(e.reason)
+    return IOError(e.reason)
+
+
+class RemoteStat(NamedTuple):
+    """
+    The attributes of a remote file, named like paramiko's SFTPAttributes
+    """
+    st_size: int
+    st_mtime: int
+    st_mode: int
+
+
+class AsyncRemoteFileReader:
+    """
+    Streams a byte range of a remote file with several reads in flight
+
+    Iterate with ``async for``; the file is closed when the range has been
+    delivered or close() is awaited.
+    """
+
+    def __init__(self, remote_file, remote_path: str, size: int, offset: int, length: Optional[int],
+                 host: str, on_close: Optional[Callable[[], None]] = None):
+        self.remote_path = remote_path
+        self.size = size
+        self.offset = min(max(0, offset), size)
+        if length is None:
+            length = size - self.offset
+        self.length = max(0, min(length, size - self.offset))
+        self.bytes_read = 0
+        self._file = remote_file
+        self._on_close = on_close
+        self._bytes_counter = transfer_bytes.labels("download", host)
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._chunks()
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        position = self.offset
+        end = self.offset + self.length
+        pending: Deque[asyncio.Future] = deque()
+        try:
+            while position < end or pending:
+                while position < end and len(pending) < settings.transfer_pipeline_depth:
+                    size = min(settings.transfer_chunk_size, end - position)
+                    pending.append(asyncio.ensure_future(self._file.read(size, position)))
+                    position += size
+
+                data = await pending.popleft()
+                if not data:
+                    logger.warning(f"Unexpected end of file while reading {self.remote_path}")
+                    return
+                self.bytes_read += len(data)
+                self._bytes_counter.inc(len(data))
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+            await self.close()
+
+    async def close(self):
+        """
+        Close the remote file handle
+        """
+        if self._file is None:
+            return
+
+        remote_file, self._file = self._file, None
+        try:
+            await remote_file.close()
+        except Exception as e:
+            logger.error(f"Error closing remote file {self.remote_path}: {str(e)}")
+        finally:
+            if self._on_close:
+                self._on_close()
+
+
+class AsyncRemoteFileWriter:
+    """
+    Sequential writer for a remote file with pipelined writes
+
+    Up to settings.transfer_pipeline_depth writes are awaiting their
+    acknowledgement at a time; close() waits for the rest and raises if any
+    write failed.
+    """
+
+    def __init__(self, remote_file, remote_path: str, offset: int, host: str,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.remote_path = remote_path
+        self.bytes_written = 0
+        self._file = remote_file
+        self._position = offset
+        self._pending: Deque[asyncio.Future] = deque()
+        self._on_close = on_close
+        self._bytes_counter = transfer_bytes.labels("upload", host)
+
+    async def write(self, data: bytes):
+        """
+        Queue data for writing at the current position
+
+        Raises:
+            IOError: If an earlier write failed
+        """
+        if not data:
+            return
+        self._pending.append(asyncio.ensure_future(self._file.write(data, self._position)))
+        self._position += len(data)
+        self.bytes_written += len(data)
+        self._bytes_counter.inc(len(data))
+        while len(self._pending) >= settings.transfer_pipeline_depth:
+            await self._wait_oldest()
+
+    async def _wait_oldest(self):
+        try:
+            await self._pending.popleft()
+        except asyncssh.SFTPError as e:
+            raise _io_error(e)
+
+    async def close(self):
+        """
+        Wait for all writes to be acknowledged and close the file
+
+        Raises:
+            IOError: If any write failed
+        """
+        if self._file is None:
+            return
+        try:
+            while self._pending:
+                await self._wait_oldest()
+        except Exception:
+            await self.abort()
+            raise
+
+        remote_file, self._file = self._file, None
+        try:
+            await remote_file.close()
+        finally:
+            if self._on_close:
+                self._on_close()
+
+    async def abort(self):
+        """
+        Drop outstanding writes and close the file without raising
+        """
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+        remote_file, self._file = self._file, None
+        if remote_file is None:
+            return
+        try:
+            await remote_file.close()
+        except Exception as e:
+            logger.error(f"Error closing remote file {self.remote_path}: {str(e)}")
+        finally:
+            if self._on_close:
+                self._on_close()
+
+
+class AsyncSSHClient:
+    """
+    asyncio SSH client with the core methods of SSHClient as coroutines
+
+    Create instances with the connect() coroutine. close() and keepalive()
+    stay synchronous so the connection pool can call them from its
+    maintenance thread.
+    """
+    backend = "asyncssh"
+
+    def __init__(
+        self,
+        ip: str,
+        port: int = 22,
+        username: str = None,
+        password: str = None,
+        compression: Optional[str] = None,
+        transport_profile: Optional[str] = None
+    ):
+        """
+        Set up an unconnected client; see SSHClient for the arguments
+
+        Raises:
+            ValueError: If the transport profile is invalid
+        """
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.key = f"{ip}:{port}:{username}"
+
+        self.protected_dirs = [
+            '/bin', '/boot', '/dev', '/etc',
+            '/home', '/lib', '/opt', '/proc',
+            '/root', '/sbin', '/tmp', '/usr',
+            '/var'
+        ]
+
+        self.dir_cache = DirectoryCache(
+            settings.dir_cache_max_entries, settings.dir_cache_ttl, on_change=self._publish_dir_change
+        )
+
+        self.connected_at = time.time()
+        self.last_used = self.connected_at
+        self.active_ops = 0
+        self.reconnects = 0
+        # Readers and writers not yet closed
+        self.open_streams = 0
+        # Set by close(); a closed client is never reconnected
+        self._closed = False
+
+        # The window cannot be changed once the SFTP channel is open, so an
+        # auto profile connects with its untuned values
+        self.profile = get_profile(transport_profile, ip, port)
+        self.link_estimate = None
+        # Negotiated once; asyncssh cannot switch compression per transfer
+        self.compression = CompressionPolicy(compression or self.profile.compression)
+
+        self._conn: Optional[asyncssh.SSHClientConnection] = None
+        self._sftp: Optional[asyncssh.SFTPClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connect_lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, *args, **kwargs) -> "AsyncSSHClient":
+        """
+        Create a client and open its connection
+
+        Takes the same arguments as SSHClient.
+
+        Returns:
+            Connected AsyncSSHClient
+        """
+        client = cls(*args, **kwargs)
+        await client._connect()
+        logger.info(f"SSH connection established to {client.ip}:{client.port} as {client.username} (asyncssh)")
+        return client
+
+    async def _connect(self):
+        """
+        Open the connection and the SFTP session
+        """
+        if self.profile.name == AUTO_PROFILE:
+            logger.info("The asyncssh backend does not tune transports, using the untuned auto profile")
+
+        def algorithms(names):
+            # A leading ^ puts the names before asyncssh's other defaults
+            return '^' + ','.join(names) if names else ()
+
+        self._conn = await asyncssh.connect(
+            self.ip,
+            self.port,
+            username=self.username,
+            password=self.password,
+            known_hosts=None,
+            window=self.profile.window_size,
+            max_pktsize=self.profile.max_packet_size,
+            encryption_algs=algorithms(self.profile.ciphers),
+            mac_algs=algorithms(self.profile.macs),
+            kex_algs=algorithms(self.profile.kex),
+            compression_algs='zlib@openssh.com,zlib' if self.compression.mode == 'on' else 'none',
+            keepalive_interval=settings.pool_keepalive_interval
+        )
+        self._sftp = await self._conn.start_sftp_client()
+        self._loop = asyncio.get_running_loop()
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        raise AttributeError(f"{name} is not supported by the asyncssh backend")
+
+    def is_alive(self) -> bool:
+        """
+        Check whether the connection is still open
+        """
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def ensure_connected(self):
+        """
+        Reconnect transparently if the connection has dropped
+
+        Raises:
+            IOError: If the client has been closed, e.g. evicted from the pool
+            Exception: If the reconnect attempt fails
+        """
+        if self.is_alive():
+            return
+
+        async with self._connect_lock:
+            if self.is_alive():
+                return
+            if self._closed:
+                raise IOError(f"Connection to {self.ip}:{self.port} has been closed")
+
+            logger.warning(f"Connection to {self.ip}:{self.port} lost, reconnecting")
+            self._disconnect()
+            await self._connect()
+            self.dir_cache.clear()
+            self.reconnects += 1
+            self.connected_at = time.time()
+            logger.info(f"Reconnected to {self.ip}:{self.port} as {self.username}")
+
+    @property
+    def busy(self) -> bool:
+        """
+        Whether an operation is running or a reader or writer is still open
+        """
+        return self.active_ops > 0 or self.open_streams > 0
+
+    def _stream_closed(self):
+        self.open_streams -= 1
+
+    @asynccontextmanager
+    async def _operation(self):
+        """
+        Mark the connection busy for the duration of an operation
+        """
+        self.active_ops += 1
+        self.last_used = time.time()
+        try:
+            await self.ensure_connected()
+            yield self
+        finally:
+            self.active_ops -= 1
+            self.last_used = time.time()
+
+    def keepalive(self) -> bool:
+        """
+        Report whether the connection is alive
+
+        asyncssh probes the server every settings.pool_keepalive_interval
+        seconds itself and closes the connection if it stops answering.
+        """
+        return self.is_alive()
+
+    @property
+    def compression_active(self) -> bool:
+        return self.is_alive() and self._conn.get_extra_info('send_compression') not in (None, 'none')
+
+    def set_compression(self, mode: str):
+        """
+        Compression is fixed for the lifetime of an asyncssh connection
+        """
+        logger.info(f"Session {self.key} keeps compression {self.compression.mode} with the asyncssh backend")
+
+    def transport_info(self) -> Dict[str, Any]:
+        """
+        Describe the transport profile and the algorithms negotiated
+        """
+        info = self.profile.to_dict()
+        info["backend"] = self.backend
+        info["link"] = None
+        info["negotiated"] = None
+        if self.is_alive():
+            info["negotiated"] = {
+                "cipher": self._conn.get_extra_info('send_cipher'),
+                "mac": self._conn.get_extra_info('send_mac')
+            }
+        return info
+
+    def close(self):
+        """
+        Close the connection for good; safe to call from any thread
+
+        Operations still holding the client fail instead of reconnecting it.
+        """
+        self._closed = True
+        self._disconnect()
+
+    def _disconnect(self):
+        """
+        Close the connection, if open
+        """
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(conn.close)
+            logger.info(f"SSH connection closed for {self.ip}:{self.port}")
+        except RuntimeError:
+            # The event loop has already shut down along with the connection
+            pass
+        except Exception as e:
+            logger.error(f"Error closing SSH connection: {str(e)}")
+
+    def _publish_dir_change(self, path: str, recursive: bool):
+        event_hub.publish(
+            [self.key], "dir", {"path": path, "recursive": recursive},
+            key=f"dir:{path}:{recursive}"
+        )
+
+    async def exec_command(self, command: str) -> Tuple[int, bytes, bytes]:
+        """
+        Run a command on a new session channel
+
+        Returns:
+            Tuple of (exit_status, stdout, stderr)
+        """
+        result = await self._conn.run(command, encoding=None)
+        return result.exit_status or 0, result.stdout or b'', result.stderr or b''
+
+    @timed(ssh_method_seconds)
+    async def list_dir_entries(self, remote_dir: str, use_cache: bool = True) -> List[DirEntry]:
+        """
+        Get the entries of a remote directory
+
+        Args:
+            remote_dir: Path to remote directory
+            use_cache: Serve a fresh cached listing if available
+
+        Returns:
+            List of DirEntry tuples; callers must not modify it
+
+        Raises:
+            PermissionError: If access to the directory is denied
+            FileNotFoundError: If the directory doesn't exist
+        """
+        remote_dir = normalize_dir(remote_dir)
+
+        if use_cache:
+            cached = self.dir_cache.get(remote_dir)
+            if cached is not None:
+                return cached
+
+        async with self._operation():
+            try:
+                names = await self._sftp.readdir(remote_dir)
+            except asyncssh.SFTPNoSuchFile:
+                logger.error(f"Directory not found: {remote_dir}")
+                raise FileNotFoundError(f"Directory not found: {remote_dir}")
+            except asyncssh.SFTPPermissionDenied:
+                logger.error(f"Permission denied accessing directory: {remote_dir}")
+                raise PermissionError(f"Permission denied for {remote_dir}")
+
+        entries = [_entry(remote_dir, name) for name in names if name.filename not in ('.', '..')]
+        self.dir_cache.put(remote_dir, entries)
+        return entries
+
+    async def get_all_files_in_remote_dir(self, remote_dir: str, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Get all files and directories in a remote directory
+
+        Returns:
+            List of dictionaries with file/directory information
+
+        Raises:
+            PermissionError: If access to the directory is denied
+            FileNotFoundError: If the directory doesn't exist
+        """
+        return [entry.to_dict() for entry in await self.list_dir_entries(remote_dir, use_cache)]
+
+    @timed(ssh_method_seconds)
+    async def stat_file(self, remote_path: str) -> RemoteStat:
+        """
+        Get the attributes of a remote file
+
+        Raises:
+            IOError: If the remote file cannot be accessed
+        """
+        async with self._operation():
+            try:
+                attrs = await self._sftp.stat(remote_path)
+            except asyncssh.SFTPError as e:
+                raise _io_error(e)
+        return RemoteStat(attrs.size or 0, attrs.mtime or 0, attrs.permissions or 0)
+
+    async def open_reader(
+        self,
+        remote_path: str,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> AsyncRemoteFileReader:
+        """
+        Open a remote file for streaming without staging it on local disk
+
+        Args:
+            remote_path: Path to file on remote server
+            offset: First byte to read
+            length: Number of bytes to read (default: until end of file)
+
+        Returns:
+            AsyncRemoteFileReader yielding the file contents in chunks
+
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        logger.info(f"Streaming {remote_path}")
+        async with self._operation():
+            try:
+                remote_file = await self._sftp.open(remote_path, 'rb')
+                size = (await remote_file.stat()).size or 0
+            except asyncssh.SFTPError as e:
+                raise _io_error(e)
+
+        self.open_streams += 1
+        return AsyncRemoteFileReader(
+            remote_file, remote_path, size, offset, length, f"{self.ip}:{self.port}",
+            on_close=self._stream_closed
+        )
+
+    async def open_writer(self, remote_path: str, offset: Optional[int] = None) -> AsyncRemoteFileWriter:
+        """
+        Open a remote file for streaming writes without a local temp copy
+
+        Args:
+            remote_path: Destination path on remote server
+            offset: Write into an existing file starting at this byte
+                instead of creating or truncating it
+
+        Returns:
+            AsyncRemoteFileWriter accepting the file contents in order
+
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        logger.debug(f"Streaming upload to {remote_path} at offset {offset or 0}")
+        self.dir_cache.invalidate_parent(remote_path)
+        async with self._operation():
+            try:
+                remote_file = await self._sftp.open(remote_path, 'wb' if offset is None else 'r+b')
+            except asyncssh.SFTPError as e:
+                raise _io_error(e)
+
+        def on_close():
+            self.open_streams -= 1
+            self.dir_cache.invalidate_parent(remote_path)
+
+        self.open_streams += 1
+        return AsyncRemoteFileWriter(remote_file, remote_path, offset or 0, f"{self.ip}:{self.port}", on_close=on_close)
+
+    @timed(ssh_method_seconds)
+    async def put(self, local_path: str, remote_path: str, callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        """
+        Upload a file to the remote server
+
+        asyncssh pipelines the writes and sizes them from the server's
+        advertised limits.
+
+        Returns:
+            True if successful, False otherwise
+        """
+        def progress(source, destination, done, total):
+            callback(done, total)
+
+        try:
+            logger.info(f"Uploading {local_path} to {remote_path}")
+            async with self._operation():
+                await self._sftp.put(local_path, remote_path, progress_handler=progress if callback else None)
+            return True
+        except Exception as e:
+            logger.error(f"Error uploading file: {str(e)}")
+            return False
+        finally:
+            self.dir_cache.invalidate_parent(remote_path)
+
+    @timed(ssh_method_seconds)
+    async def get_file(self, remote_path: str, local_path: str, callback: Optional[Callable[[int, int], None]] = None) -> bool:
+        """
+        Download a file into a local directory, keeping its name
+
+        Returns:
+            True if successful, False otherwise
+        """
+        def progress(source, destination, done, total):
+            callback(done, total)
+
+        try:
+            save_path = local_path.rstrip('/') + remote_path[remote_path.rfind('/'):]
+            logger.info(f"Downloading {remote_path} to {save_path}")
+            async with self._operation():
+                await self._sftp.get(remote_path, save_path, progress_handler=progress if callback else None)
+            return True
+        except Exception as e:
+            logger.error(f"Error downloading file: {str(e)}")
+            return False
+
+    @timed(ssh_method_seconds)
+    async def remove(self, file_path: str) -> bool:
+        """
+        Delete a file or directory on the remote server
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if file_path == '/':
+            logger.warning("Attempted to delete root directory")
+            return False
+
+        for protected_dir in self.protected_dirs:
+            if file_path == protected_dir or file_path.startswith(f"{protected_dir}/"):
+                logger.warning(f"Attempted to delete protected directory: {file_path}")
+                return False
+
+        try:
+            logger.info(f"Removing {file_path}")
+            async with self._operation():
+                exit_status, _, error = await self.exec_command(f'rm -rf {shlex.quote(file_path)}')
+                error = error.decode(errors='replace').strip()
+                if exit_status != 0 or error:
+                    logger.error(f"Error removing {file_path}: {error}, exit status: {exit_status}")
+                    return False
+
+                if await self._sftp.lexists(file_path):
+                    logger.error(f"File still exists after deletion attempt: {file_path}")
+                    return False
+            return True
+        except Exception as e:
+            logger.error(f"Error removing {file_path}: {str(e)}")
+            return False
+        finally:
+            self.dir_cache.invalidate_parent(file_path)
+            self.dir_cache.invalidate_tree(file_path)
+
+    @timed(ssh_method_seconds)
+    async def rename(self, old_path: str, new_path: str) -> bool:
+        """
+        Rename a file or directory on the remote server
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            logger.info(f"Renaming {old_path} to {new_path}")
+            async with self._operation():
+                await self._sftp.rename(old_path, new_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error renaming {old_path} to {new_path}: {str(e)}")
+            return False
+        finally:
+            for path in (old_path, new_path):
+                self.dir_cache.invalidate_parent(path)
+                self.dir_cache.invalidate_tree(path)
+
+    @timed(ssh_method_seconds)
+    async def mkdir(self, dir_path: str) -> bool:
+        """
+        Create a new directory on the remote server
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            logger.info(f"Creating directory {dir_path}")
+            async with self._operation():
+                await self._sftp.mkdir(dir_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error creating directory {dir_path}: {str(e)}")
+            return False
+        finally:
+            self.dir_cache.invalidate_parent(dir_path)
+
+    @timed(ssh_method_seconds)
+    async def get_history(self) -> List[str]:
+        """
+        Get command history from the remote server
+
+        Returns:
+            List of recent commands
+        """
+        try:
+            logger.info(f"Getting command history for {self.username}")
+            async with self._operation():
+                _, output, _ = await self.exec_command("cat ~/.bash_history")
+            return [
+                line.strip() for line in output.decode(errors='replace').splitlines()
+                if line.strip() and not line.strip().startswith('#')
+            ]
+        except Exception as e:
+            logger.error(f"Error getting command history: {str(e)}")
+            return []
+
+    @timed(ssh_method_seconds)
+    async def get_df(self) -> List[str]:
+        """
+        Get disk usage information from the remote server
+
+        Returns:
+            List of disk usage information lines
+        """
+        try:
+            logger.info(f"Getting disk usage for {self.ip}")
+            async with self._operation():
+                _, output, _ = await self.exec_command("df -h")
+            return [line.strip() for line in output.decode(errors='replace').splitlines()]
+        except Exception as e:
+            logger.error(f"Error getting disk usage: {str(e)}")
+            return []
@@ -0,0 +1,366 @@
+"""
+Batch uploads of many files into a remote directory
+
+Per-file overhead dominates uploads of many small files: every file costs
+an open and a close round trip, plus one mkdir per new directory. The
+uploader overlaps that overhead across a bounded number of worker threads,
+each with its own SFTP channel and at most one open remote file, and
+creates every directory exactly once before the first file that needs it.
+"""
+import asyncio
+import posixpath
+import queue
+import stat
+import tarfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import get_settings
+from app.services.remote_io import RemoteFileWriter
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+# Request media types that are unpacked as tar archives
+TAR_MEDIA_TYPES = (
+    "application/x-tar", "application/tar", "application/gzip",
+    "application/x-gzip", "application/x-compressed-tar",
+)
+
+_END = object()
+_ABORT = object()
+
+
+def safe_relative_path(name: str) -> Optional[str]:
+    """
+    Normalize a client-supplied relative path
+
+    Args:
+        name: Path as sent by the client, e.g. a browser's webkitRelativePath
+            or a tar member name
+
+    Returns:
+        The path with '/' separators and no empty or '.' components, or
+        None if it is empty or would escape the destination directory
+    """
+    parts = []
+    for part in name.replace('\\', '/').split('/'):
+        if part in ('', '.'):
+            continue
+        if part == '..':
+            return None
+        parts.append(part)
+    return '/'.join(parts) or None
+
+
+class _IncomingFile:
+    """
+    Handle for one file being uploaded; blocks are written by a worker thread
+    """
+    def __init__(self, blocks: "queue.Queue", result: Dict[str, Any]):
+        self._blocks = blocks
+        self._result = result
+        self._closed = False
+
+    def write(self, data: bytes):
+        """
+        Queue a block for the remote file, waiting while the queue is full
+        """
+        if data and self._result["status"] != "error":
+            self._blocks.put(data)
+
+    def close(self):
+        """
+        Mark the file complete; the worker finishes it in the background
+        """
+        if not self._closed:
+            self._closed = True
+            self._blocks.put(_END)
+
+    def abort(self):
+        """
+        Discard the file; a partially written remote file is removed
+        """
+        if not self._closed:
+            self._closed = True
+            self._blocks.put(_ABORT)
+
+
+class BulkUploader:
+    """
+    Writes many files below one remote directory concurrently
+
+    Files are handed over one after another with open_file(), in whatever
+    order the client sends them. Each one is written by the next free worker
+    while the caller already receives the following files, so the client is
+    only throttled once settings.bulk_upload_files files are in flight.
+    """
+    def __init__(self, ssh_client, location: str):
+        """
+        Args:
+            ssh_client: Connected SSHClient
+            location: Existing remote directory the files are uploaded into
+
+        Raises:
+            IOError: If location does not exist or is not a directory
+        """
+        self.ssh_client = ssh_client
+        self.location = location.rstrip('/') or '/'
+        self.results: List[Dict[str, Any]] = []
+
+        if not stat.S_ISDIR(ssh_client.stat_file(self.location).st_mode):
+            raise IOError(f"{self.location} is not a directory")
+
+        workers = max(1, settings.bulk_upload_files)
+        self._slots = threading.BoundedSemaphore(workers)
+        self._futures: List[Future] = []
+        # Remote directory -> Future resolved once it is known to exist
+        self._dirs: Dict[str, Future] = {self.location: Future()}
+        self._dirs[self.location].set_result(None)
+        self._dirs_lock = threading.Lock()
+
+        self._resources = ExitStack()
+        self._channel = self._resources.enter_context(ssh_client.dedicated_channels())
+        self._pool = self._resources.enter_context(
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-upload")
+        )
+
+    def _remote_path(self, rel_path: str) -> str:
+        return posixpath.join(self.location, rel_path)
+
+    def prepare(self, rel_paths: Iterable[str]):
+        """
+        Create the directories a list of files will need, ahead of the files
+
+        Directories are created level by level, with each level's mkdir
+        requests spread over the workers. Paths that are not safe are
+        ignored here and reported when the file itself arrives.
+
+        Args:
+            rel_paths: Relative paths of the files about to be uploaded
+        """
+        levels: Dict[int, set] = {}
+        for name in rel_paths:
+            rel_path = safe_relative_path(name) if isinstance(name, str) else None
+            if rel_path is None:
+                continue
+            parent = posixpath.dirname(rel_path)
+            while parent:
+                levels.setdefault(parent.count('/'), set()).add(parent)
+                parent = posixpath.dirname(parent)
+
+        for depth in sorted(levels):
+            futures = [
+                self._pool.submit(self._ensure_dir, self._remote_path(rel_dir))
+                for rel_dir in sorted(levels[depth])
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    # The files below it report the error
+                    pass
+
+    def open_file(self, name: str) -> _IncomingFile:
+        """
+        Start uploading a file
+
+        Blocks while settings.bulk_upload_files files are already in flight.
+
+        Args:
+            name: Path of the file relative to the upload location
+
+        Returns:
+            Handle accepting the file contents in order
+        """
+        rel_path = safe_relative_path(name)
+        result = {"path": rel_path or name, "status": "pending", "size": 0}
+        self.results.append(result)
+        blocks = queue.Queue(maxsize=settings.bulk_upload_queue_blocks)
+        incoming = _IncomingFile(blocks, result)
+
+        if rel_path is None:
+            # Writes to a failed file are dropped, so nothing needs a worker
+            result.update(status="error", error="Invalid path")
+            return incoming
+
+        self._slots.acquire()
+        try:
+            self._futures.append(self._pool.submit(self._write, self._remote_path(rel_path), blocks, result))
+        except Exception:
+            self._slots.release()
+            raise
+        return incoming
+
+    def skip(self, name: str, reason: str):
+        """
+        Record an entry that is deliberately not uploaded
+        """
+        self.results.append({"path": name, "status": "skipped", "size": 0, "error": reason})
+
+    def make_dir(self, name: str):
+        """
+        Create an (empty) directory below the upload location
+        """
+        rel_path = safe_relative_path(name)
+        if rel_path is None:
+            self.results.append({"path": name, "status": "error", "size": 0, "error": "Invalid path"})
+            return
+        self._futures.append(self._pool.submit(self._ensure_dir, self._remote_path(rel_path)))
+
+    def _ensure_dir(self, path: str):
+        """
+        Make sure a remote directory exists, creating missing parents first
+
+        Each directory costs one mkdir, shared by every file below it; only
+        a failed mkdir is followed by a stat to tell an existing directory
+        from a real error.
+        """
+        with self._dirs_lock:
+            future = self._dirs.get(path)
+            owner = future is None
+            if owner:
+                future = self._dirs[path] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            self._ensure_dir(posixpath.dirname(path))
+            sftp = self._channel()
+            try:
+                sftp.mkdir(path)
+                self.ssh_client.dir_cache.invalidate_parent(path)
+            except IOError:
+                if not stat.S_ISDIR(sftp.stat(path).st_mode):
+                    raise IOError(f"{path} exists and is not a directory")
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+
+    def _write(self, remote_path: str, blocks: "queue.Queue", result: Dict[str, Any]):
+        """
+        Worker: write one file from its block queue
+        """
+        writer = None
+        block = None
+        try:
+            with self.ssh_client.track_operation():
+                self._ensure_dir(posixpath.dirname(remote_path))
+                writer = RemoteFileWriter(self._channel(), remote_path)
+                while True:
+                    block = blocks.get()
+                    if block is _END:
+                        break
+                    if block is _ABORT:
+                        raise IOError("Upload aborted")
+                    writer.write(block)
+                writer.close()
+            result.update(status="ok", size=writer.bytes_written)
+        except Exception as e:
+            logger.error(f"Error uploading {remote_path}: {str(e)}")
+            result.update(status="error", error=str(e))
+            if writer is not None:
+                writer.abort()
+            # Keep draining so the producer never waits on a dead file,
+            # unless its last block has been taken already
+            while block is not _END and block is not _ABORT:
+                block = blocks.get()
+        finally:
+            self.ssh_client.dir_cache.invalidate_parent(remote_path)
+            self._slots.release()
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Wait for every file to be written and release the workers
+
+        Returns:
+            Summary with per-file results in the order the files arrived
+        """
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+        self._resources.close()
+
+        summary = {"location": self.location, "uploaded": 0, "failed": 0, "skipped": 0, "bytes": 0}
+        for result in self.results:
+            if result["status"] == "ok":
+                summary["uploaded"] += 1
+                summary["bytes"] += result["size"]
+            elif result["status"] == "skipped":
+                summary["skipped"] += 1
+            else:
+                summary["failed"] += 1
+        summary["results"] = self.results
+        return summary
+
+
+class _StreamReader:
+    """
+    Blocking file object over an async byte stream, for use on a worker thread
+    """
+    def __init__(self, stream, loop: asyncio.AbstractEventLoop):
+        self._stream = stream.__aiter__()
+        self._loop = loop
+        self._buffer = bytearray()
+        self._eof = False
+
+    async def _next(self) -> bytes:
+        try:
+            return await self._stream.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = asyncio.run_coroutine_threadsafe(self._next(), self._loop).result()
+            if not chunk:
+                self._eof = True
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def unpack_tar(uploader: BulkUploader, stream, loop: asyncio.AbstractEventLoop):
+    """
+    Unpack a tar (optionally gzip/bz2/xz compressed) stream into an upload
+
+    The archive is read strictly sequentially as it arrives, so it is never
+    stored. Regular files and directories are uploaded; links and special
+    files are reported as skipped.
+
+    Args:
+        uploader: Destination of the unpacked files
+        stream: Async iterator of body chunks, e.g. request.stream()
+        loop: Event loop the stream belongs to
+
+    Raises:
+        tarfile.TarError: If the body is not a readable tar archive
+    """
+    block_size = settings.transfer_chunk_size
+    with tarfile.open(fileobj=_StreamReader(stream, loop), mode="r|*") as archive:
+        for member in archive:
+            if member.isdir():
+                uploader.make_dir(member.name)
+            elif member.isfile():
+                source = archive.extractfile(member)
+                incoming = uploader.open_file(member.name)
+                try:
+                    while True:
+                        data = source.read(block_size)
+                        if not data:
+                            break
+                        incoming.write(data)
+                except Exception:
+                    incoming.abort()
+                    raise
+                incoming.close()
+            else:
+                uploader.skip(member.name, "Only regular files and directories are unpacked")
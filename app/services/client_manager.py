@@ -1,25 +1,56 @@
 """
 Client manager for SSH connections
 """
-from typing import Dict, Optional, Tuple
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import get_settings
+from app.services.metrics import Family, registry
 from app.services.ssh_client import SSHClient
+from app.services.upload_sessions import upload_session_manager
+from app.services.workers import connection_key
 from app.utils.logger import get_logger
 
 logger = get_logger()
+settings = get_settings()
 
 class ClientManager:
     """
-    Singleton class to manage SSH client connections
+    Singleton pool of SSH client connections
+    
+    The pool is bounded by settings.pool_max_sessions. A background
+    maintenance thread closes sessions idle for longer than
+    settings.pool_idle_timeout, probes the others with keepalives and
+    deletes the partial files of abandoned chunked uploads.
+    Sessions whose transport has died are reconnected transparently on
+    their next operation (see SSHClient.track_operation).
     """
     _instance = None
     _clients: Dict[str, SSHClient] = {}
+    _lock = threading.RLock()
+    _stats: Dict[str, int] = {
+        "created": 0,
+        "reused": 0,
+        "evicted_idle": 0,
+        "evicted_lru": 0,
+        "dead_detected": 0,
+    }
+    _maintenance_thread: Optional[threading.Thread] = None
+    _stop_event = threading.Event()
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ClientManager, cls).__new__(cls)
         return cls._instance
     
-    def add_client(self, host_ip: str, username: str, password: str) -> Tuple[str, SSHClient]:
+    def add_client(
+        self,
+        host_ip: str,
+        username: str,
+        password: str,
+        compression: Optional[str] = None,
+        transport_profile: Optional[str] = None
+    ) -> Tuple[str, SSHClient]:
         """
         Create a new SSH client and add it to the manager
         
@@ -27,9 +58,77 @@ class ClientManager:
             host_ip: Hostname/IP with optional port (format: hostname[:port])
             username: SSH username
             password: SSH password
-            
+            compression: Compression policy for the connection
+                (default: settings.compression)
+            transport_profile: Transport profile for a new connection;
+                an existing session keeps the profile it connected with
+        
+        Returns:
+            Tuple of (connection_key, client)
+        
+        Raises:
+            RuntimeError: If the pool is full and no session can be evicted
+        """
+        hostname, port, key, client = self._reuse(host_ip, username, compression, transport_profile)
+        if client is not None:
+            return key, client
+        
+        # Create a new client outside the lock; connecting is slow
+        try:
+            client = SSHClient(hostname, port, username, password, compression, transport_profile)
+        except Exception as e:
+            logger.error(f"Failed to create client: {str(e)}")
+            raise
+        
+        return key, self._store(key, client)
+    
+    async def add_async_client(
+        self,
+        host_ip: str,
+        username: str,
+        password: str,
+        compression: Optional[str] = None,
+        transport_profile: Optional[str] = None
+    ) -> Tuple[str, Any]:
+        """
+        Create an asyncssh backend client and add it to the manager
+        
+        Takes the same arguments as add_client and connects on the running
+        event loop instead of a pool thread.
+        
         Returns:
             Tuple of (connection_key, client)
+        
+        Raises:
+            RuntimeError: If the pool is full and no session can be evicted
+        """
+        # Imported here so asyncssh is only needed when it is selected
+        from app.services.async_ssh_client import AsyncSSHClient
+        
+        hostname, port, key, client = self._reuse(host_ip, username, compression, transport_profile)
+        if client is not None:
+            return key, client
+        
+        try:
+            client = await AsyncSSHClient.connect(hostname, port, username, password, compression, transport_profile)
+        except Exception as e:
+            logger.error(f"Failed to create client: {str(e)}")
+            raise
+        
+        return key, self._store(key, client)
+    
+    def _reuse(
+        self,
+        host_ip: str,
+        username: str,
+        compression: Optional[str],
+        transport_profile: Optional[str]
+    ) -> Tuple[str, int, str, Optional[SSHClient]]:
+        """
+        Find the pooled session for a login, or make room for a new one
+        
+        Returns:
+            Tuple of (hostname, port, connection_key, existing client or None)
         """
         # Parse hostname and port
         if ':' in host_ip:
@@ -38,24 +137,70 @@ class ClientManager:
         else:
             hostname = host_ip
             port = 22
-            
+        
         # Create a unique key for this connection
-        key = f"{host_ip}{username}"
+        key = connection_key(host_ip, username)
         
         # Check if client already exists
-        if key in self._clients:
-            logger.info(f"Reusing existing connection for {key}")
-            return key, self._clients[key]
+        with self._lock:
+            if key in self._clients:
+                logger.info(f"Reusing existing connection for {key}")
+                self._stats["reused"] += 1
+                client = self._clients[key]
+                client.last_used = time.time()
+            else:
+                client = None
+                self._make_room()
         
-        # Create a new client
-        try:
-            client = SSHClient(hostname, port, username, password)
+        if client is not None:
+            if compression is not None and compression != client.compression.mode:
+                client.set_compression(compression)
+            if transport_profile is not None and transport_profile != client.profile.name:
+                logger.info(f"Session {key} keeps transport profile {client.profile.name}, log out to change it")
+        return hostname, port, key, client
+    
+    def _store(self, key: str, client: SSHClient) -> SSHClient:
+        """
+        Add a newly connected client to the pool
+        
+        Returns:
+            The pooled client, which is an earlier one if another login
+            for the same key won the race
+        """
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                # Another login for the same key won the race
+                client.close()
+                return existing
+            
             self._clients[key] = client
-            logger.info(f"Added new client: {key}")
-            return key, client
-        except Exception as e:
-            logger.error(f"Failed to create client: {str(e)}")
-            raise
+            self._stats["created"] += 1
+        
+        logger.info(f"Added new client: {key}")
+        return client
+    
+    def _make_room(self):
+        """
+        Evict the least recently used idle session if the pool is full
+        
+        A session streaming a download or upload is busy even between
+        chunks, so it is never picked. Must be called with the lock held.
+        
+        Raises:
+            RuntimeError: If every session is busy
+        """
+        if len(self._clients) < settings.pool_max_sessions:
+            return
+        
+        idle = [(client.last_used, key) for key, client in self._clients.items() if not client.busy]
+        if not idle:
+            raise RuntimeError("Session limit reached, try again later")
+        
+        _, key = min(idle)
+        logger.warning(f"Session pool full, evicting least recently used session {key}")
+        self._close_and_remove(key)
+        self._stats["evicted_lru"] += 1
     
     def get_client(self, host_ip: str, username: str) -> Optional[SSHClient]:
         """
@@ -64,12 +209,12 @@ class ClientManager:
         Args:
             host_ip: Hostname/IP with optional port
             username: SSH username
-            
+        
         Returns:
             SSHClient instance or None if not found
         """
-        key = f"{host_ip}{username}"
-        return self._clients.get(key)
+        key = connection_key(host_ip, username)
+        return self.get_client_by_key(key)
     
     def get_client_by_key(self, key: str) -> Optional[SSHClient]:
         """
@@ -77,11 +222,27 @@ class ClientManager:
         
         Args:
             key: Connection key
-            
+        
         Returns:
             SSHClient instance or None if not found
         """
-        return self._clients.get(key)
+        client = self._clients.get(key)
+        if client is not None:
+            client.last_used = time.time()
+        return client
+    
+    def _close_and_remove(self, key: str) -> bool:
+        """
+        Close a client and drop it from the pool
+        """
+        client = self._clients.pop(key, None)
+        if client is None:
+            return False
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Error closing client {key}: {str(e)}")
+        return True
     
     def remove_client(self, key: str) -> bool:
         """
@@ -89,21 +250,20 @@ class ClientManager:
         
         Args:
             key: Connection key
-            
+        
         Returns:
             True if successful, False if client not found
         """
-        if key in self._clients:
-            try:
-                # Close connection properly
-                self._clients[key].close()
-                # Remove from dictionary
-                del self._clients[key]
-                logger.info(f"Removed client: {key}")
-                return True
-            except Exception as e:
-                logger.error(f"Error removing client {key}: {str(e)}")
-                return False
+        with self._lock:
+            if key in self._clients:
+                try:
+                    # Close connection properly and remove from dictionary
+                    self._close_and_remove(key)
+                    logger.info(f"Removed client: {key}")
+                    return True
+                except Exception as e:
+                    logger.error(f"Error removing client {key}: {str(e)}")
+                    return False
         return False
     
     def get_all_clients(self) -> Dict[str, SSHClient]:
@@ -113,21 +273,143 @@ class ClientManager:
         Returns:
             Dictionary of all clients
         """
-        return self._clients
+        with self._lock:
+            return dict(self._clients)
+    
+    def get_pool_stats(self) -> Dict[str, int]:
+        """
+        Get connection pool occupancy and lifetime counters
+        
+        Returns:
+            Dictionary of pool metrics
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            stats = dict(self._stats)
+        
+        stats.update({
+            "size": len(clients),
+            "max_size": settings.pool_max_sessions,
+            "busy": sum(1 for client in clients if client.busy),
+            "idle": sum(1 for client in clients if not client.busy),
+            "dead": sum(1 for client in clients if not client.is_alive()),
+            "reconnects": sum(client.reconnects for client in clients),
+        })
+        return stats
+    
+    def collect_metrics(self) -> List[Family]:
+        """
+        Report pool occupancy and lifetime counters for /metrics
+        
+        Returns:
+            Metric families for the metrics registry
+        """
+        stats = self.get_pool_stats()
+        clients = self.get_all_clients()
+        
+        return [
+            ("ssh_pool_sessions", "gauge", "Sessions in the connection pool by state",
+             [({"state": state}, stats[state]) for state in ("busy", "idle")]),
+            ("ssh_pool_dead_sessions", "gauge", "Pooled sessions whose transport has died", [({}, stats["dead"])]),
+            ("ssh_pool_max_sessions", "gauge", "Capacity of the connection pool", [({}, stats["max_size"])]),
+            ("ssh_pool_reconnects", "gauge", "Reconnects of the pooled sessions", [({}, stats["reconnects"])]),
+            ("ssh_pool_events_total", "counter", "Sessions created, reused and evicted by the pool",
+             [({"event": event}, stats[event]) for event in self._stats]),
+            ("ssh_session_active_operations", "gauge", "Operations running on each session",
+             [({"host": f"{client.ip}:{client.port}", "username": client.username}, client.active_ops)
+              for client in clients.values()]),
+        ]
+    
+    def expire_uploads(self):
+        """
+        Forget chunked uploads past settings.upload_session_ttl and delete
+        their partial remote files
+        """
+        for session in upload_session_manager.expire_stale():
+            # Looked up directly so cleanup does not count as session use
+            client = self._clients.get(connection_key(session.host_ip, session.username))
+            if client is None:
+                continue
+            try:
+                with client.track_operation():
+                    client.delete_file(session.part_path)
+            except Exception as e:
+                logger.error(f"Error removing partial upload {session.part_path}: {str(e)}")
+    
+    def run_maintenance(self):
+        """
+        Expire abandoned uploads, evict idle sessions and probe the
+        remaining ones once
+        """
+        self.expire_uploads()
+        
+        now = time.time()
+        with self._lock:
+            clients = list(self._clients.items())
+        
+        for key, client in clients:
+            if client.busy:
+                continue
+            
+            if now - client.last_used > settings.pool_idle_timeout:
+                with self._lock:
+                    # Re-check under the lock in case the session was just used
+                    if self._clients.get(key) is client and not client.busy:
+                        self._close_and_remove(key)
+                        self._stats["evicted_idle"] += 1
+                        logger.info(f"Evicted idle session {key}")
+                continue
+            
+            if not client.keepalive():
+                # Left in the pool; the next operation reconnects it
+                self._stats["dead_detected"] += 1
+                logger.warning(f"Session {key} has a dead transport")
+    
+    def _maintenance_loop(self):
+        """
+        Background loop running pool maintenance at a fixed interval
+        """
+        while not self._stop_event.wait(settings.pool_keepalive_interval):
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                logger.error(f"Error in connection pool maintenance: {str(e)}")
+    
+    def start_maintenance(self):
+        """
+        Start the background maintenance thread if it is not running
+        """
+        with self._lock:
+            if self._maintenance_thread is not None and self._maintenance_thread.is_alive():
+                return
+            self._stop_event.clear()
+            ClientManager._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop,
+                name="ssh-pool-maintenance",
+                daemon=True
+            )
+            self._maintenance_thread.start()
+        logger.info("Connection pool maintenance started")
     
     def cleanup(self):
         """
         Close all connections and clear the clients dictionary
         """
-        for key, client in list(self._clients.items()):
+        self._stop_event.set()
+        
+        with self._lock:
+            clients = list(self._clients.items())
+            self._clients.clear()
+        
+        for key, client in clients:
             try:
                 client.close()
                 logger.info(f"Closed connection for {key}")
             except Exception as e:
                 logger.error(f"Error closing connection for {key}: {str(e)}")
         
-        self._clients.clear()
         logger.info("All client connections cleaned up")
 
 # Create a singleton instance
-client_manager = ClientManager()
\ No newline at end of file
+client_manager = ClientManager()
+registry.add_collector(client_manager.collect_metrics)
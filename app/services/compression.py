@@ -0,0 +1,153 @@
+"""
+Compression policy for SSH transports
+
+SSH compression is negotiated per transport, so the policy decides whether a
+connection should be compressed and, in auto mode, re-decides before each
+large transfer. zlib only pays off when the link is slower than the CPU can
+compress and the payload actually shrinks; on a fast LAN or for already
+compressed formats it only costs CPU.
+"""
+import mimetypes
+import posixpath
+import threading
+import zlib
+from typing import Optional
+from app.config import get_settings
+
+settings = get_settings()
+
+COMPRESSION_MODES = ("off", "on", "auto")
+
+# Bytes read from a file to estimate how well it compresses
+SAMPLE_SIZE = 65536
+
+# Formats that are already compressed (or encrypted) and never shrink
+PRECOMPRESSED_EXTENSIONS = {
+    ".gz", ".tgz", ".bz2", ".tbz2", ".xz", ".txz", ".zst", ".lz4", ".lzma", ".z",
+    ".zip", ".7z", ".rar", ".jar", ".war", ".whl", ".apk", ".deb", ".rpm",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v",
+    ".mp3", ".aac", ".m4a", ".ogg", ".opus", ".flac",
+    ".parquet", ".orc", ".avro", ".docx", ".xlsx", ".pptx", ".odt", ".ods",
+    ".gpg", ".pgp", ".enc",
+}
+
+# Media types that are uncompressed despite their major type
+_UNCOMPRESSED_MEDIA = {"image/bmp", "image/svg+xml", "image/tiff", "image/x-ms-bmp", "audio/wav", "audio/x-wav"}
+
+
+def is_precompressed(path: str) -> bool:
+    """
+    Guess from the file name whether a file is already compressed
+
+    Args:
+        path: Local or remote file path
+
+    Returns:
+        True if the extension or guessed media type is a compressed format
+    """
+    name = posixpath.basename(path).lower()
+    if posixpath.splitext(name)[1] in PRECOMPRESSED_EXTENSIONS:
+        return True
+
+    media_type, encoding = mimetypes.guess_type(name)
+    if encoding is not None:
+        return True
+    if media_type is None or media_type in _UNCOMPRESSED_MEDIA:
+        return False
+    return media_type.split('/', 1)[0] in ("image", "video", "audio")
+
+
+def compression_ratio(sample: bytes) -> float:
+    """
+    Estimate how well data compresses
+
+    Args:
+        sample: Leading bytes of the payload
+
+    Returns:
+        Compressed size divided by original size (1.0 for empty samples)
+    """
+    if not sample:
+        return 1.0
+    return len(zlib.compress(sample, 1)) / len(sample)
+
+
+class CompressionPolicy:
+    """
+    Per-connection compression decision
+
+    ``off`` and ``on`` pin the transport. ``auto`` starts uncompressed and
+    enables compression for a transfer only when the measured link
+    throughput is below settings.compression_max_bandwidth and the payload
+    is compressible, judged by its name and, when available, a sample.
+    """
+    def __init__(self, mode: Optional[str] = None):
+        mode = mode or settings.compression
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"Invalid compression mode: {mode}")
+        self.mode = mode
+        # Smoothed throughput of uncompressed transfers, in bytes per second
+        self.link_throughput: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def initial(self) -> bool:
+        """
+        Whether the transport should offer compression when connecting
+        """
+        return self.mode == "on"
+
+    @property
+    def link_is_slow(self) -> bool:
+        """
+        Whether the measured link is slow enough for compression to pay off
+
+        Unmeasured links are assumed fast until a transfer shows otherwise.
+        """
+        throughput = self.link_throughput
+        return throughput is not None and throughput < settings.compression_max_bandwidth
+
+    def observe(self, nbytes: int, seconds: float, compressed: bool):
+        """
+        Record a finished transfer to estimate the raw link throughput
+
+        Only uncompressed transfers of at least settings.compression_min_size
+        bytes are counted; smaller ones are dominated by latency.
+        """
+        if compressed or seconds <= 0 or nbytes < settings.compression_min_size:
+            return
+
+        rate = nbytes / seconds
+        with self._lock:
+            if self.link_throughput is None:
+                self.link_throughput = rate
+            else:
+                self.link_throughput = 0.7 * self.link_throughput + 0.3 * rate
+
+    def should_compress(self, path: str, sample: Optional[bytes] = None) -> bool:
+        """
+        Decide whether a transfer should run compressed
+
+        Args:
+            path: Name of the file being transferred
+            sample: Optional leading bytes of the file
+
+        Returns:
+            True if the transport should be compressed for this transfer
+        """
+        if self.mode != "auto":
+            return self.mode == "on"
+
+        if is_precompressed(path):
+            return False
+        if sample is not None and compression_ratio(sample) > settings.compression_max_ratio:
+            return False
+
+        return self.link_is_slow
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.mode,
+            "linkThroughput": None if self.link_throughput is None else int(self.link_throughput),
+        }
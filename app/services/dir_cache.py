@@ -0,0 +1,138 @@
+"""
+Per-connection cache of remote directory listings
+"""
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+
+def normalize_dir(path: str) -> str:
+    """
+    Normalize a remote directory path the way listings are keyed
+
+    Args:
+        path: Remote path, with or without a trailing slash
+
+    Returns:
+        Path without trailing slash, or '/' for the root
+    """
+    path = posixpath.normpath(path or '/')
+    if path.startswith('//'):
+        path = '/' + path.lstrip('/')
+    return path
+
+
+class DirectoryCache:
+    """
+    Bounded LRU cache of directory listings with a time-to-live
+
+    Listings are stored as lists of DirEntry tuples and must be treated as
+    read-only by callers. Entries expire after ``ttl`` seconds and the least
+    recently used entry is evicted once ``max_entries`` is reached. A ttl of
+    0 disables caching.
+
+    Every invalidation marks a change made through this connection and is
+    reported to ``on_change`` as (directory, recursive), even when caching
+    is disabled.
+    """
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 30.0,
+        on_change: Optional[Callable[[str, bool], None]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._on_change = on_change
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, path: str) -> Optional[List[Any]]:
+        """
+        Get a cached listing if it is still fresh
+
+        Args:
+            path: Remote directory path
+
+        Returns:
+            The cached listing, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        path = normalize_dir(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[path]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path: str, listing: List[Any]):
+        """
+        Store a listing, evicting the least recently used entries if full
+
+        Args:
+            path: Remote directory path
+            listing: Directory listing to cache
+        """
+        if not self.enabled:
+            return
+
+        path = normalize_dir(path)
+        with self._lock:
+            self._entries[path] = (time.monotonic() + self.ttl, listing)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: str):
+        """
+        Drop the listing of a single directory
+        """
+        path = normalize_dir(path)
+        with self._lock:
+            self._entries.pop(path, None)
+        if self._on_change:
+            self._on_change(path, False)
+
+    def invalidate_parent(self, path: str):
+        """
+        Drop the listing of the directory containing a path
+        """
+        self.invalidate(posixpath.dirname(normalize_dir(path)))
+
+    def invalidate_tree(self, path: str):
+        """
+        Drop the listing of a directory and of everything below it
+        """
+        path = normalize_dir(path)
+        prefix = path if path == '/' else path + '/'
+        with self._lock:
+            for key in [key for key in self._entries if key == path or key.startswith(prefix)]:
+                del self._entries[key]
+        if self._on_change:
+            self._on_change(path, True)
+
+    def clear(self):
+        """
+        Drop every cached listing
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,342 @@
+"""
+One-way synchronization of a local staging directory to a remote directory
+
+Like rsync, files are compared by size and mtime, or optionally by SHA-256
+checksum, and only those that differ are uploaded. Remote checksums are
+computed by ``sha256sum`` on the server, so comparing never downloads file
+contents. Uploaded files get the local mtime, which lets the next sync
+recognise them as unchanged.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+from app.config import get_settings
+from app.services.bulk_upload import safe_relative_path
+from app.services.dir_cache import normalize_dir
+from app.services.listing import DirEntry
+from app.services.remote_search import tree_entries
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+# Keep each sha256sum command line well below common ARG_MAX limits
+_HASH_COMMAND_BYTES = 65536
+
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b'\\': b'\\'}
+
+
+class LocalEntry(NamedTuple):
+    """
+    A regular file or directory of the local source tree
+    """
+    size: int
+    mtime: int
+    is_dir: bool
+
+
+class SyncAction(NamedTuple):
+    """
+    One planned operation, with a path relative to both tree roots
+
+    op is 'delete', 'mkdir', 'upload' or 'touch' (set the remote mtime of
+    a file whose contents already match).
+    """
+    op: str
+    path: str
+    size: int
+    reason: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"op": self.op, "path": self.path, "size": self.size, "reason": self.reason}
+
+
+def staging_path(source: str) -> str:
+    """
+    Resolve a source directory given relative to settings.sync_path
+
+    Raises:
+        ValueError: If the path would leave the staging directory
+        NotADirectoryError: If it is not an existing directory
+    """
+    rel_path = ''
+    if source.strip('/.'):
+        rel_path = safe_relative_path(source)
+        if rel_path is None:
+            raise ValueError("Invalid source path")
+    path = os.path.join(settings.sync_path, rel_path)
+    if not os.path.isdir(path):
+        raise NotADirectoryError(f"{source} is not a directory in the staging area")
+    return path
+
+
+def local_tree(root: str) -> Dict[str, LocalEntry]:
+    """
+    Collect the regular files and directories below a local directory
+
+    Symlinks and special files are skipped, so nothing outside root is
+    ever read.
+
+    Returns:
+        Entries keyed by '/'-separated path relative to root
+    """
+    tree = {}
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    tree[rel_path] = LocalEntry(0, int(entry.stat(follow_symlinks=False).st_mtime), True)
+                    pending.append(rel_path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    tree[rel_path] = LocalEntry(st.st_size, int(st.st_mtime), False)
+    return tree
+
+
+def remote_tree(ssh_client, root: str) -> Optional[Dict[str, DirEntry]]:
+    """
+    Collect the entries below a remote directory
+
+    Returns:
+        Entries keyed by path relative to root, or None if root is missing
+    """
+    prefix = root if root == '/' else root + '/'
+    try:
+        return {entry.path[len(prefix):]: entry for entry in tree_entries(ssh_client, root)}
+    except FileNotFoundError:
+        return None
+
+
+def local_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remote_sha256(ssh_client, paths: List[str]) -> Dict[str, str]:
+    """
+    Hash remote files with sha256sum on the server
+
+    Paths are passed in batches that fit on one command line. Files that
+    cannot be read are missing from the result.
+
+    Returns:
+        Hex digests keyed by remote path
+
+    Raises:
+        IOError: If the server cannot run sha256sum
+    """
+    if not ssh_client.has_command("sha256sum"):
+        raise IOError("The server cannot run sha256sum")
+
+    digests = {}
+    batch, length = [], 0
+    for index, path in enumerate(paths):
+        quoted = shlex.quote(path)
+        batch.append(quoted)
+        length += len(quoted) + 1
+        if length < _HASH_COMMAND_BYTES and index < len(paths) - 1:
+            continue
+
+        exit_status, stdout, stderr = ssh_client.exec_command("sha256sum -- " + " ".join(batch))
+        if exit_status:
+            logger.warning(f"sha256sum exited with {exit_status}: {stderr.decode(errors='replace')[-500:]}")
+        for line in stdout.split(b'\n'):
+            # Names with a backslash or newline are escaped and flagged by
+            # a leading backslash
+            escaped = line.startswith(b'\\')
+            if escaped:
+                line = line[1:]
+            if len(line) < 67:
+                continue
+            name = line[66:]
+            if escaped:
+                name = re.sub(rb'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), name)
+            digests[name.decode(errors='replace')] = line[:64].decode()
+        batch, length = [], 0
+    return digests
+
+
+class DirectorySync:
+    """
+    Plans and applies the changes that make a remote tree match a local one
+    """
+
+    def __init__(self, ssh_client, source: str, destination: str, checksum: bool = False, delete: bool = False):
+        """
+        Args:
+            ssh_client: Connected SSHClient
+            source: Local directory to read from
+            destination: Remote directory to update
+            checksum: Compare files of equal size by SHA-256 instead of mtime
+            delete: Remove remote entries that do not exist locally
+        """
+        self.ssh_client = ssh_client
+        self.source = source
+        self.destination = normalize_dir(destination)
+        self.checksum = checksum
+        self.delete = delete
+        self.unchanged = 0
+
+    def _remote_path(self, rel_path: str) -> str:
+        return posixpath.join(self.destination, rel_path) if rel_path != '.' else self.destination
+
+    def plan(self) -> List[SyncAction]:
+        """
+        Compare both trees and list the operations needed, in order
+
+        Deletes come first, then directories parent before child, then
+        uploads and touches.
+
+        Returns:
+            List of SyncAction
+        """
+        local = local_tree(self.source)
+        remote = remote_tree(self.ssh_client, self.destination)
+        deletes, mkdirs, uploads, candidates = [], [], [], []
+        self.unchanged = 0
+
+        if remote is None:
+            remote = {}
+            mkdirs.append(SyncAction("mkdir", ".", 0, "missing"))
+
+        if self.delete:
+            for rel_path, entry in sorted(remote.items()):
+                parent = posixpath.dirname(rel_path)
+                # Removing the topmost extraneous path takes its subtree along
+                if rel_path not in local and (not parent or parent in local and local[parent].is_dir):
+                    deletes.append(SyncAction("delete", rel_path, 0 if entry.is_dir else entry.size, "extraneous"))
+
+        for rel_path, item in sorted(local.items()):
+            entry = remote.get(rel_path)
+            if entry is not None and entry.is_dir != item.is_dir:
+                deletes.append(SyncAction("delete", rel_path, 0 if entry.is_dir else entry.size, "type"))
+                entry = None
+
+            if item.is_dir:
+                if entry is None:
+                    mkdirs.append(SyncAction("mkdir", rel_path, 0, "missing"))
+                continue
+
+            if entry is None:
+                uploads.append(SyncAction("upload", rel_path, item.size, "missing"))
+            elif entry.size != item.size:
+                uploads.append(SyncAction("upload", rel_path, item.size, "size"))
+            elif self.checksum:
+                candidates.append(rel_path)
+            elif entry.mtime != item.mtime:
+                uploads.append(SyncAction("upload", rel_path, item.size, "mtime"))
+            else:
+                self.unchanged += 1
+
+        if candidates:
+            # Hash on the server while hashing the local copies here
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                remote_digests = pool.submit(
+                    remote_sha256, self.ssh_client, [self._remote_path(path) for path in candidates]
+                )
+                local_digests = {path: local_sha256(os.path.join(self.source, path)) for path in candidates}
+                remote_digests = remote_digests.result()
+
+            for rel_path in candidates:
+                item = local[rel_path]
+                if remote_digests.get(self._remote_path(rel_path)) != local_digests[rel_path]:
+                    uploads.append(SyncAction("upload", rel_path, item.size, "checksum"))
+                elif remote[rel_path].mtime != item.mtime:
+                    uploads.append(SyncAction("touch", rel_path, 0, "mtime"))
+                else:
+                    self.unchanged += 1
+
+        return deletes + mkdirs + uploads
+
+    def apply(self, actions: List[SyncAction]) -> List[Dict[str, str]]:
+        """
+        Carry out planned actions
+
+        Deletes and directories are handled in order, then files are
+        uploaded by settings.sync_parallel_files threads, each on its own
+        SFTP channel. A directory that cannot be created fails the files
+        below it without trying them.
+
+        Returns:
+            Path and error of each action that failed
+        """
+        failed = []
+        failed_dirs = set()
+
+        def fail(action: SyncAction, error: str):
+            logger.error(f"Sync {action.op} of {action.path} failed: {error}")
+            failed.append({"op": action.op, "path": action.path, "error": error})
+
+        for action in actions:
+            if action.op == "delete" and not self.ssh_client.remove(self._remote_path(action.path)):
+                fail(action, "Failed to delete")
+            elif action.op == "mkdir":
+                parent = posixpath.dirname(action.path)
+                if parent in failed_dirs or not self.ssh_client.mkdir(self._remote_path(action.path)):
+                    failed_dirs.add('' if action.path == '.' else action.path)
+                    fail(action, "Failed to create directory")
+
+        def transfer(channel, action: SyncAction):
+            local_path = os.path.join(self.source, action.path)
+            remote_path = self._remote_path(action.path)
+            if posixpath.dirname(action.path) in failed_dirs:
+                return "Directory was not created"
+            if action.op == "upload" and not self.ssh_client.put(local_path, remote_path, channels=channel):
+                return "Failed to upload"
+            mtime = int(os.stat(local_path).st_mtime)
+            channel().utime(remote_path, (mtime, mtime))
+            return None
+
+        files = [action for action in actions if action.op in ("upload", "touch")]
+        with self.ssh_client.dedicated_channels() as channel, ThreadPoolExecutor(
+            max_workers=max(1, settings.sync_parallel_files), thread_name_prefix="dir-sync"
+        ) as pool:
+            for action, future in [(action, pool.submit(transfer, channel, action)) for action in files]:
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    fail(action, error)
+
+        return failed
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Plan the sync and, unless dry_run is set, apply it
+
+        Returns:
+            Report with the planned actions, totals and any failures
+        """
+        actions = self.plan()
+        failed = [] if dry_run else self.apply(actions)
+        uploads = [action for action in actions if action.op == "upload"]
+
+        logger.info(
+            f"{'Planned' if dry_run else 'Ran'} sync of {self.source} to {self.destination}: "
+            f"{len(uploads)} uploads, {self.unchanged} unchanged, {len(failed)} failed"
+        )
+        return {
+            "destination": self.destination,
+            "dryRun": dry_run,
+            "actions": [action.to_dict() for action in actions],
+            "summary": {
+                "delete": sum(action.op == "delete" for action in actions),
+                "mkdir": sum(action.op == "mkdir" for action in actions),
+                "upload": len(uploads),
+                "uploadBytes": sum(action.size for action in uploads),
+                "touch": sum(action.op == "touch" for action in actions),
+                "unchanged": self.unchanged
+            },
+            "failed": failed
+        }
@@ -0,0 +1,197 @@
+"""
+Server-sent event fan-out for progress and directory change notices
+
+Events are published from worker threads and delivered to subscribers on
+the event loop in batches. Publishing never touches the loop directly: an
+event is appended to a pending buffer, and one flush per
+settings.events_flush_interval encodes every pending event once and hands
+the bytes to each interested subscriber, so the loop's cost grows with the
+number of flushes rather than the number of messages. Events published
+with a key replace a still-pending event with the same key, which collapses
+bursts of progress updates and repeated notices for one directory.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+from app.config import get_settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+
+def encode_event(event: str, data: Dict[str, Any]) -> bytes:
+    """
+    Encode a single server-sent event
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class _Subscriber:
+    """
+    Buffered event stream of one client
+    """
+    def __init__(self, topics: Set[str]):
+        self.topics = topics
+        self.buffer: deque = deque()
+        self.dropped = 0
+        self.wake = asyncio.Event()
+
+    def deliver(self, payload: bytes):
+        # Only called on the event loop, so no lock is needed
+        if len(self.buffer) >= settings.events_queue_size:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(payload)
+
+
+class EventHub:
+    """
+    Singleton publish/subscribe hub keyed by topic
+
+    A topic is normally the key of an SSHClient, so each login session
+    receives the events of its own connection.
+    """
+    _instance = None
+    _lock = threading.Lock()
+    _subscribers: Dict[str, Set[_Subscriber]] = {}
+    _pending: "OrderedDict[Any, tuple]" = OrderedDict()
+    _flush_scheduled = False
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _sequence = itertools.count()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EventHub, cls).__new__(cls)
+        return cls._instance
+
+    def has_subscribers(self, topics: Iterable[str]) -> bool:
+        """
+        Check whether anyone listens to any of the topics
+        """
+        return any(self._subscribers.get(topic) for topic in topics)
+
+    def publish(self, topics: Iterable[str], event: str, data: Dict[str, Any], key: Optional[str] = None):
+        """
+        Queue an event for every subscriber of the given topics
+
+        Safe to call from any thread; returns immediately and does nothing
+        if nobody subscribes to the topics.
+
+        Args:
+            topics: Topics the event concerns
+            event: SSE event name, e.g. 'job' or 'dir'
+            data: JSON-serializable payload
+            key: Optional coalescing key; a newer event with the same key
+                replaces one that has not been delivered yet
+        """
+        topics = [topic for topic in topics if self._subscribers.get(topic)]
+        if not topics or self._loop is None:
+            return
+
+        with self._lock:
+            if key is None:
+                key = next(self._sequence)
+            else:
+                key = (key, tuple(topics))
+            self._pending[key] = (topics, event, data)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+            loop = self._loop
+
+        try:
+            loop.call_soon_threadsafe(loop.call_later, settings.events_flush_interval, self._flush)
+        except RuntimeError:
+            # The loop has been closed; nobody is left to receive events
+            with self._lock:
+                self._pending.clear()
+                self._flush_scheduled = False
+
+    def _flush(self):
+        """
+        Deliver every pending event; runs on the event loop
+        """
+        with self._lock:
+            pending, self._pending = self._pending, OrderedDict()
+            self._flush_scheduled = False
+
+        woken: Set[_Subscriber] = set()
+        for topics, event, data in pending.values():
+            payload = encode_event(event, data)
+            targets: Set[_Subscriber] = set()
+            for topic in topics:
+                targets.update(self._subscribers.get(topic, ()))
+            for subscriber in targets:
+                subscriber.deliver(payload)
+            woken |= targets
+
+        for subscriber in woken:
+            subscriber.wake.set()
+
+    def _add(self, subscriber: _Subscriber):
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            for topic in subscriber.topics:
+                self._subscribers.setdefault(topic, set()).add(subscriber)
+
+    def _discard(self, subscriber: _Subscriber):
+        with self._lock:
+            for topic in subscriber.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def subscriber_count(self) -> int:
+        """
+        Number of open event streams
+        """
+        return len({subscriber for subscribers in self._subscribers.values() for subscriber in subscribers})
+
+    async def stream(self, topics: Iterable[str], initial: Optional[List[bytes]] = None) -> AsyncIterator[bytes]:
+        """
+        Subscribe and yield SSE-encoded batches until the client goes away
+
+        Everything delivered since the previous batch is sent in one write.
+        A comment line is sent after settings.events_keepalive seconds of
+        silence so proxies keep the connection open. If a slow client falls
+        more than settings.events_queue_size events behind, the oldest are
+        dropped and an 'overflow' event tells it to reload its state.
+
+        Args:
+            topics: Topics to subscribe to
+            initial: Encoded events to send before anything else
+
+        Yields:
+            Encoded event stream chunks
+        """
+        subscriber = _Subscriber(set(topics))
+        self._add(subscriber)
+        try:
+            yield b"retry: 3000\n\n" + b"".join(initial or [])
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.wake.wait(), settings.events_keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+
+                subscriber.wake.clear()
+                chunk = b"".join(subscriber.buffer)
+                subscriber.buffer.clear()
+                if subscriber.dropped:
+                    dropped, subscriber.dropped = subscriber.dropped, 0
+                    chunk = encode_event("overflow", {"dropped": dropped}) + chunk
+                if chunk:
+                    yield chunk
+        finally:
+            self._discard(subscriber)
+
+
+# Create a singleton instance
+event_hub = EventHub()
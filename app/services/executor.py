@@ -0,0 +1,141 @@
+"""
+Bounded execution layer for blocking SSH client operations
+
+Paramiko is a blocking library. Every call into an SSHClient from a route is
+run on a shared, bounded thread pool so the event loop stays responsive, and
+each connection may only occupy a limited number of pool threads at a time so
+one busy session cannot starve the others. Concurrent calls never share an
+SFTP channel: each borrows one from its client's pool, so the per-connection
+limit also bounds how many channels those calls open. Coroutine functions,
+such as the methods of the asyncssh backend's client, are awaited on the loop
+instead and only take the connection's slot.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from app.config import get_settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.executor_max_workers,
+    thread_name_prefix="ssh-op"
+)
+
+# Per-connection semaphores, dropped automatically with their client
+_connection_limits: "weakref.WeakKeyDictionary[Any, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+_EXHAUSTED = object()
+
+
+def _connection_limit(ssh_client: Any) -> asyncio.Semaphore:
+    """
+    Get the semaphore that bounds concurrent operations on a connection
+    """
+    limit = _connection_limits.get(ssh_client)
+    if limit is None:
+        limit = asyncio.Semaphore(settings.max_ops_per_connection)
+        _connection_limits[ssh_client] = limit
+    return limit
+
+
+async def run_blocking(ssh_client: Optional[Any], func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking call on the shared pool without stalling the event loop
+
+    Args:
+        ssh_client: Connection the call belongs to, or None for calls that
+            are not tied to an existing connection (e.g. login)
+        func: Blocking callable or coroutine function
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The return value of func
+    """
+    if asyncio.iscoroutinefunction(func):
+        if ssh_client is None:
+            return await func(*args, **kwargs)
+        async with _connection_limit(ssh_client):
+            return await func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+
+    if ssh_client is None:
+        return await loop.run_in_executor(_executor, call)
+
+    async with _connection_limit(ssh_client):
+        return await loop.run_in_executor(_executor, _tracked, ssh_client, call)
+
+
+def _tracked(ssh_client: Any, call: Callable) -> Any:
+    """
+    Run a call inside the connection's activity tracking, if it has any
+    """
+    track = getattr(ssh_client, 'track_operation', None)
+    if track is None:
+        return call()
+    with track():
+        return call()
+
+
+async def iterate_blocking(ssh_client: Optional[Any], iterator: Iterator) -> AsyncIterator:
+    """
+    Drive a blocking iterator from async code, one item per pool call
+
+    The connection slot is only held while an item is being produced, so a
+    long streaming transfer never pins a slot between chunks. Asynchronous
+    iterators, such as the asyncssh backend's readers, are iterated directly.
+
+    When iteration ends, fails or is abandoned, the iterator's close() is run
+    on the pool as well, and never while an item from a cancelled step is
+    still being produced.
+
+    Args:
+        ssh_client: Connection the iterator reads from
+        iterator: Blocking iterator, e.g. a RemoteFileReader
+
+    Yields:
+        Items produced by the iterator
+    """
+    if hasattr(iterator, '__aiter__'):
+        async for item in iterator:
+            yield item
+        return
+
+    # A cancelled await leaves its pool thread running, so steps and close()
+    # take turns on this lock
+    lock = threading.Lock()
+
+    def step() -> Any:
+        with lock:
+            return next(iterator, _EXHAUSTED)
+
+    def close():
+        with lock:
+            iterator.close()
+
+    try:
+        while True:
+            item = await run_blocking(ssh_client, step)
+            if item is _EXHAUSTED:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            # Shielded so the close is still scheduled if the consumer was cancelled
+            await asyncio.shield(run_blocking(ssh_client, close))
+
+
+def shutdown_executor():
+    """
+    Stop accepting work and release the pool threads
+    """
+    _executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("SSH operation executor shut down")
@@ -0,0 +1,199 @@
+"""
+Directory entry model plus server-side filtering, sorting and pagination
+"""
+import base64
+import binascii
+import fnmatch
+import json
+import stat
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class DirEntry(NamedTuple):
+    """
+    Lightweight directory entry kept in listings and the directory cache
+
+    Formatting into the API dictionary is deferred to to_dict() so that
+    large listings only pay for the entries actually returned.
+    """
+    name: str
+    path: str
+    size: int
+    mtime: int
+    is_dir: bool
+
+    @classmethod
+    def from_attr(cls, remote_dir: str, attr) -> "DirEntry":
+        """
+        Build an entry from a paramiko SFTPAttributes listing item
+        """
+        if remote_dir == '/':
+            path = f"/{attr.filename}"
+        else:
+            path = f"{remote_dir}/{attr.filename}"
+
+        return cls(
+            attr.filename,
+            path,
+            attr.st_size or 0,
+            attr.st_mtime or 0,
+            stat.S_ISDIR(attr.st_mode or 0)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Format the entry as a file information dictionary
+        """
+        return {
+            'name': self.name,
+            'path': self.path,
+            'size': self.size,
+            'mTime': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.mtime)),
+            'type': 'dir' if self.is_dir else 'file'
+        }
+
+
+class ListingQuery(NamedTuple):
+    """
+    Filter, sort and page options for a directory listing
+    """
+    pattern: Optional[str] = None
+    file_type: Optional[str] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    mtime_after: Optional[float] = None
+    mtime_before: Optional[float] = None
+    sort_by: Optional[str] = None
+    descending: bool = False
+
+    @property
+    def has_filters(self) -> bool:
+        return any(value is not None for value in (
+            self.pattern, self.file_type, self.min_size,
+            self.max_size, self.mtime_after, self.mtime_before
+        ))
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded
+    """
+
+
+def filter_entries(entries: Iterable[DirEntry], query: ListingQuery) -> Iterator[DirEntry]:
+    """
+    Yield only the entries matching every filter in the query
+    """
+    if not query.has_filters:
+        yield from entries
+        return
+
+    want_dir = None if query.file_type is None else query.file_type == 'dir'
+
+    for entry in entries:
+        if want_dir is not None and entry.is_dir != want_dir:
+            continue
+        if query.min_size is not None and entry.size < query.min_size:
+            continue
+        if query.max_size is not None and entry.size > query.max_size:
+            continue
+        if query.mtime_after is not None and entry.mtime < query.mtime_after:
+            continue
+        if query.mtime_before is not None and entry.mtime > query.mtime_before:
+            continue
+        if query.pattern is not None and not fnmatch.fnmatchcase(entry.name, query.pattern):
+            continue
+        yield entry
+
+
+def _sort_key(entry: DirEntry, sort_by: str) -> Tuple:
+    """
+    Build a total-order key for an entry; the name breaks ties
+    """
+    if sort_by == 'size':
+        return (entry.size, entry.name)
+    if sort_by == 'mtime':
+        return (entry.mtime, entry.name)
+    if sort_by == 'type':
+        return (0 if entry.is_dir else 1, entry.name)
+    return (entry.name,)
+
+
+def encode_cursor(key: Tuple) -> str:
+    """
+    Encode a sort key as an opaque cursor string
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def paginate(
+    entries: Iterable[DirEntry],
+    query: ListingQuery,
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List[DirEntry], Optional[str], int]:
+    """
+    Filter and sort a listing, then return one page after the cursor
+
+    The cursor is keyset-based (the sort key of the last entry returned), so
+    pages stay consistent even if entries are added or removed between
+    requests.
+
+    Args:
+        entries: Full directory listing
+        query: Filter and sort options; name order is used if unsorted
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Maximum number of entries per page
+
+    Returns:
+        Tuple of (page entries, next cursor or None, total matching entries)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    sort_by = query.sort_by or 'name'
+    keyed = [(_sort_key(entry, sort_by), entry) for entry in filter_entries(entries, query)]
+    keyed.sort(key=lambda item: item[0], reverse=query.descending)
+
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            for start, (key, _) in enumerate(keyed):
+                if (key < after) if query.descending else (key > after):
+                    break
+            else:
+                start = len(keyed)
+        except TypeError:
+            raise InvalidCursor("Cursor does not match the sort order")
+
+    page = keyed[start:start + limit]
+    next_cursor = None
+    if start + limit < len(keyed) and page:
+        next_cursor = encode_cursor(page[-1][0])
+
+    return [entry for _, entry in page], next_cursor, len(keyed)
+
+
+def sort_entries(entries: Iterable[DirEntry], query: ListingQuery) -> List[DirEntry]:
+    """
+    Filter and, if requested, sort a listing without paging it
+    """
+    matched = filter_entries(entries, query)
+    if not query.sort_by:
+        return list(matched)
+    return sorted(matched, key=lambda entry: _sort_key(entry, query.sort_by), reverse=query.descending)
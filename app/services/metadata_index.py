@@ -0,0 +1,529 @@
+"""
+Persistent metadata index of remote directory trees
+
+Each login (host, port and user) can have a local SQLite database holding
+the path, size, mtime and type of every entry below the directories crawled
+into it, so name, size and age queries are answered without a single round
+trip to the server. An index only exists once a crawl has been started for
+that login.
+
+Crawls run in the background and are incremental: a directory whose mtime
+is unchanged since it was last listed is not listed again, only its
+subdirectories are checked. Creating, deleting or renaming an entry changes
+the mtime of its directory, but rewriting a file in place does not, so a
+full crawl is needed to pick up size changes of existing files. Listings
+fetched for other reasons also refresh the index while it exists.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional
+from app.config import get_settings
+from app.services.dir_cache import normalize_dir
+from app.services.listing import DirEntry
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    is_dir INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name);
+CREATE INDEX IF NOT EXISTS entries_ext ON entries (ext);
+CREATE INDEX IF NOT EXISTS entries_size ON entries (size);
+CREATE INDEX IF NOT EXISTS entries_mtime ON entries (mtime);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    crawled REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+SORT_COLUMNS = {"name": "name", "path": "path", "size": "size", "mtime": "mtime"}
+
+# Rows written between commits of a crawl
+_COMMIT_ROWS = 20000
+
+# A '*.ext' glob, which can be answered from the ext column
+_EXT_GLOB = re.compile(r"\*\.([^*?\[\]/]+)")
+
+
+def _ext(name: str) -> Optional[str]:
+    dot = name.rfind('.')
+    return name[dot + 1:] if dot > 0 else None
+
+
+def _subtree(path: str):
+    """
+    Bounds of the paths strictly below a directory, for a range scan
+
+    '0' sorts right after '/', so every 'path/...' falls in [path/, path0).
+    """
+    path = path.rstrip('/')
+    return path + '/', path + '0'
+
+
+def _within(path: str, root: str) -> bool:
+    return root == '/' or path == root or path.startswith(root + '/')
+
+
+class MetadataIndex:
+    """
+    SQLite database of the entries below the crawled roots of one login
+
+    One connection is shared by the crawl thread, listing hooks and search
+    requests; the lock serialises them, and WAL journaling keeps commits
+    cheap.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._pending = 0
+        self.roots: Dict[str, float] = dict(self._db.execute("SELECT path, crawled FROM roots"))
+
+    def root_for(self, path: str) -> Optional[str]:
+        """
+        Get the crawled root that covers a path, if any
+        """
+        covering = [root for root in self.roots if _within(path, root)]
+        return max(covering, key=len) if covering else None
+
+    def dir_mtime(self, path: str) -> Optional[int]:
+        """
+        Get the mtime a directory had when it was last listed
+        """
+        with self._lock:
+            row = self._db.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def child_dirs(self, path: str) -> List[str]:
+        """
+        Get the indexed subdirectories of a directory
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (path,))
+            return [row[0] for row in rows]
+
+    def replace_children(self, directory: str, entries: Iterable[DirEntry], mtime: Optional[int] = None):
+        """
+        Store the current listing of a directory
+
+        Entries that disappeared are removed with everything below them.
+
+        Args:
+            directory: Normalized directory path
+            entries: Its complete listing
+            mtime: The directory's own mtime at the time of listing, which
+                lets the next incremental crawl skip it; None forces a relist
+        """
+        rows = [
+            (entry.path, directory, entry.name, _ext(entry.name), entry.size, entry.mtime, int(entry.is_dir))
+            for entry in entries
+            if entry.name not in ('.', '..')
+        ]
+        current = {row[0]: row[6] for row in rows}
+
+        with self._lock:
+            stale = self._db.execute("SELECT path, is_dir FROM entries WHERE parent = ?", (directory,)).fetchall()
+            for path, is_dir in stale:
+                # Drop the subtree of directories that are gone or now files
+                if is_dir and not current.get(path):
+                    self._delete_tree(path)
+            self._db.executemany(
+                "DELETE FROM entries WHERE path = ?",
+                [(path,) for path, _ in stale if path not in current]
+            )
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (directory, mtime))
+            self._pending += len(rows) + 1
+
+    def forget(self, path: str):
+        """
+        Remove a path that no longer exists, and everything below it
+        """
+        with self._lock:
+            self._delete_tree(path)
+            self._db.execute("DELETE FROM entries WHERE path = ?", (path,))
+            self._db.execute("DELETE FROM dirs WHERE path = ?", (path,))
+            self._pending += 1
+
+    def _delete_tree(self, path: str):
+        low, high = _subtree(path)
+        self._db.execute("DELETE FROM entries WHERE path >= ? AND path < ?", (low, high))
+        self._db.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+
+    def commit_if_due(self):
+        """
+        Commit once enough rows have been written
+        """
+        if self._pending >= _COMMIT_ROWS:
+            self.commit()
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def add_root(self, path: str, crawled: float):
+        """
+        Record a completed crawl of a root
+        """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO roots VALUES (?, ?)", (path, crawled))
+            self.roots[path] = crawled
+            self.commit()
+
+    def search(
+        self,
+        root: str,
+        pattern: Optional[str] = None,
+        file_type: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        mtime_after: Optional[float] = None,
+        mtime_before: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False,
+        limit: int = 1000
+    ) -> List[DirEntry]:
+        """
+        Query the indexed entries below a directory
+
+        Filters have the same meaning as for a directory listing. Name
+        globs use SQLite GLOB, which is case-sensitive like fnmatchcase.
+
+        Returns:
+            Up to limit matching entries
+        """
+        conditions, params = [], []
+        if root != '/':
+            conditions.append("path >= ? AND path < ?")
+            params += _subtree(root)
+        if pattern:
+            ext_match = _EXT_GLOB.fullmatch(pattern)
+            if ext_match:
+                conditions.append("ext = ?")
+                params.append(ext_match.group(1).rsplit('.', 1)[-1])
+            conditions.append("name GLOB ?")
+            params.append(pattern.replace('[!', '[^'))
+        if file_type is not None:
+            conditions.append("is_dir = ?")
+            params.append(int(file_type == 'dir'))
+        if min_size is not None:
+            conditions.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append("size <= ?")
+            params.append(max_size)
+        if mtime_after is not None:
+            conditions.append("mtime >= ?")
+            params.append(mtime_after)
+        if mtime_before is not None:
+            conditions.append("mtime <= ?")
+            params.append(mtime_before)
+
+        sql = "SELECT name, path, size, mtime, is_dir FROM entries"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if sort_by:
+            sql += f" ORDER BY {SORT_COLUMNS[sort_by]} {'DESC' if descending else 'ASC'}"
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [DirEntry(name, path, size, mtime, bool(is_dir)) for name, path, size, mtime, is_dir in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the roots and entry count of the index
+        """
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "roots": [{"path": path, "crawledAt": crawled} for path, crawled in sorted(self.roots.items())],
+            "entries": entries,
+            "sizeBytes": os.path.getsize(self.db_path)
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+class IndexCrawl:
+    """
+    State and counters of one background crawl
+    """
+
+    def __init__(self, root: str, full: bool):
+        self.root = root
+        self.full = full
+        self.status = "running"
+        self.dirs_listed = 0
+        self.dirs_skipped = 0
+        self.entries = 0
+        self.errors = 0
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.cancelled = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "full": self.full,
+            "status": self.status,
+            "dirsListed": self.dirs_listed,
+            "dirsSkipped": self.dirs_skipped,
+            "entries": self.entries,
+            "errors": self.errors,
+            "error": self.error,
+            "startedAt": self.started,
+            "finishedAt": self.finished
+        }
+
+
+class IndexManager:
+    """
+    Singleton owning the metadata index and crawl of each login
+    """
+    _instance = None
+    _lock = threading.Lock()
+    _indexes: Dict[str, MetadataIndex] = {}
+    _crawls: Dict[str, IndexCrawl] = {}
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IndexManager, cls).__new__(cls)
+        return cls._instance
+
+    def _db_path(self, key: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", key)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:8]
+        return os.path.join(settings.index_path, f"{safe}-{digest}.sqlite")
+
+    def _open(self, key: str, create: bool = False) -> Optional[MetadataIndex]:
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+
+        db_path = self._db_path(key)
+        if not create and not os.path.exists(db_path):
+            return None
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = MetadataIndex(db_path)
+            return index
+
+    def get(self, ssh_client) -> Optional[MetadataIndex]:
+        """
+        Get the index of a login, or None if it was never crawled
+        """
+        return self._open(ssh_client.key)
+
+    def crawl(self, ssh_client, root: str, full: bool = False) -> IndexCrawl:
+        """
+        Start indexing a remote tree in the background
+
+        Args:
+            ssh_client: Connected SSHClient
+            root: Remote directory to index
+            full: Relist every directory instead of only those whose mtime
+                changed since the last crawl
+
+        Returns:
+            The new crawl
+
+        Raises:
+            RuntimeError: If a crawl is already running for this login
+        """
+        root = normalize_dir(root)
+        index = self._open(ssh_client.key, create=True)
+        with self._lock:
+            running = self._crawls.get(ssh_client.key)
+            if running is not None and running.status == "running":
+                raise RuntimeError(f"Already indexing {running.root}")
+            crawl = self._crawls[ssh_client.key] = IndexCrawl(root, full)
+
+        threading.Thread(
+            target=self._run, args=(ssh_client, index, crawl), name="index-crawl", daemon=True
+        ).start()
+        return crawl
+
+    def status(self, ssh_client) -> Optional[IndexCrawl]:
+        """
+        Get the latest crawl of a login
+        """
+        return self._crawls.get(ssh_client.key)
+
+    def record_listing(self, key: str, remote_dir: str, entries: List[DirEntry]):
+        """
+        Refresh the index from a listing fetched for another purpose
+
+        Only directories below a crawled root are recorded, so the index
+        never claims to cover a tree it has not crawled.
+        """
+        index = self._open(key)
+        if index is None or index.root_for(remote_dir) is None:
+            return
+        try:
+            index.replace_children(remote_dir, entries)
+            index.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record listing of {remote_dir} in index: {str(e)}")
+
+    def drop(self, ssh_client) -> bool:
+        """
+        Cancel any crawl and delete the index of a login
+
+        Returns:
+            True if there was an index to delete
+        """
+        key = ssh_client.key
+        with self._lock:
+            crawl = self._crawls.pop(key, None)
+            index = self._indexes.pop(key, None)
+        if crawl is not None:
+            crawl.cancelled.set()
+        if index is not None:
+            index.close()
+
+        db_path = self._db_path(key)
+        existed = os.path.exists(db_path)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        return existed
+
+    def shutdown(self):
+        """
+        Stop running crawls and close all indexes
+        """
+        with self._lock:
+            crawls = list(self._crawls.values())
+            indexes = list(self._indexes.values())
+            self._indexes.clear()
+        for crawl in crawls:
+            crawl.cancelled.set()
+        for index in indexes:
+            index.close()
+
+    def _run(self, ssh_client, index: MetadataIndex, crawl: IndexCrawl):
+        logger.info(f"Indexing {crawl.root} for {ssh_client.key} ({'full' if crawl.full else 'incremental'})")
+        try:
+            with ssh_client.track_operation():
+                self._crawl(ssh_client, index, crawl)
+            if crawl.cancelled.is_set():
+                crawl.status = "cancelled"
+                index.commit()
+            else:
+                index.add_root(crawl.root, crawl.started)
+                crawl.status = "done"
+        except Exception as e:
+            logger.error(f"Indexing {crawl.root} failed: {str(e)}")
+            crawl.status = "failed"
+            crawl.error = str(e)
+            try:
+                index.commit()
+            except sqlite3.Error:
+                pass
+        finally:
+            crawl.finished = time.time()
+
+        logger.info(
+            f"Indexing {crawl.root} {crawl.status}: {crawl.dirs_listed} directories listed, "
+            f"{crawl.dirs_skipped} unchanged, {crawl.entries} entries"
+        )
+
+    def _crawl(self, ssh_client, index: MetadataIndex, crawl: IndexCrawl):
+        """
+        Walk the tree breadth-first, listing only directories that changed
+
+        Workers on their own SFTP channels stat (and, when needed, list)
+        directories; this thread alone writes to the database.
+        """
+        workers = max(1, settings.walk_workers)
+        # Same-second changes leave mtime as is, so an mtime this recent is
+        # not trusted and the directory is relisted next time
+        unstable_after = crawl.started - 2
+
+        with ssh_client.dedicated_channels() as channel, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="index-crawl") as pool:
+
+            def scan(directory: str, known_mtime: Optional[int]):
+                sftp = channel()
+                mtime = sftp.stat(directory).st_mtime
+                if known_mtime is not None and mtime == known_mtime:
+                    return mtime, None
+                return mtime, sftp.listdir_attr(directory)
+
+            todo = deque([crawl.root])
+            running = {}
+            try:
+                while (todo or running) and not crawl.cancelled.is_set():
+                    while todo and len(running) < workers * 2:
+                        directory = todo.popleft()
+                        known_mtime = None if crawl.full else index.dir_mtime(directory)
+                        running[pool.submit(scan, directory, known_mtime)] = directory
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        directory = running.pop(future)
+                        try:
+                            mtime, attrs = future.result()
+                        except FileNotFoundError:
+                            if directory == crawl.root:
+                                raise
+                            index.forget(directory)
+                            continue
+                        except IOError as e:
+                            if directory == crawl.root:
+                                raise
+                            logger.warning(f"Cannot index {directory}: {str(e)}")
+                            crawl.errors += 1
+                            continue
+
+                        if attrs is None:
+                            crawl.dirs_skipped += 1
+                            todo.extend(index.child_dirs(directory))
+                            continue
+
+                        entries = [DirEntry.from_attr(directory, attr) for attr in attrs]
+                        index.replace_children(directory, entries, mtime if mtime < unstable_after else None)
+                        index.commit_if_due()
+                        crawl.dirs_listed += 1
+                        crawl.entries += len(entries)
+                        todo.extend(entry.path for entry in entries if entry.is_dir)
+            finally:
+                for future in running:
+                    future.cancel()
+
+
+# Create a singleton instance
+index_manager = IndexManager()
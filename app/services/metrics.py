@@ -0,0 +1,395 @@
+"""
+In-process metrics registry with Prometheus text exposition
+
+Counters, gauges and histograms are plain Python objects updated under a
+per-series lock, cheap enough for every request and SFTP round trip.
+Values that are only interesting at scrape time, like pool occupancy or
+temp-dir usage, come from collector functions run by render().
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.config import get_settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collected family: name, type, help and (labels, value) samples
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Value:
+    """
+    One series of a counter or gauge
+    """
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _Buckets:
+    """
+    One series of a histogram
+    """
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names and one series per
+    combination of label values
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self):
+        return _Value()
+
+    def labels(self, *values: Any):
+        """
+        Get the series for the given label values, creating it on first use
+
+        Callers on hot paths should keep the returned series rather than
+        look it up again.
+        """
+        key = tuple(str(value) for value in values)
+        series = self._series.get(key)
+        if series is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            series = list(self._series.items())
+        return [
+            (self.name, dict(zip(self.label_names, key)), value.value)
+            for key, value in series
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            series = list(self._series.items())
+
+        samples = []
+        for key, value in series:
+            labels = dict(zip(self.label_names, key))
+            with value._lock:
+                counts, total, count = list(value.counts), value.sum, value.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Singleton holding every metric and scrape-time collector
+    """
+    _instance = None
+    _lock = threading.Lock()
+    _metrics: Dict[str, Metric] = {}
+    _collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+        return cls._instance
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        """
+        Register a function returning metric families computed at scrape time
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Format every metric in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector {collector.__name__} failed: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Create a singleton instance
+registry = MetricsRegistry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body",
+    ("method", "route")
+)
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+ssh_method_seconds = registry.histogram(
+    "ssh_client_method_duration_seconds", "Duration of SSHClient operations", ("method",)
+)
+transfer_bytes = registry.counter(
+    "sftp_transferred_bytes_total", "File data moved over SSH connections", ("direction", "host")
+)
+sftp_requests = registry.counter(
+    "sftp_requests_total", "SFTP requests sent, each answered by one round trip", ("host", "op")
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+
+
+def timed(histogram: Histogram):
+    """
+    Decorator observing the duration of each call in a histogram labelled
+    with the function name; coroutine functions are timed until they finish
+    """
+    def decorate(func):
+        series = histogram.labels(func.__name__)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    series.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def peer_label(transport) -> str:
+    """
+    Label an SSH transport by the address of the server
+    """
+    try:
+        host, port = transport.getpeername()[:2]
+        return f"{host}:{port}"
+    except Exception:
+        return "unknown"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and status of every HTTP request
+
+    Requests are labelled with the route template (e.g. /jobs/{job_id}),
+    not the raw path, so the number of series stays bounded. Streaming
+    responses are timed until their last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "other"
+            http_request_seconds.labels(scope["method"], route).observe(time.perf_counter() - start)
+            http_requests.labels(scope["method"], route, status).inc()
+
+
+_loop_monitor: Optional[asyncio.Task] = None
+
+
+async def _watch_event_loop(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - expected))
+
+
+def start_loop_monitor():
+    """
+    Start measuring event-loop lag on the running loop
+    """
+    global _loop_monitor
+    if _loop_monitor is None or _loop_monitor.done():
+        _loop_monitor = asyncio.get_running_loop().create_task(_watch_event_loop(settings.metrics_loop_interval))
+
+
+def stop_loop_monitor():
+    if _loop_monitor is not None:
+        _loop_monitor.cancel()
+
+
+def _dir_usage(path: str) -> Tuple[int, int]:
+    total, files = 0, 0
+    pending = [path]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                        files += 1
+        except OSError:
+            continue
+    return total, files
+
+
+def _temp_dir_metrics() -> List[Family]:
+    usage = {path: _dir_usage(path) for path in (settings.tmp_path, settings.upload_tmp_path)}
+    return [
+        ("temp_dir_bytes", "gauge", "Bytes of files in the temp directories",
+         [({"path": path}, size) for path, (size, _) in usage.items()]),
+        ("temp_dir_files", "gauge", "Number of files in the temp directories",
+         [({"path": path}, files) for path, (_, files) in usage.items()]),
+    ]
+
+
+registry.add_collector(_temp_dir_metrics)
@@ -0,0 +1,293 @@
+"""
+Server-side copy and move of remote files and directory trees
+
+Data never passes through this host's disk. The fastest available method is
+used: ``cp --reflink=auto`` on the remote host (copy-on-write clones where the
+filesystem supports them), then the SFTP ``copy-data`` extension, which
+copies inside the SFTP server, and finally a pipelined stream that reads and
+writes over SFTP without holding more than a bounded window in memory.
+"""
+import errno
+import posixpath
+import shlex
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+import paramiko
+from paramiko.sftp import CMD_EXTENDED, int64
+from app.config import get_settings
+from app.services.remote_io import RemoteFileReader, RemoteFileWriter
+from app.services.remote_walk import walk
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+
+class RemoteCopier:
+    """
+    Copies and moves paths on one connection
+
+    Which methods the server supports is discovered on first use and
+    remembered for the lifetime of the copier's SSHClient.
+    """
+    def __init__(self, ssh_client):
+        """
+        Args:
+            ssh_client: Connected SSHClient
+        """
+        self.ssh_client = ssh_client
+        self._lock = threading.Lock()
+
+    def copy(self, src: str, dst: str) -> Dict[str, Any]:
+        """
+        Copy a file or directory tree to a new path on the same server
+
+        Args:
+            src: Existing file or directory
+            dst: Destination path; must not exist yet
+
+        Returns:
+            Summary with the method used and, for SFTP copies, the number of
+            files and bytes copied
+
+        Raises:
+            IOError: If the source is missing, the destination exists or
+                lies inside the source, or the copy fails
+        """
+        src, dst = self._check_paths(src, dst)
+        try:
+            if self._exec_available():
+                self._run(self._cp_command(src, dst))
+                return {"method": "exec"}
+            return self._copy_sftp(src, dst)
+        finally:
+            self.ssh_client.dir_cache.invalidate_parent(dst)
+            self.ssh_client.dir_cache.invalidate_tree(dst)
+
+    def move(self, src: str, dst: str) -> Dict[str, Any]:
+        """
+        Move a file or directory tree, also across filesystems
+
+        A plain rename is tried first. If the server refuses it, e.g.
+        because the destination is on another filesystem, ``mv`` is run on
+        the remote host, or the tree is copied over SFTP and the source
+        removed afterwards.
+
+        Args:
+            src: Existing file or directory
+            dst: Destination path; must not exist yet
+
+        Returns:
+            Summary with the method used
+
+        Raises:
+            IOError: If the source is missing, the destination exists or
+                lies inside the source, or the move fails
+        """
+        src, dst = self._check_paths(src, dst)
+        try:
+            try:
+                with self.ssh_client.sftp_channel() as sftp:
+                    sftp.rename(src, dst)
+                return {"method": "rename"}
+            except IOError as e:
+                logger.info(f"Rename of {src} to {dst} failed ({str(e)}), moving by copy")
+
+            if self._exec_available():
+                self._run(f"mv -- {shlex.quote(src)} {shlex.quote(dst)}")
+                return {"method": "exec"}
+
+            summary = self._copy_sftp(src, dst)
+            self._remove_tree(src)
+            return summary
+        finally:
+            self.ssh_client._invalidate_move(src, dst)
+
+    def _check_paths(self, src: str, dst: str):
+        src = posixpath.normpath(src)
+        dst = posixpath.normpath(dst)
+        if src == '/' or dst == '/':
+            raise IOError("Cannot copy or move the root directory")
+        if dst == src or dst.startswith(src.rstrip('/') + '/'):
+            raise IOError("Destination lies inside the source")
+
+        with self.ssh_client.sftp_channel() as sftp:
+            sftp.lstat(src)
+            try:
+                sftp.lstat(dst)
+            except IOError as e:
+                if e.errno == errno.ENOENT:
+                    return src, dst
+                raise
+        raise IOError(f"Destination already exists: {dst}")
+
+    def _exec_available(self) -> bool:
+        return self.ssh_client.has_command("cp") and self.ssh_client.has_command("mv")
+
+    def _cp_command(self, src: str, dst: str) -> str:
+        capabilities = self.ssh_client.capabilities
+        if "cp-reflink" not in capabilities:
+            # GNU cp clones extents when the filesystem allows it; other cp
+            # implementations reject the option
+            exit_status, _, _ = self.ssh_client.exec_command("cp --reflink=auto --help >/dev/null 2>&1")
+            capabilities["cp-reflink"] = exit_status == 0
+
+        flags = "-R --reflink=auto" if capabilities["cp-reflink"] else "-R"
+        return f"cp {flags} -- {shlex.quote(src)} {shlex.quote(dst)}"
+
+    def _run(self, command: str):
+        exit_status, _, error = self.ssh_client.exec_command(command)
+        if exit_status != 0:
+            raise IOError(error.decode(errors='replace').strip() or f"Exit status {exit_status}")
+
+    def _copy_sftp(self, src: str, dst: str) -> Dict[str, Any]:
+        """
+        Copy a path over SFTP, spreading the files of a tree over workers
+        """
+        summary = {"method": "stream", "files": 0, "bytes": 0}
+        with self.ssh_client.sftp_channel() as sftp:
+            attr = sftp.lstat(src)
+
+            if not stat.S_ISDIR(attr.st_mode):
+                with self.ssh_client.dedicated_channels() as channel:
+                    self._copy_entry(channel, src, dst, attr, summary)
+                return summary
+
+            # Directories are created in walk order, before their contents, on
+            # this thread's channel; files are then copied in parallel, each
+            # worker thread on its own channel. Directory modes are applied
+            # last so a read-only directory can still be filled.
+            def on_error(path: str, error: Exception):
+                raise error
+
+            sftp.mkdir(dst)
+            dirs = [(dst, attr)]
+            files: List = []
+            for entry in walk(sftp, src, on_error):
+                target = posixpath.join(dst, entry.rel_path)
+                if entry.is_dir:
+                    sftp.mkdir(target)
+                    dirs.append((target, entry.attr))
+                else:
+                    files.append((entry.path, target, entry.attr))
+
+            with self.ssh_client.dedicated_channels() as channel, \
+                    ThreadPoolExecutor(max_workers=max(1, settings.copy_parallel_files),
+                                       thread_name_prefix="remote-copy") as pool:
+                futures = [
+                    pool.submit(self._copy_in_worker, channel, path, target, file_attr, summary)
+                    for path, target, file_attr in files
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+            for target, dir_attr in reversed(dirs):
+                sftp.chmod(target, dir_attr.st_mode & 0o7777)
+            return summary
+
+    def _copy_in_worker(self, channel: Callable[..., paramiko.SFTPClient], src: str, dst: str,
+                        attr: paramiko.SFTPAttributes, summary: Dict[str, Any]):
+        with self.ssh_client.track_operation():
+            self._copy_entry(channel, src, dst, attr, summary)
+
+    def _copy_entry(self, channel: Callable[..., paramiko.SFTPClient], src: str, dst: str,
+                    attr: paramiko.SFTPAttributes, summary: Dict[str, Any]):
+        """
+        Copy a single file or symlink; special files are skipped
+        """
+        sftp = channel()
+        if stat.S_ISLNK(attr.st_mode):
+            sftp.symlink(sftp.readlink(src), dst)
+            return
+        if not stat.S_ISREG(attr.st_mode):
+            logger.warning(f"Not copying special file {src}")
+            return
+
+        if self._copy_data(sftp, src, dst):
+            with self._lock:
+                summary["method"] = "copy-data"
+        else:
+            self._stream(sftp, channel(1), src, dst)
+        sftp.chmod(dst, attr.st_mode & 0o7777)
+        with self._lock:
+            summary["files"] += 1
+            summary["bytes"] += attr.st_size or 0
+
+    def _copy_data(self, sftp: paramiko.SFTPClient, src: str, dst: str) -> bool:
+        """
+        Copy a file inside the SFTP server with the copy-data extension
+
+        Returns:
+            False if the server does not support copy-data
+        """
+        capabilities = self.ssh_client.capabilities
+        if capabilities.get("copy-data") is False:
+            return False
+
+        with sftp.open(src, 'rb') as source, sftp.open(dst, 'wb') as target:
+            try:
+                # Read from offset 0 to end of file, write at offset 0
+                sftp._request(
+                    CMD_EXTENDED, "copy-data",
+                    source.handle, int64(0), int64(0),
+                    target.handle, int64(0)
+                )
+            except IOError as e:
+                # paramiko does not expose the server's extension list, so
+                # support is learnt from the first attempt
+                if e.errno is not None or capabilities.get("copy-data"):
+                    raise
+                logger.info(f"SFTP server does not support copy-data: {str(e)}")
+                capabilities["copy-data"] = False
+                return False
+        capabilities["copy-data"] = True
+        return True
+
+    def _stream(self, source: paramiko.SFTPClient, target: paramiko.SFTPClient, src: str, dst: str):
+        """
+        Copy a file by reading and writing it in pipelined windows
+
+        Reads and writes go over separate channels: the server answers
+        requests in order, so a batch of unread read responses would
+        otherwise stop it from accepting the writes queued behind them.
+        """
+        reader = RemoteFileReader(
+            source, src,
+            chunk_size=settings.transfer_chunk_size,
+            pipeline_depth=settings.transfer_pipeline_depth
+        )
+        writer = RemoteFileWriter(target, dst)
+        try:
+            for data in reader:
+                writer.write(data)
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+        finally:
+            reader.close()
+
+    def _remove_tree(self, path: str):
+        """
+        Remove a file or directory tree over SFTP, contents first
+        """
+        with self.ssh_client.sftp_channel() as sftp:
+            if not stat.S_ISDIR(sftp.lstat(path).st_mode):
+                sftp.remove(path)
+                return
+
+            dirs = [path]
+            for entry in walk(sftp, path):
+                if entry.is_dir:
+                    dirs.append(entry.path)
+                else:
+                    sftp.remove(entry.path)
+            for directory in reversed(dirs):
+                sftp.rmdir(directory)
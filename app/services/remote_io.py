@@ -0,0 +1,386 @@
+"""
+Streaming readers and writers for remote SFTP files and command output
+"""
+import select
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import paramiko
+from paramiko.sftp import CMD_DATA, CMD_NAMES, CMD_READ, CMD_STATUS, SFTPError, int64
+from app.services.metrics import peer_label, sftp_requests, transfer_bytes
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+
+class MeteredSFTPClient(paramiko.SFTPClient):
+    """
+    SFTPClient that counts the requests it sends, per operation
+
+    Every request costs one round trip to the server, so the counts show
+    which operations a workload is bound by.
+    """
+    def __init__(self, sock: paramiko.Channel):
+        self.host = peer_label(sock.get_transport())
+        self._request_counts = {}
+        super().__init__(sock)
+
+    def _async_request(self, fileobj, t, *args):
+        counter = self._request_counts.get(t)
+        if counter is None:
+            counter = self._request_counts[t] = sftp_requests.labels(self.host, CMD_NAMES.get(t, str(t)))
+        counter.inc()
+        return super()._async_request(fileobj, t, *args)
+
+
+class _ReadReplies:
+    """
+    Collects the replies to pipelined read requests
+
+    SFTPClient hands every reply to the object its request was sent with,
+    whichever request the reading thread is waiting for.
+    """
+    def __init__(self):
+        self.replies: Dict[int, Tuple[int, paramiko.Message]] = {}
+
+    def _async_response(self, t: int, msg: paramiko.Message, num: int):
+        self.replies[num] = (t, msg)
+
+
+class RemoteFileReader:
+    """
+    Iterator over a remote file that keeps a bounded window of SFTP reads in flight
+
+    The file is read as a sequence of fixed-size chunks. At most
+    ``pipeline_depth`` chunks are requested ahead of the consumer, so memory
+    use per transfer never exceeds ``chunk_size * pipeline_depth`` regardless
+    of the file size. Reads and close() are serialized, so the reader may be
+    closed from another thread while a chunk is still being fetched.
+    """
+    def __init__(
+        self,
+        sftp: paramiko.SFTPClient,
+        remote_path: str,
+        offset: int = 0,
+        length: Optional[int] = None,
+        chunk_size: int = 262144,
+        pipeline_depth: int = 16,
+        on_close: Optional[Callable[[], None]] = None
+    ):
+        """
+        Open the remote file for reading
+
+        Args:
+            sftp: SFTP client to read through
+            remote_path: Path to the remote file
+            offset: First byte to read
+            length: Number of bytes to read (default: until end of file)
+            chunk_size: Size of each chunk yielded to the consumer
+            pipeline_depth: Number of chunks kept in flight
+            on_close: Called once the file has been closed
+
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        self.remote_path = remote_path
+        self.chunk_size = max(1, chunk_size)
+        self.pipeline_depth = max(1, pipeline_depth)
+        # Bytes delivered and time spent waiting on the server for them
+        self.bytes_read = 0
+        self.busy_time = 0.0
+        self._on_close = on_close
+        # Reentrant: the chunk generator closes the reader when it finishes
+        self._lock = threading.RLock()
+        self._bytes_counter = transfer_bytes.labels("download", getattr(sftp, 'host', 'unknown'))
+
+        self._sftp = sftp
+        self._replies = _ReadReplies()
+        self._file = sftp.open(remote_path, 'rb')
+        try:
+            self.attributes = self._file.stat()
+        except Exception:
+            self._file.close()
+            raise
+
+        self.size = self.attributes.st_size
+        self.offset = min(max(0, offset), self.size)
+        if length is None:
+            length = self.size - self.offset
+        self.length = max(0, min(length, self.size - self.offset))
+
+        self._chunks = self._read_chunks()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        with self._lock:
+            if self._file is None:
+                raise StopIteration
+            start = time.monotonic()
+            try:
+                data = next(self._chunks)
+            finally:
+                self.busy_time += time.monotonic() - start
+        self.bytes_read += len(data)
+        self._bytes_counter.inc(len(data))
+        return data
+
+    def _read_chunks(self) -> Iterator[bytes]:
+        """
+        Yield the requested byte range chunk by chunk
+        """
+        position = self.offset
+        end = self.offset + self.length
+
+        try:
+            while position < end:
+                # Request the next window of chunks in one pipelined batch
+                window = []
+                while position < end and len(window) < self.pipeline_depth:
+                    size = min(self.chunk_size, end - position)
+                    window.append((position, size))
+                    position += size
+
+                for data in self._read_window(window):
+                    if not data:
+                        logger.warning(f"Unexpected end of file while reading {self.remote_path}")
+                        return
+                    yield data
+        finally:
+            self.close()
+
+    def _read_window(self, window: List[Tuple[int, int]]) -> Iterator[bytes]:
+        """
+        Read a window of chunks with every request sent before the first read
+
+        The requests are sent directly rather than through SFTPFile.readv,
+        which issues them from a background thread and stops prefetching if
+        a reply is processed before the next request is registered. It then
+        falls back to one synchronous round trip per 32 KiB, and the
+        outstanding replies download the window a second time.
+        """
+        handle = self._file.handle
+        chunks = []
+        for offset, size in window:
+            requests = []
+            while size > 0:
+                request_size = min(size, self._file.MAX_REQUEST_SIZE)
+                num = self._sftp._async_request(self._replies, CMD_READ, handle, int64(offset), int(request_size))
+                requests.append((offset, request_size, num))
+                offset += request_size
+                size -= request_size
+            chunks.append(requests)
+
+        for requests in chunks:
+            yield b"".join(self._reply(*request) for request in requests)
+
+    def _reply(self, offset: int, size: int, num: int) -> bytes:
+        """
+        Wait for the reply to one read request and return its data
+        """
+        while num not in self._replies.replies:
+            self._sftp._read_response()
+        t, msg = self._replies.replies.pop(num)
+
+        if t == CMD_STATUS:
+            try:
+                self._sftp._convert_status(msg)
+            except EOFError:
+                return b""
+            raise SFTPError("Expected data")
+        if t != CMD_DATA:
+            raise SFTPError("Expected data")
+
+        data = msg.get_string()
+        if 0 < len(data) < size:
+            # Servers may return less than asked for before end of file
+            self._file.seek(offset + len(data))
+            data += self._file.read(size - len(data))
+        return data
+
+    def close(self):
+        """
+        Close the remote file handle, waiting for a read in progress
+        """
+        with self._lock:
+            if self._file is None:
+                return
+
+            remote_file, self._file = self._file, None
+            try:
+                remote_file.close()
+            except Exception as e:
+                logger.error(f"Error closing remote file {self.remote_path}: {str(e)}")
+            finally:
+                if self._on_close:
+                    self._on_close()
+
+
+class RemoteFileWriter:
+    """
+    Sequential writer for a remote file using pipelined SFTP writes
+
+    Each write is sent without waiting for the server acknowledgement, so the
+    caller can keep receiving data while earlier writes are still in flight.
+    Outstanding acknowledgements are collected on close(), which raises if any
+    write failed.
+    """
+    def __init__(
+        self,
+        sftp: paramiko.SFTPClient,
+        remote_path: str,
+        offset: Optional[int] = None,
+        on_close: Optional[Callable[[], None]] = None,
+        remove: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Open the remote file for writing
+
+        Args:
+            sftp: SFTP client to write through
+            remote_path: Path to the remote file
+            offset: Write into an existing file starting at this byte
+                instead of creating or truncating it
+            on_close: Called once the file has been closed
+            remove: Deletes the partial file on abort(), which happens after
+                close (default: sftp.remove); needed when on_close gives
+                the channel back to a pool
+
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        self.remote_path = remote_path
+        self.bytes_written = 0
+        self._on_close = on_close
+        self._remove = remove or sftp.remove
+        self._bytes_counter = transfer_bytes.labels("upload", getattr(sftp, 'host', 'unknown'))
+
+        if offset is None:
+            self._file = sftp.open(remote_path, 'wb')
+        else:
+            self._file = sftp.open(remote_path, 'r+b')
+            self._file.seek(offset)
+        self._file.set_pipelined(True)
+
+    def write(self, data: bytes):
+        """
+        Queue a block of data for the remote file
+        """
+        self._file.write(data)
+        self.bytes_written += len(data)
+        self._bytes_counter.inc(len(data))
+
+    def close(self):
+        """
+        Flush outstanding writes and close the remote file
+
+        Raises:
+            IOError: If any pipelined write was rejected by the server
+        """
+        if self._file is not None:
+            remote_file, self._file = self._file, None
+            try:
+                remote_file.close()
+            finally:
+                if self._on_close:
+                    self._on_close()
+
+    def abort(self):
+        """
+        Close the remote file and remove the partial upload
+        """
+        try:
+            self.close()
+        except Exception:
+            pass
+        try:
+            self._remove(self.remote_path)
+            logger.info(f"Removed partial upload {self.remote_path}")
+        except Exception as e:
+            logger.error(f"Error removing partial upload {self.remote_path}: {str(e)}")
+
+
+class RemoteCommandStream:
+    """
+    Iterator over the standard output of a remote command
+
+    Output is yielded as it arrives, so arbitrarily large results (e.g. a
+    tar stream) are never held in memory. Standard error is drained while
+    waiting for output, keeping only its tail, so a command that writes
+    much more to stderr than to stdout cannot fill the channel window and
+    stall. ``exit_status`` and ``stderr`` are available once the output is
+    exhausted.
+    """
+    STDERR_LIMIT = 65536
+    # Upper bound on a single wait, in case a wakeup is missed
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, channel: paramiko.Channel, command: str, chunk_size: int = 262144):
+        """
+        Start a command on an open session channel
+
+        Args:
+            channel: Fresh session channel to run the command on
+            command: Shell command to run
+            chunk_size: Largest block yielded to the consumer
+
+        Raises:
+            paramiko.SSHException: If the server refuses to run the command
+        """
+        self.command = command
+        self.chunk_size = max(1, chunk_size)
+        self.exit_status: Optional[int] = None
+        self._stderr = bytearray()
+        self._channel = channel
+        self._bytes_counter = transfer_bytes.labels("download", peer_label(channel.get_transport()))
+        self._channel.exec_command(command)
+
+    @property
+    def stderr(self) -> str:
+        return self._stderr.decode(errors='replace').strip()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        if self._channel is None:
+            raise StopIteration
+
+        # Wait on both streams: blocking in recv() alone would leave stderr
+        # unread while the command waits for its window to reopen
+        channel = self._channel
+        while not (channel.recv_ready() or channel.eof_received or channel.closed):
+            if channel.recv_stderr_ready():
+                self._drain_stderr()
+            else:
+                select.select([channel], [], [], self.POLL_INTERVAL)
+
+        data = channel.recv(self.chunk_size)
+        self._drain_stderr()
+        if data:
+            self._bytes_counter.inc(len(data))
+            return data
+
+        # End of output: collect the rest of stderr and the exit status
+        self.exit_status = self._channel.recv_exit_status()
+        self._drain_stderr()
+        self.close()
+        raise StopIteration
+
+    def _drain_stderr(self):
+        while self._channel.recv_stderr_ready():
+            self._stderr += self._channel.recv_stderr(self.STDERR_LIMIT)
+        if len(self._stderr) > self.STDERR_LIMIT:
+            del self._stderr[:-self.STDERR_LIMIT]
+
+    def close(self):
+        """
+        Close the channel, terminating the command if it is still running
+        """
+        if self._channel is not None:
+            channel, self._channel = self._channel, None
+            try:
+                channel.close()
+            except Exception as e:
+                logger.error(f"Error closing command channel for {self.command}: {str(e)}")
@@ -0,0 +1,220 @@
+"""
+Recursive search and disk usage of remote directory trees
+
+Both are computed from a stream of tree entries. When the server runs
+commands and has a GNU-compatible ``find``, a single ``find -printf`` run
+produces the whole stream without any per-directory round trips.
+Otherwise the tree is walked over SFTP with parallel_walk().
+"""
+import heapq
+import posixpath
+import shlex
+import stat
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from app.services.dir_cache import normalize_dir
+from app.services.listing import DirEntry
+from app.services.remote_walk import parallel_walk
+from app.utils.logger import get_logger
+
+logger = get_logger()
+
+# find -printf record: type, size, mtime, path relative to the root
+_FIND_FORMAT = r"%y %s %T@ %P\0"
+
+
+def _find_available(ssh_client) -> bool:
+    """
+    Check once per connection whether find supports -printf
+    """
+    capabilities = ssh_client.capabilities
+    if "find-printf" not in capabilities:
+        supported = False
+        if ssh_client.has_command("find"):
+            exit_status, _, _ = ssh_client.exec_command("find -H / -maxdepth 0 -printf '' >/dev/null 2>&1")
+            supported = exit_status == 0
+        capabilities["find-printf"] = supported
+    return capabilities["find-printf"]
+
+
+def _find_command(root: str, max_depth: Optional[int], file_type: Optional[str], pattern: Optional[str]) -> str:
+    # -H follows root itself if it is a symlink, as an SFTP listing would;
+    # a leading '-' would be taken for an option
+    start = root if not root.startswith('-') else './' + root
+    args = ["find", "-H", start, "-mindepth", "1"]
+    if max_depth is not None:
+        args += ["-maxdepth", str(max_depth)]
+    if pattern:
+        args += ["-name", pattern]
+    if file_type == 'dir':
+        args += ["-type", "d"]
+    elif file_type == 'file':
+        args += ["!", "-type", "d"]
+    args += ["-printf", _FIND_FORMAT]
+    return " ".join(shlex.quote(arg) for arg in args)
+
+
+def _find_entries(ssh_client, root: str, max_depth: Optional[int],
+                  file_type: Optional[str], pattern: Optional[str]) -> Iterator[DirEntry]:
+    """
+    Stream tree entries from a remote find run
+    """
+    stream = ssh_client.open_command(_find_command(root, max_depth, file_type, pattern))
+    pending = b""
+    try:
+        for chunk in stream:
+            records = (pending + chunk).split(b"\0")
+            pending = records.pop()
+            for record in records:
+                kind, size, mtime, rel_path = record.split(b" ", 3)
+                rel_path = rel_path.decode(errors='replace')
+                path = posixpath.join(root, rel_path)
+                yield DirEntry(
+                    posixpath.basename(rel_path),
+                    path,
+                    int(size),
+                    int(float(mtime)),
+                    kind == b"d"
+                )
+    finally:
+        stream.close()
+
+    # find reports unreadable directories on stderr and carries on
+    if stream.exit_status:
+        logger.warning(f"find under {root} exited with {stream.exit_status}: {stream.stderr[-500:]}")
+
+
+def _walk_entries(ssh_client, root: str, max_depth: Optional[int]) -> Iterator[DirEntry]:
+    """
+    Stream tree entries from a parallel SFTP walk
+    """
+    for entry in parallel_walk(ssh_client, root, max_depth):
+        yield DirEntry.from_attr(posixpath.dirname(entry.path), entry.attr)
+
+
+def tree_entries(
+    ssh_client,
+    root: str,
+    max_depth: Optional[int] = None,
+    file_type: Optional[str] = None,
+    pattern: Optional[str] = None,
+    method: str = "auto"
+) -> Iterator[DirEntry]:
+    """
+    Stream every entry below a remote directory
+
+    file_type and pattern only narrow what the exec fast path sends; callers
+    still apply their full filter to the result.
+
+    Args:
+        ssh_client: Connected SSHClient
+        root: Remote directory
+        max_depth: Deepest level to include, 1 being root's own entries
+        file_type: 'file' or 'dir' to skip the other kind where possible
+        pattern: Name glob to skip non-matching entries where possible
+        method: 'exec' (remote find), 'sftp' (parallel walk) or 'auto'
+
+    Returns:
+        Iterator over DirEntry tuples, in no particular order
+
+    Raises:
+        FileNotFoundError: If root does not exist
+        NotADirectoryError: If root is not a directory
+        IOError: If method is 'exec' and the server cannot run find
+    """
+    root = normalize_dir(root)
+    if not stat.S_ISDIR(ssh_client.stat_file(root).st_mode):
+        raise NotADirectoryError(f"{root} is not a directory")
+
+    if method == "exec" and not _find_available(ssh_client):
+        raise IOError("The server cannot run find -printf")
+
+    if method != "sftp" and _find_available(ssh_client):
+        logger.info(f"Scanning {root} with remote find")
+        return _find_entries(ssh_client, root, max_depth, file_type, pattern)
+    logger.info(f"Scanning {root} over SFTP")
+    return _walk_entries(ssh_client, root, max_depth)
+
+
+def batched(entries: Iterable[DirEntry], batch_size: int = 256) -> Iterator[List[DirEntry]]:
+    """
+    Group a stream of entries into lists, e.g. for iterate_blocking
+
+    Closing the batches closes the entry stream too, stopping its scan.
+    """
+    batch = []
+    try:
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        close = getattr(entries, 'close', None)
+        if close is not None:
+            close()
+
+
+def disk_usage(ssh_client, root: str, max_depth: Optional[int] = None,
+               top: int = 10, method: str = "auto") -> Dict[str, Any]:
+    """
+    Add up the size of a remote tree, like du --apparent-size
+
+    Sizes are the sum of file (and symlink) sizes; directories themselves
+    count as zero bytes.
+
+    Args:
+        ssh_client: Connected SSHClient
+        root: Remote directory
+        max_depth: Deepest level to count (default: unlimited)
+        top: Number of largest files to report
+        method: 'exec', 'sftp' or 'auto', as for tree_entries()
+
+    Returns:
+        Totals for the tree, per-entry totals of root's direct children
+        sorted by size, and the largest files
+
+    Raises:
+        FileNotFoundError: If root does not exist
+        NotADirectoryError: If root is not a directory
+    """
+    root = normalize_dir(root)
+    prefix = root if root == '/' else root + '/'
+    summary = {"path": root, "size": 0, "files": 0, "dirs": 0}
+    children: Dict[str, Dict[str, Any]] = {}
+    largest: List = []
+
+    for entry in tree_entries(ssh_client, root, max_depth, method=method):
+        child_name = entry.path[len(prefix):].split('/', 1)[0]
+        child = children.get(child_name)
+        if child is None:
+            child = children[child_name] = {
+                "name": child_name,
+                "path": prefix + child_name,
+                "type": "file",
+                "size": 0,
+                "files": 0
+            }
+
+        if entry.is_dir:
+            summary["dirs"] += 1
+            if entry.path == child["path"]:
+                child["type"] = "dir"
+            continue
+
+        summary["files"] += 1
+        summary["size"] += entry.size
+        child["files"] += 1
+        child["size"] += entry.size
+
+        if top > 0:
+            item = (entry.size, entry.path, entry)
+            if len(largest) < top:
+                heapq.heappush(largest, item)
+            elif item > largest[0]:
+                heapq.heapreplace(largest, item)
+
+    summary["children"] = sorted(children.values(), key=lambda child: (-child["size"], child["name"]))
+    summary["largest"] = [entry.to_dict() for _, _, entry in sorted(largest, reverse=True)]
+    return summary
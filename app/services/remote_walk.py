@@ -0,0 +1,157 @@
+"""
+Recursive traversal of remote directory trees
+"""
+import posixpath
+import stat
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, NamedTuple, Optional
+import paramiko
+from app.config import get_settings
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+
+class WalkEntry(NamedTuple):
+    """
+    A file, directory or symlink found while walking a tree
+    """
+    path: str
+    rel_path: str
+    attr: paramiko.SFTPAttributes
+
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.attr.st_mode or 0)
+
+    @property
+    def is_file(self) -> bool:
+        return stat.S_ISREG(self.attr.st_mode or 0)
+
+    @property
+    def is_link(self) -> bool:
+        return stat.S_ISLNK(self.attr.st_mode or 0)
+
+
+def walk(
+    sftp: paramiko.SFTPClient,
+    root: str,
+    on_error: Optional[Callable[[str, Exception], None]] = None
+) -> Iterator[WalkEntry]:
+    """
+    Walk a remote tree depth-first, yielding each directory before its contents
+
+    Entries are yielded in name order so the traversal is deterministic.
+    Symlinks are reported but never followed, so link cycles cannot cause
+    an endless walk. Directories that cannot be listed are skipped.
+
+    Args:
+        sftp: SFTP client to list through
+        root: Remote directory to walk; it is not yielded itself
+        on_error: Called with (path, exception) for each unreadable directory
+
+    Yields:
+        WalkEntry with the absolute path, the path relative to root and the
+        entry's lstat attributes
+    """
+    root = root.rstrip('/') or '/'
+    stack = [(root, '')]
+    while stack:
+        directory, rel_dir = stack.pop()
+        try:
+            attrs = sorted(sftp.listdir_attr(directory), key=lambda a: a.filename)
+        except IOError as e:
+            logger.warning(f"Cannot list {directory}: {str(e)}")
+            if on_error:
+                on_error(directory, e)
+            continue
+
+        subdirs = []
+        for attr in attrs:
+            if attr.filename in ('.', '..'):
+                continue
+            entry = WalkEntry(
+                posixpath.join(directory, attr.filename),
+                posixpath.join(rel_dir, attr.filename) if rel_dir else attr.filename,
+                attr
+            )
+            yield entry
+            if entry.is_dir:
+                subdirs.append(entry)
+
+        # Reversed so the stack pops subdirectories in name order
+        for entry in reversed(subdirs):
+            stack.append((entry.path, entry.rel_path))
+
+
+def parallel_walk(
+    ssh_client,
+    root: str,
+    max_depth: Optional[int] = None,
+    on_error: Optional[Callable[[str, Exception], None]] = None
+) -> Iterator[WalkEntry]:
+    """
+    Walk a remote tree listing several directories at once
+
+    Directories are listed by settings.walk_workers threads, each on its own
+    SFTP channel, so the round trip of one listdir no longer waits for the
+    previous one. Entries of a directory are yielded together, in name
+    order, but directories complete in no particular order. At most two
+    listings per worker are in flight or waiting to be consumed, which
+    bounds memory on very wide trees. Symlinks are never followed and
+    directories that cannot be listed are skipped.
+
+    Args:
+        ssh_client: Connected SSHClient
+        root: Remote directory to walk; it is not yielded itself
+        max_depth: Deepest level to yield, 1 being root's own entries
+            (default: unlimited)
+        on_error: Called with (path, exception) for each unreadable directory
+
+    Yields:
+        WalkEntry for every entry below root
+    """
+    root = root.rstrip('/') or '/'
+    workers = max(1, settings.walk_workers)
+
+    with ssh_client.dedicated_channels() as channel, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="remote-walk") as pool:
+
+        def list_dir(directory: str):
+            return sorted(channel().listdir_attr(directory), key=lambda a: a.filename)
+
+        todo = deque([(root, '', 1)])
+        running = {}
+        try:
+            while todo or running:
+                while todo and len(running) < workers * 2:
+                    directory, rel_dir, depth = todo.popleft()
+                    running[pool.submit(list_dir, directory)] = (directory, rel_dir, depth)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory, rel_dir, depth = running.pop(future)
+                    try:
+                        attrs = future.result()
+                    except IOError as e:
+                        logger.warning(f"Cannot list {directory}: {str(e)}")
+                        if on_error:
+                            on_error(directory, e)
+                        continue
+
+                    for attr in attrs:
+                        if attr.filename in ('.', '..'):
+                            continue
+                        entry = WalkEntry(
+                            posixpath.join(directory, attr.filename),
+                            posixpath.join(rel_dir, attr.filename) if rel_dir else attr.filename,
+                            attr
+                        )
+                        yield entry
+                        if entry.is_dir and (max_depth is None or depth < max_depth):
+                            todo.append((entry.path, entry.rel_path, depth + 1))
+        finally:
+            for future in running:
+                future.cancel()
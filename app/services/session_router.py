@@ -0,0 +1,451 @@
+"""
+Router in front of the session-owner processes of a multi-worker deployment
+
+SSH sessions cannot move between processes, so with settings.workers above
+one the application runs as that many session owners, each a full copy of
+the app on a Unix socket under settings.worker_socket_path, behind one or
+more router processes listening on settings.port. The router is stateless:
+it proxies each request, streaming both bodies, to the owner of its
+connection key on a consistent hash ring, so all router processes agree on
+the owner and a session is always found where it was created.
+
+The key of a request is taken from, in order: a worker-tagged job or
+upload id in the path, the X-Session-Affinity header, the hostIp and
+username query parameters, the upload-params header and finally the
+hostIp and username of a small JSON body. Requests naming two sessions
+(/transfer and transfer jobs) need both to live in one owner; clients that
+transfer between hosts send the same X-Session-Affinity value with every
+request for those sessions, logins included. /status, /metrics and the job
+list are gathered from every owner; anything else without a key goes to
+the owners in turn.
+"""
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import httpx
+import uvicorn
+from app.config import get_settings
+from app.services.workers import WORKER_INDEX_ENV, HashRing, connection_key, id_owner
+from app.utils.logger import get_logger, setup_logger
+from app.utils.response import error_response, success_response
+
+logger = get_logger()
+settings = get_settings()
+
+AFFINITY_HEADER = b"x-session-affinity"
+
+# JSON bodies up to this size are read to find the session; larger bodies
+# are streamed to an owner without being looked at
+MAX_ROUTING_BODY = 1048576
+
+# Seconds to wait for the session workers to listen at startup
+WORKER_START_TIMEOUT = 30.0
+
+_HOP_BY_HOP = {
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade", b"host"
+}
+
+_ID_PATH = re.compile(r"/(?:jobs|upload)/([^/]+)(?:/.*)?")
+
+
+def socket_path(index: int) -> str:
+    return os.path.join(settings.worker_socket_path, f"worker-{index}.sock")
+
+
+def _json_body(body: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _session_key(data: Dict[str, Any], host_field: str, user_field: str) -> Optional[str]:
+    host_ip, username = data.get(host_field), data.get(user_field)
+    if isinstance(host_ip, str) and isinstance(username, str):
+        return connection_key(host_ip, username)
+    return None
+
+
+def _add_worker_label(line: str, index: int) -> str:
+    name_end = min(position for position in (line.find("{"), line.find(" ")) if position >= 0)
+    if line[name_end] == "{":
+        separator = "" if line[name_end + 1] == "}" else ","
+        return f'{line[:name_end + 1]}worker="{index}"{separator}{line[name_end + 1:]}'
+    return f'{line[:name_end]}{{worker="{index}"}}{line[name_end:]}'
+
+
+class SessionRouter:
+    """
+    ASGI application forwarding requests to the session owners
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.ring = HashRing(workers)
+        self._next = itertools.count()
+        self._clients: List[httpx.AsyncClient] = []
+
+    def _client(self, index: int) -> httpx.AsyncClient:
+        # Clients are bound to the event loop, so they are made on first use
+        if not self._clients:
+            self._clients = [
+                httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(uds=socket_path(worker)),
+                    base_url="http://session-worker",
+                    timeout=httpx.Timeout(None, connect=10.0)
+                )
+                for worker in range(self.workers)
+            ]
+        return self._clients[index]
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for client in self._clients:
+                    await client.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"], scope["method"]
+        if path in ("/status", "/metrics") or (path == "/jobs" and method == "GET"):
+            await self._gather(scope, send)
+            return
+
+        owner, body, error = await self._route(scope, receive)
+        if error:
+            await self._send_json(send, 409, error_response(error))
+            return
+        if owner is None:
+            owner = next(self._next) % self.workers
+        await self._proxy(owner, scope, receive, send, body)
+
+    async def _route(self, scope, receive) -> Tuple[Optional[int], Optional[bytes], Optional[str]]:
+        """
+        Find the owner of a request
+
+        Returns:
+            Tuple of (worker index or None if no session is named, the
+            request body if it had to be read, error message if the request
+            cannot be served by one worker)
+        """
+        match = _ID_PATH.fullmatch(scope["path"])
+        if match and id_owner(match.group(1)) is not None:
+            return id_owner(match.group(1)) % self.workers, None, None
+
+        headers = dict(scope["headers"])
+        if AFFINITY_HEADER in headers:
+            return self.ring.owner(headers[AFFINITY_HEADER].decode("latin-1")), None, None
+
+        query = {name: values[0] for name, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+        key = _session_key(query, "hostIp", "username")
+        if key is None and b"upload-params" in headers:
+            key = _session_key(_json_body(headers[b"upload-params"]) or {}, "hostIp", "username")
+        if key is not None:
+            return self.ring.owner(key), None, None
+
+        content_type = headers.get(b"content-type", b"")
+        length = headers.get(b"content-length", b"")
+        if not content_type.startswith(b"application/json") or not length.isdigit() \
+                or int(length) > MAX_ROUTING_BODY:
+            return None, None, None
+
+        body = await self._read_body(receive)
+        data = _json_body(body) or {}
+        key = _session_key(data, "hostIp", "username")
+        if key is None:
+            return None, body, None
+        owner = self.ring.owner(key)
+
+        dest_key = _session_key(data, "destHostIp", "destUsername")
+        if dest_key is not None and self.ring.owner(dest_key) != owner:
+            return owner, body, (
+                "Source and destination sessions are held by different workers; send the same "
+                "X-Session-Affinity header with both logins and this request"
+            )
+        return owner, body, None
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _send_json(send, status: int, content: Any):
+        body = json.dumps(content).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _proxy(self, owner: int, scope, receive, send, body: Optional[bytes]):
+        """
+        Forward a request to a worker and stream the response back
+
+        The response is streamed until it ends or the client disconnects,
+        which also ends long-lived responses like /events.
+        """
+        headers = [(name, value) for name, value in scope["headers"] if name not in _HOP_BY_HOP]
+        client_address = scope.get("client")
+        if client_address:
+            headers.append((b"x-forwarded-for", client_address[0].encode()))
+        body_read = body is not None
+
+        async def request_body():
+            nonlocal body_read
+            while True:
+                message = await receive()
+                if message["type"] != "http.request":
+                    raise httpx.ReadError("Client disconnected")
+                yield message.get("body", b"")
+                if not message.get("more_body"):
+                    body_read = True
+                    return
+
+        url = scope["path"] + (f"?{scope['query_string'].decode('latin-1')}" if scope["query_string"] else "")
+        if body is None and scope["method"] in ("GET", "HEAD"):
+            body, body_read = b"", True
+        client = self._client(owner)
+        request = client.build_request(
+            scope["method"], url, headers=headers, content=body if body is not None else request_body()
+        )
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.TransportError as e:
+            logger.error(f"Session worker {owner} failed {scope['method']} {scope['path']}: {str(e)}")
+            await self._send_json(send, 502, error_response(f"Session worker {owner} is unavailable"))
+            return
+
+        async def relay():
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [(name, value) for name, value in response.headers.raw if name.lower() not in _HOP_BY_HOP]
+            })
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        try:
+            if not body_read:
+                await relay()
+                return
+            relaying = asyncio.ensure_future(relay())
+            watching = asyncio.ensure_future(disconnected())
+            try:
+                await asyncio.wait((relaying, watching), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                watching.cancel()
+                relaying.cancel()
+            if relaying.done() and not relaying.cancelled():
+                relaying.result()
+        finally:
+            await response.aclose()
+
+    async def _fetch(self, index: int, path: str, query: bytes) -> httpx.Response:
+        url = path + (f"?{query.decode('latin-1')}" if query else "")
+        response = await self._client(index).get(url)
+        response.raise_for_status()
+        return response
+
+    async def _gather(self, scope, send):
+        """
+        Answer /status, /metrics and GET /jobs from every worker
+        """
+        path = scope["path"]
+        results = await asyncio.gather(
+            *(self._fetch(index, path, scope["query_string"]) for index in range(self.workers)),
+            return_exceptions=True
+        )
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Session worker {index} failed GET {path}: {str(result)}")
+
+        if path == "/metrics":
+            body = self._merge_metrics(results).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain; version=0.0.4"), (b"content-length", str(len(body)).encode())]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        payloads = [None if isinstance(result, Exception) else result.json() for result in results]
+        if path == "/status":
+            content = success_response(self._merge_status(payloads))
+        else:
+            jobs = [job for payload in payloads if payload and payload["status"] for job in payload["data"]]
+            content = success_response(sorted(jobs, key=lambda job: job["createdAt"]))
+        await self._send_json(send, 200, content)
+
+    @staticmethod
+    def _merge_status(payloads: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"active_connections": 0, "pool": {}, "connections": [], "workers": []}
+        for index, payload in enumerate(payloads):
+            if not payload or not payload["status"]:
+                status["workers"].append({"worker": index, "alive": False})
+                continue
+            data = payload["data"]
+            status["workers"].append({"worker": index, "alive": True, "active_connections": data["active_connections"]})
+            status["active_connections"] += data["active_connections"]
+            for name, value in data["pool"].items():
+                status["pool"][name] = status["pool"].get(name, 0) + value
+            status["connections"].extend(dict(connection, worker=index) for connection in data["connections"])
+        return status
+
+    @staticmethod
+    def _merge_metrics(results: List[Any]) -> str:
+        """
+        Combine the workers' expositions, labelling samples by worker
+        """
+        families: Dict[str, List[str]] = {}
+        headers: Dict[str, List[str]] = {}
+        up = []
+        for index, result in enumerate(results):
+            up.append(f'session_worker_up{{worker="{index}"}} {0 if isinstance(result, Exception) else 1}')
+            if isinstance(result, Exception):
+                continue
+            family = None
+            for line in result.text.splitlines():
+                if line.startswith("# "):
+                    parts = line.split(" ", 3)
+                    family = parts[2] if len(parts) > 2 else family
+                    if family is not None and parts[1] in ("HELP", "TYPE"):
+                        headers.setdefault(family, [])
+                        if len(headers[family]) < 2:
+                            headers[family].append(line)
+                        families.setdefault(family, [])
+                elif line and family is not None:
+                    families[family].append(_add_worker_label(line, index))
+
+        lines = ["# HELP session_worker_up Whether the session worker answered the scrape",
+                 "# TYPE session_worker_up gauge"] + up
+        for family, samples in families.items():
+            lines.extend(headers[family])
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def create_app() -> SessionRouter:
+    """
+    Build the router for uvicorn's factory mode
+    """
+    setup_logger()
+    return SessionRouter(settings.workers)
+
+
+class WorkerSupervisor:
+    """
+    Starts the session workers and restarts any that exit
+
+    Sessions held by a worker that dies are lost; their users log in again
+    and land on the restarted worker.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._processes: List[Optional[subprocess.Popen]] = [None] * workers
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def _spawn(self, index: int):
+        path = socket_path(index)
+        if os.path.exists(path):
+            os.remove(path)
+        # A session of its own keeps terminal signals away from the worker,
+        # so it is stopped by stop() only after the router has finished
+        self._processes[index] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--uds", path, "--no-access-log"],
+            env=dict(os.environ, **{WORKER_INDEX_ENV: str(index)}),
+            start_new_session=True
+        )
+        logger.info(f"Started session worker {index} (pid {self._processes[index].pid}) on {path}")
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+        while not all(os.path.exists(socket_path(index)) for index in range(self.workers)):
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError("Session workers did not start listening in time")
+            time.sleep(0.1)
+
+        self._monitor = threading.Thread(target=self._watch, name="worker-supervisor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self):
+        while not self._stopping.wait(1.0):
+            for index, process in enumerate(self._processes):
+                if process is not None and process.poll() is not None and not self._stopping.is_set():
+                    logger.error(f"Session worker {index} exited with {process.returncode}, restarting it")
+                    self._spawn(index)
+
+    def stop(self):
+        self._stopping.set()
+        for process in self._processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Session worker {index} did not stop, killing it")
+                process.kill()
+
+
+def serve():
+    """
+    Run settings.workers session workers behind settings.router_workers
+    router processes on settings.port
+    """
+    os.makedirs(settings.worker_socket_path, exist_ok=True)
+    supervisor = WorkerSupervisor(settings.workers)
+    supervisor.start()
+    try:
+        uvicorn.run(
+            "app.services.session_router:create_app",
+            factory=True,
+            host="0.0.0.0",
+            port=settings.port,
+            workers=max(1, settings.router_workers),
+            access_log=False
+        )
+    finally:
+        supervisor.stop()
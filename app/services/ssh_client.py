@@ -2,32 +2,91 @@
 SSH client implementation for SFTP operations
 """
 import os
+import posixpath
+import select
+import shlex
+import socket
 import stat
 import time
+import threading
 import paramiko
-from typing import List, Dict, Any, Tuple, Optional
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Optional, Callable, Iterator
+from app.config import get_settings
+from app.services import transfer_engine
+from app.services.compression import SAMPLE_SIZE, CompressionPolicy
+from app.services.dir_cache import DirectoryCache, normalize_dir
+from app.services.event_hub import event_hub
+from app.services.listing import DirEntry
+from app.services.metadata_index import index_manager
+from app.services.metrics import ssh_method_seconds, timed
+from app.services.remote_copy import RemoteCopier
+from app.services.remote_io import MeteredSFTPClient, RemoteCommandStream, RemoteFileReader, RemoteFileWriter
+from app.services.transport_profile import (
+    AUTO_PROFILE, LinkEstimate, TransportProfile, apply_algorithms, get_profile, measure_link, tune_profile
+)
 from app.utils.logger import get_logger
 
 logger = get_logger()
+settings = get_settings()
+
+# Seconds to wait for a pooled SFTP channel when the server refuses to open more
+CHANNEL_WAIT_TIMEOUT = 60
+
+# Largest block read from a command's output at a time
+COMMAND_READ_SIZE = 32768
+
 
 class EnhancedTransport(paramiko.Transport):
     """
     Enhanced SSH transport with optimized parameters
+    
+    Channel window, packet size and algorithm preferences come from a
+    TransportProfile.
     """
-    def __init__(self, sock):
-        super(EnhancedTransport, self).__init__(sock)
-        # Increased window size for better performance
-        self.window_size = 3 * 1024 * 1024
+    def __init__(self, sock, profile: TransportProfile):
+        super(EnhancedTransport, self).__init__(
+            sock,
+            default_window_size=profile.window_size,
+            default_max_packet_size=profile.max_packet_size
+        )
+        # Disable Nagle so small SFTP requests are not held back waiting
+        # for delayed ACKs of earlier packets
+        if isinstance(self.sock, socket.socket):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        apply_algorithms(self, profile)
         # Extended rekeying parameters to reduce overhead
         self.packetizer.REKEY_BYTES = pow(2, 40)
         self.packetizer.REKEY_PACKETS = pow(2, 40)
+    
+    def _activate_outbound(self):
+        super(EnhancedTransport, self)._activate_outbound()
+        # paramiko keeps the previous compressor when a rekey negotiates
+        # "none"; drop it once NEWKEYS has gone out under the old settings
+        if self.local_compression == 'none':
+            self.packetizer.set_outbound_compressor(None)
+    
+    def _activate_inbound(self):
+        super(EnhancedTransport, self)._activate_inbound()
+        if self.remote_compression == 'none':
+            self.packetizer.set_inbound_compressor(None)
 
 
 class SSHClient:
     """
     SSH client for file operations and command execution
     """
-    def __init__(self, ip: str, port: int = 22, username: str = None, password: str = None):
+    backend = "paramiko"
+    
+    def __init__(
+        self,
+        ip: str,
+        port: int = 22,
+        username: str = None,
+        password: str = None,
+        compression: Optional[str] = None,
+        transport_profile: Optional[str] = None
+    ):
         """
         Initialize SSH client with connection parameters
         
@@ -36,6 +95,13 @@ class SSHClient:
             port: SSH port (default: 22)
             username: SSH username
             password: SSH password
+            compression: Compression policy, 'off', 'on' or 'auto'
+                (default: the profile's, else settings.compression)
+            transport_profile: Transport profile name or 'auto'
+                (default: see get_profile)
+        
+        Raises:
+            ValueError: If the transport profile is invalid
         """
         self.ip = ip
         self.port = port
@@ -53,20 +119,258 @@ class SSHClient:
             '/var'
         ]
         
+        # SFTP channels on the transport, each used by one thread at a time
+        self._idle_channels: List[paramiko.SFTPClient] = []
+        self._open_channels = 0
+        self._channel_lock = threading.Lock()
+        self._channel_returned = threading.Condition(self._channel_lock)
+        
+        # Cache of recent directory listings, invalidated by our own writes
+        self.dir_cache = DirectoryCache(
+            settings.dir_cache_max_entries, settings.dir_cache_ttl, on_change=self._publish_dir_change
+        )
+        
+        # Usage tracking for the connection pool
+        self.connected_at = time.time()
+        self.last_used = self.connected_at
+        self.active_ops = 0
+        self.reconnects = 0
+        # Set by close(); a closed client is never reconnected
+        self._closed = False
+        self._usage_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        
+        # Remote commands found (or not) by has_command
+        self._commands: Dict[str, bool] = {}
+        # Optional server features learnt on first use, e.g. SFTP extensions
+        self.capabilities: Dict[str, bool] = {}
+        
+        # Window, packet size and algorithms; auto profiles are tuned on
+        # the first connect and kept for reconnects
+        self.profile = get_profile(transport_profile, ip, port)
+        self.link_estimate: Optional[LinkEstimate] = None
+        
+        # Transport compression, re-decided per transfer in auto mode
+        self.compression = CompressionPolicy(compression or self.profile.compression)
+        
+        self._connect()
+        
+        logger.info(f"SSH connection established to {ip}:{port} as {username}")
+    
+    def _connect(self):
+        """
+        Open the transport and the first pooled SFTP channel
+        
+        Command execution opens short-lived session channels on the same
+        transport, so each client costs one TCP connection and one SSH
+        handshake.
+        """
         # Initialize transport with enhanced parameters
-        self.transport = EnhancedTransport((self.ip, self.port))
+        self.transport = EnhancedTransport((self.ip, self.port), self.profile)
+        # Compression is negotiated during the handshake, so set it first
+        self.transport.use_compression(self.compression.initial)
         self.transport.connect(username=self.username, password=self.password)
-        self.transport.use_compression()
         
-        # Initialize SFTP client
-        self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+        if self.profile.name == AUTO_PROFILE and self.link_estimate is None:
+            self._tune_transport()
         
-        # Initialize SSH client for command execution
-        self.ssh = paramiko.SSHClient()
-        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.ssh.connect(self.ip, self.port, self.username, self.password)
+        # Initialize SFTP client; more channels are opened on demand
+        sftp = MeteredSFTPClient.from_transport(self.transport)
+        with self._channel_lock:
+            self._idle_channels = [sftp]
+            self._open_channels = 1
+    
+    def _tune_transport(self):
+        """
+        Measure the link and size the window of channels opened from now on
         
-        logger.info(f"SSH connection established to {ip}:{port} as {username}")
+        The bandwidth estimate also seeds the compression policy, so auto
+        compression can act before the first large transfer.
+        """
+        try:
+            self.link_estimate = measure_link(self.transport)
+        except Exception as e:
+            logger.warning(f"Could not measure link to {self.ip}:{self.port}: {str(e)}")
+            return
+        
+        self.profile = tune_profile(self.profile, self.link_estimate)
+        self.transport.default_window_size = self.profile.window_size
+        self.transport.default_max_packet_size = self.profile.max_packet_size
+        if self.link_estimate.bandwidth is not None and self.compression.link_throughput is None:
+            self.compression.link_throughput = self.link_estimate.bandwidth
+        
+        logger.info(
+            f"Tuned transport to {self.ip}:{self.port}: rtt {self.link_estimate.rtt * 1000:.2f} ms, "
+            f"bandwidth {self.link_estimate.bandwidth or 0:.0f} B/s, window {self.profile.window_size}"
+        )
+    
+    def transport_info(self) -> Dict[str, Any]:
+        """
+        Describe the transport profile and the algorithms negotiated
+        """
+        transport = getattr(self, 'transport', None)
+        info = self.profile.to_dict()
+        info["backend"] = self.backend
+        info["link"] = self.link_estimate.to_dict() if self.link_estimate else None
+        info["negotiated"] = None
+        if transport is not None and transport.is_active():
+            # AEAD ciphers authenticate the data themselves; the MAC is unused
+            aead = transport._cipher_info.get(transport.local_cipher, {}).get("is_aead", False)
+            info["negotiated"] = {"cipher": transport.local_cipher, "mac": None if aead else transport.local_mac}
+        return info
+    
+    def is_alive(self) -> bool:
+        """
+        Check whether the underlying transport is still connected
+        """
+        transport = getattr(self, 'transport', None)
+        return transport is not None and transport.is_active()
+    
+    def ensure_connected(self):
+        """
+        Reconnect transparently if the transport has died
+        
+        Raises:
+            IOError: If the client has been closed, e.g. evicted from the pool
+            Exception: If the reconnect attempt fails
+        """
+        if self.is_alive():
+            return
+        
+        with self._connect_lock:
+            if self.is_alive():
+                return
+            if self._closed:
+                raise IOError(f"Connection to {self.ip}:{self.port} has been closed")
+            
+            logger.warning(f"Connection to {self.ip}:{self.port} lost, reconnecting")
+            self._disconnect()
+            self._connect()
+            self.dir_cache.clear()
+            self.reconnects += 1
+            self.connected_at = time.time()
+            logger.info(f"Reconnected to {self.ip}:{self.port} as {self.username}")
+    
+    @property
+    def compression_active(self) -> bool:
+        """
+        Whether the transport currently compresses outgoing data
+        """
+        transport = getattr(self, 'transport', None)
+        return transport is not None and transport.local_compression not in (None, 'none')
+    
+    def set_compression(self, mode: str):
+        """
+        Change the compression policy of an established connection
+        
+        Args:
+            mode: 'off', 'on' or 'auto'
+            
+        Raises:
+            ValueError: If the mode is not a known policy
+        """
+        policy = CompressionPolicy(mode)
+        policy.link_throughput = self.compression.link_throughput
+        self.compression = policy
+        
+        if mode != 'auto' and policy.initial != self.compression_active:
+            self.transport.use_compression(policy.initial)
+            self.transport.renegotiate_keys()
+            logger.info(f"Compression set to {mode} for {self.ip}:{self.port}")
+    
+    def _compression_may_change(self) -> bool:
+        """
+        Whether a transfer could change the transport compression
+        
+        Used to skip sampling file contents when the answer cannot change:
+        an uncompressed transport on a fast or unmeasured link stays as is.
+        """
+        return self.compression.mode == 'auto' and (self.compression_active or self.compression.link_is_slow)
+    
+    def _select_compression(self, path: str, size: Optional[int], sample: Optional[bytes] = None):
+        """
+        Switch transport compression on or off for an upcoming transfer
+        
+        Only applies in auto mode, and only for transfers large enough to
+        amortize the key exchange needed to change compression. The switch
+        is skipped while other operations are using the connection.
+        
+        Args:
+            path: Name of the file about to be transferred
+            size: Transfer size in bytes, or None if unknown
+            sample: Optional leading bytes of the file
+        """
+        if self.compression.mode != 'auto':
+            return
+        if size is not None and size < settings.compression_min_size:
+            return
+        
+        wanted = self.compression.should_compress(path, sample)
+        if wanted == self.compression_active or self.active_ops > 1:
+            return
+        
+        try:
+            self.transport.use_compression(wanted)
+            self.transport.renegotiate_keys()
+            logger.info(f"Compression {'enabled' if wanted else 'disabled'} for {self.ip}:{self.port}")
+        except Exception as e:
+            logger.warning(f"Could not switch compression for {self.ip}:{self.port}: {str(e)}")
+    
+    def _sample_remote(self, remote_path: str) -> Optional[bytes]:
+        """
+        Read the first bytes of a remote file for a compressibility estimate
+        """
+        try:
+            with self.sftp_channel() as sftp, sftp.open(remote_path, 'rb') as f:
+                return f.read(SAMPLE_SIZE)
+        except IOError:
+            return None
+    
+    def keepalive(self) -> bool:
+        """
+        Send a keepalive message to probe the connection
+        
+        Returns:
+            True if the transport is still active afterwards
+        """
+        try:
+            if self.is_alive():
+                self.transport.send_ignore()
+        except Exception as e:
+            logger.warning(f"Keepalive failed for {self.ip}:{self.port}: {str(e)}")
+        return self.is_alive()
+    
+    @property
+    def busy(self) -> bool:
+        """
+        Whether an operation is running or a stream still holds a channel
+        
+        Streamed transfers only count as operations while a chunk is in
+        flight, but their reader or writer keeps its channel borrowed from
+        open to close.
+        """
+        with self._channel_lock:
+            borrowed = self._open_channels - len(self._idle_channels)
+        return self.active_ops > 0 or borrowed > 0
+    
+    @contextmanager
+    def track_operation(self):
+        """
+        Mark the connection busy for the duration of an operation
+        
+        The connection is re-established first if it has dropped, and the
+        pool uses the activity counters to pick idle sessions for eviction.
+        """
+        with self._usage_lock:
+            self.active_ops += 1
+            self.last_used = time.time()
+        try:
+            self.ensure_connected()
+            yield self
+        finally:
+            with self._usage_lock:
+                self.active_ops -= 1
+                self.last_used = time.time()
     
     def __del__(self):
         """
@@ -76,85 +380,94 @@ class SSHClient:
     
     def close(self):
         """
-        Close SSH and SFTP connections
+        Close SSH and SFTP connections for good
+        
+        Operations still holding the client fail instead of reconnecting it.
+        """
+        self._closed = True
+        self._disconnect()
+    
+    def _disconnect(self):
+        """
+        Close the transport and the idle SFTP channels
         """
         try:
+            for channel in getattr(self, '_idle_channels', []):
+                channel.close()
+            
             if hasattr(self, 'transport') and self.transport:
                 self.transport.close()
-            
-            if hasattr(self, 'ssh') and self.ssh:
-                self.ssh.close()
                 
             logger.info(f"SSH connection closed for {self.ip}:{self.port}")
         except Exception as e:
             logger.error(f"Error closing SSH connection: {str(e)}")
     
-    def get_all_files_in_remote_dir(self, remote_dir: str) -> List[Dict[str, Any]]:
+    def _check_dir(self, sftp: paramiko.SFTPClient, remote_dir: str):
         """
-        Get all files and directories in a remote directory
+        Make sure a remote directory exists and is accessible
+        
+        Args:
+            sftp: Borrowed SFTP channel to check through
+            remote_dir: Path to remote directory
+        
+        Raises:
+            PermissionError: If access to the directory is denied
+            FileNotFoundError: If the directory doesn't exist
+        """
+        try:
+            # Use stat to check if directory exists and is accessible
+            sftp.stat(remote_dir)
+        except IOError as e:
+            if 'Permission denied' in str(e):
+                logger.error(f"Permission denied accessing directory: {remote_dir}")
+                raise PermissionError(f"Permission denied for {remote_dir}")
+            elif 'No such file' in str(e):
+                logger.error(f"Directory not found: {remote_dir}")
+                raise FileNotFoundError(f"Directory not found: {remote_dir}")
+            else:
+                raise
+    
+    @timed(ssh_method_seconds)
+    def list_dir_entries(self, remote_dir: str, use_cache: bool = True) -> List[DirEntry]:
+        """
+        Get the entries of a remote directory
         
         Args:
             remote_dir: Path to remote directory
+            use_cache: Serve a fresh cached listing if available
             
         Returns:
-            List of dictionaries with file/directory information
+            List of DirEntry tuples; callers must not modify it
         
         Raises:
             PermissionError: If access to the directory is denied
             FileNotFoundError: If the directory doesn't exist
             Exception: For other errors
         """
-        all_files = []
+        remote_dir = normalize_dir(remote_dir)
         
-        # Normalize path
-        if remote_dir[-1] == '/':
-            remote_dir = remote_dir[0:-1]
-    
-        if remote_dir == '':
-            remote_dir = '/'
+        if use_cache:
+            cached = self.dir_cache.get(remote_dir)
+            if cached is not None:
+                logger.debug(f"Serving cached listing of {remote_dir}")
+                return cached
         
         logger.debug(f"Listing files in {remote_dir}")
         
         try:
-            # First check if we can access the directory
-            try:
-                # Use stat to check if directory exists and is accessible
-                self.sftp.stat(remote_dir)
-            except IOError as e:
-                if 'Permission denied' in str(e):
-                    logger.error(f"Permission denied accessing directory: {remote_dir}")
-                    raise PermissionError(f"Permission denied for {remote_dir}")
-                elif 'No such file' in str(e):
-                    logger.error(f"Directory not found: {remote_dir}")
-                    raise FileNotFoundError(f"Directory not found: {remote_dir}")
-                else:
-                    raise
-            
-            # Get directory listing with attributes
-            files = self.sftp.listdir_attr(remote_dir)
-            
-            for file_attr in files:
-                # Construct full path
-                if remote_dir == '/':
-                    file_path = f"/{file_attr.filename}"
-                else:
-                    file_path = f"{remote_dir}/{file_attr.filename}"
-                
-                # Determine if it's a directory or file
-                is_dir = stat.S_ISDIR(file_attr.st_mode)
+            with self.sftp_channel() as sftp:
+                # First check if we can access the directory
+                self._check_dir(sftp, remote_dir)
                 
-                # Create file info dictionary
-                file_info = {
-                    'name': file_attr.filename,
-                    'path': file_path,
-                    'size': file_attr.st_size,
-                    'mTime': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(file_attr.st_mtime)),
-                    'type': 'dir' if is_dir else 'file'
-                }
-                
-                all_files.append(file_info)
+                # Get directory listing with attributes
+                entries = [
+                    DirEntry.from_attr(remote_dir, file_attr)
+                    for file_attr in sftp.listdir_attr(remote_dir)
+                ]
             
-            return all_files
+            self.dir_cache.put(remote_dir, entries)
+            index_manager.record_listing(self.key, remote_dir, entries)
+            return entries
         
         except PermissionError as e:
             logger.error(f"Permission denied accessing directory: {remote_dir}")
@@ -166,32 +479,280 @@ class SSHClient:
             logger.error(f"Error listing files in {remote_dir}: {str(e)}")
             raise
     
-    def put(self, local_path: str, remote_path: str) -> bool:
+    def get_all_files_in_remote_dir(self, remote_dir: str, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Get all files and directories in a remote directory
+        
+        Args:
+            remote_dir: Path to remote directory
+            use_cache: Serve a fresh cached listing if available
+            
+        Returns:
+            List of dictionaries with file/directory information
+        
+        Raises:
+            PermissionError: If access to the directory is denied
+            FileNotFoundError: If the directory doesn't exist
+            Exception: For other errors
+        """
+        return [entry.to_dict() for entry in self.list_dir_entries(remote_dir, use_cache)]
+    
+    def open_dir_stream(self, remote_dir: str, batch_size: int = 256) -> Iterator[List[DirEntry]]:
+        """
+        Stream a remote directory listing in batches as the server returns it
+        
+        The directory is checked up front so errors surface before any data
+        is sent. Entries are read with listdir_iter, so the first batch is
+        available long before a huge directory has been read completely.
+        The complete listing is cached once the stream is exhausted. Once
+        started, the stream holds a pooled SFTP channel until it is
+        exhausted or closed.
+        
+        Args:
+            remote_dir: Path to remote directory
+            batch_size: Number of entries per yielded batch
+            
+        Returns:
+            Iterator over lists of DirEntry tuples
+        
+        Raises:
+            PermissionError: If access to the directory is denied
+            FileNotFoundError: If the directory doesn't exist
+        """
+        remote_dir = normalize_dir(remote_dir)
+        with self.sftp_channel() as sftp:
+            self._check_dir(sftp, remote_dir)
+        
+        def stream():
+            entries = []
+            batch = []
+            with self.sftp_channel() as sftp:
+                for file_attr in sftp.listdir_iter(remote_dir):
+                    entry = DirEntry.from_attr(remote_dir, file_attr)
+                    entries.append(entry)
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+            if batch:
+                yield batch
+            self.dir_cache.put(remote_dir, entries)
+        
+        logger.debug(f"Streaming listing of {remote_dir}")
+        return stream()
+    
+    @contextmanager
+    def sftp_channel(self) -> Iterator[paramiko.SFTPClient]:
+        """
+        Borrow an SFTP channel for the exclusive use of the calling thread
+        
+        Channels are opened lazily on the existing transport and up to
+        settings.transfer_channels idle ones are kept for reuse. A borrowed
+        channel is never shared, so blocking requests on it cannot race with
+        another thread's. When the server refuses to open another channel,
+        the call waits for a borrowed one to be returned.
+        
+        Yields:
+            SFTPClient to use for the duration of the block
+            
+        Raises:
+            IOError: If no channel becomes available in time
+        """
+        channel = self._acquire_channel()
+        try:
+            yield channel
+        finally:
+            self._release_channel(channel)
+    
+    def _acquire_channel(self) -> paramiko.SFTPClient:
+        """
+        Take an idle SFTP channel from the pool or open a new one
+        
+        Raises:
+            IOError: If no channel becomes available in time
+        """
+        deadline = time.monotonic() + CHANNEL_WAIT_TIMEOUT
+        while True:
+            with self._channel_lock:
+                if self._idle_channels:
+                    return self._idle_channels.pop()
+                self._open_channels += 1
+            
+            try:
+                return MeteredSFTPClient.from_transport(self.transport)
+            except Exception as e:
+                with self._channel_returned:
+                    self._open_channels -= 1
+                    if not self.is_alive() or self._open_channels == 0:
+                        raise
+                    # Servers cap sessions per connection (OpenSSH MaxSessions)
+                    logger.debug(f"Could not open another SFTP channel, waiting for one: {str(e)}")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._channel_returned.wait_for(lambda: self._idle_channels, remaining):
+                        raise IOError(f"No SFTP channel available on {self.ip}:{self.port}") from e
+    
+    def _release_channel(self, channel: paramiko.SFTPClient):
+        """
+        Return a borrowed SFTP channel to the pool, or close it if not needed
+        """
+        with self._channel_returned:
+            if channel.sock.get_transport() is not self.transport:
+                # Opened before a reconnect; the pool was reset since
+                return
+            if not channel.sock.closed and len(self._idle_channels) < max(settings.transfer_channels, 1):
+                self._idle_channels.append(channel)
+                self._channel_returned.notify()
+                return
+            self._open_channels -= 1
+        channel.close()
+    
+    @contextmanager
+    def dedicated_channels(self) -> Iterator[Callable[..., paramiko.SFTPClient]]:
+        """
+        Give each thread of a parallel job its own SFTP channels
+        
+        paramiko's SFTPClient cannot serve blocking requests from several
+        threads at once: a thread waiting for its reply may consume and drop
+        another thread's. Jobs that run blocking requests on worker threads
+        call the yielded function to get the calling thread's private
+        channel, opened on first use and closed when the block exits. A
+        thread that both reads and writes bulk data asks for a second
+        channel with index 1, since reads and writes queued on one channel
+        can fill both directions' windows and deadlock.
+        
+        Yields:
+            Function taking an optional channel index and returning the
+            current thread's SFTPClient for it
+        """
+        local = threading.local()
+        channels = []
+        lock = threading.Lock()
+        
+        def channel(index: int = 0) -> paramiko.SFTPClient:
+            own = getattr(local, 'channels', None)
+            if own is None:
+                own = local.channels = {}
+            sftp = own.get(index)
+            if sftp is None:
+                sftp = own[index] = MeteredSFTPClient.from_transport(self.transport)
+                with lock:
+                    channels.append(sftp)
+            return sftp
+        
+        try:
+            yield channel
+        finally:
+            for sftp in channels:
+                try:
+                    sftp.close()
+                except Exception as e:
+                    logger.error(f"Error closing SFTP channel: {str(e)}")
+    
+    @timed(ssh_method_seconds)
+    def put(
+        self,
+        local_path: str,
+        remote_path: str,
+        callback: Optional[Callable[[int, int], None]] = None,
+        channels: Optional[Callable[..., paramiko.SFTPClient]] = None
+    ) -> bool:
         """
         Upload a file to the remote server
         
         Args:
             local_path: Path to local file
             remote_path: Destination path on remote server
+            callback: Optional callback(bytes_transferred, total_bytes)
+            channels: Optional dedicated_channels() function to upload
+                through instead of pooled channels
             
         Returns:
             True if successful, False otherwise
         """
         try:
             logger.info(f"Uploading {local_path} to {remote_path}")
-            self.sftp.put(localpath=local_path, remotepath=remote_path)
+            size = os.path.getsize(local_path)
+            if size >= settings.compression_min_size and self._compression_may_change():
+                with open(local_path, 'rb') as f:
+                    self._select_compression(remote_path, size, f.read(SAMPLE_SIZE))
+            
+            start = time.monotonic()
+            transfer_engine.upload(self, local_path, remote_path, callback, channels)
+            self.compression.observe(size, time.monotonic() - start, self.compression_active)
             return True
         except Exception as e:
             logger.error(f"Error uploading file: {str(e)}")
             return False
+        finally:
+            self.dir_cache.invalidate_parent(remote_path)
+    
+    def target_path(self, path: str, name: str) -> str:
+        """
+        Resolve the destination of a file copied onto this server
+        
+        Args:
+            path: Requested destination
+            name: File name to use if path is an existing directory
+            
+        Returns:
+            path itself, or path/name if path is a directory
+        """
+        try:
+            with self.sftp_channel() as sftp:
+                if stat.S_ISDIR(sftp.stat(path).st_mode):
+                    return posixpath.join(path, name)
+        except FileNotFoundError:
+            pass
+        return path
+    
+    @timed(ssh_method_seconds)
+    def send_file(
+        self,
+        dest_client: "SSHClient",
+        remote_path: str,
+        dest_path: str,
+        callback: Optional[Callable[[int, int], None]] = None,
+        channels: Optional[Callable[..., paramiko.SFTPClient]] = None,
+        dest_channels: Optional[Callable[..., paramiko.SFTPClient]] = None
+    ) -> int:
+        """
+        Stream a file from this server straight to another connection
+        
+        The data is relayed through memory only; a failed transfer leaves
+        no partial file at the destination.
+        
+        Args:
+            dest_client: Connected SSHClient to write the file to
+            remote_path: Path to the file on this server
+            dest_path: Destination file path on the other server
+            callback: Optional callback(bytes_transferred, total_bytes)
+            channels: Optional dedicated_channels() function to read through
+                instead of pooled channels
+            dest_channels: Same for writing through dest_client
+            
+        Returns:
+            Number of bytes transferred
+            
+        Raises:
+            IOError: If the file cannot be read or written
+        """
+        logger.info(f"Sending {remote_path} to {dest_client.username}@{dest_client.ip}:{dest_path}")
+        try:
+            return transfer_engine.relay(
+                self, remote_path, dest_client, dest_path, callback, channels, dest_channels
+            )
+        finally:
+            dest_client.dir_cache.invalidate_parent(dest_path)
     
-    def get_file(self, remote_path: str, local_path: str) -> bool:
+    @timed(ssh_method_seconds)
+    def get_file(self, remote_path: str, local_path: str, callback: Optional[Callable[[int, int], None]] = None) -> bool:
         """
         Download a file from the remote server
         
         Args:
             remote_path: Path to file on remote server
             local_path: Local directory where file will be saved
+            callback: Optional callback(bytes_transferred, total_bytes)
             
         Returns:
             True if successful, False otherwise
@@ -211,13 +772,280 @@ class SSHClient:
             logger.info(f"Downloading {remote_path} to {save_path}")
             
             # Download file
-            self.sftp.get(remote_path, save_path)
+            self.fetch(remote_path, save_path, callback)
             return True
             
         except Exception as e:
             logger.error(f"Error downloading file: {str(e)}")
             return False
     
+    @timed(ssh_method_seconds)
+    def fetch(
+        self,
+        remote_path: str,
+        local_path: str,
+        callback: Optional[Callable[[int, int], None]] = None,
+        channels: Optional[Callable[..., paramiko.SFTPClient]] = None
+    ) -> int:
+        """
+        Download a remote file to an exact local file path
+        
+        Args:
+            remote_path: Path to file on remote server
+            local_path: Local file to create or overwrite
+            callback: Optional callback(bytes_transferred, total_bytes); an
+                exception raised by it aborts the download
+            channels: Optional dedicated_channels() function to download
+                through instead of pooled channels
+            
+        Returns:
+            Number of bytes transferred
+            
+        Raises:
+            IOError: If the remote file cannot be read
+        """
+        if self._compression_may_change():
+            with self.sftp_channel() as sftp:
+                size = sftp.stat(remote_path).st_size
+            if size >= settings.compression_min_size:
+                self._select_compression(remote_path, size, self._sample_remote(remote_path))
+        
+        start = time.monotonic()
+        transferred = transfer_engine.download(self, remote_path, local_path, callback, channels)
+        self.compression.observe(transferred, time.monotonic() - start, self.compression_active)
+        return transferred
+    
+    @timed(ssh_method_seconds)
+    def stat_file(self, remote_path: str) -> paramiko.SFTPAttributes:
+        """
+        Get the attributes of a remote file
+        
+        Args:
+            remote_path: Path to file on remote server
+            
+        Returns:
+            SFTPAttributes with size, mtime and mode
+            
+        Raises:
+            IOError: If the remote file cannot be accessed
+        """
+        with self.sftp_channel() as sftp:
+            return sftp.stat(remote_path)
+    
+    @timed(ssh_method_seconds)
+    def open_reader(
+        self,
+        remote_path: str,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> RemoteFileReader:
+        """
+        Open a remote file for streaming without staging it on local disk
+        
+        The reader holds a pooled SFTP channel until it is closed, which it
+        does itself once exhausted.
+        
+        Args:
+            remote_path: Path to file on remote server
+            offset: First byte to read
+            length: Number of bytes to read (default: until end of file)
+            
+        Returns:
+            RemoteFileReader yielding the file contents in fixed-size chunks
+            
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        logger.info(f"Streaming {remote_path}")
+        if self._compression_may_change():
+            with self.sftp_channel() as sftp:
+                size = sftp.stat(remote_path).st_size - offset
+            if length is not None:
+                size = min(size, length)
+            if size >= settings.compression_min_size:
+                self._select_compression(remote_path, size, self._sample_remote(remote_path))
+        
+        def on_close():
+            self._release_channel(sftp)
+            self.compression.observe(reader.bytes_read, reader.busy_time, self.compression_active)
+        
+        sftp = self._acquire_channel()
+        try:
+            reader = RemoteFileReader(
+                sftp,
+                remote_path,
+                offset=offset,
+                length=length,
+                chunk_size=settings.transfer_chunk_size,
+                pipeline_depth=settings.transfer_pipeline_depth,
+                on_close=on_close
+            )
+        except Exception:
+            self._release_channel(sftp)
+            raise
+        return reader
+    
+    @timed(ssh_method_seconds)
+    def open_writer(self, remote_path: str, offset: Optional[int] = None) -> RemoteFileWriter:
+        """
+        Open a remote file for streaming writes without a local temp copy
+        
+        The writer holds a pooled SFTP channel until it is closed or
+        aborted, so concurrent writers never share a channel.
+        
+        Args:
+            remote_path: Destination path on remote server
+            offset: Write into an existing file starting at this byte
+                instead of creating or truncating it
+            
+        Returns:
+            RemoteFileWriter accepting the file contents in order
+            
+        Raises:
+            IOError: If the remote file cannot be opened
+        """
+        logger.debug(f"Streaming upload to {remote_path} at offset {offset or 0}")
+        if self._compression_may_change():
+            self._select_compression(remote_path, None)
+        self.dir_cache.invalidate_parent(remote_path)
+        
+        def on_close():
+            self._release_channel(sftp)
+            self.dir_cache.invalidate_parent(remote_path)
+        
+        def remove(path: str):
+            # The writer's own channel is back in the pool by now
+            with self.sftp_channel() as channel:
+                channel.remove(path)
+        
+        sftp = self._acquire_channel()
+        try:
+            return RemoteFileWriter(sftp, remote_path, offset=offset, on_close=on_close, remove=remove)
+        except Exception:
+            self._release_channel(sftp)
+            raise
+    
+    @timed(ssh_method_seconds)
+    def create_file(self, remote_path: str, size: int = 0):
+        """
+        Create or truncate a remote file and extend it to a given size
+        
+        Args:
+            remote_path: Path of the file to create
+            size: Final size in bytes (sparse where the server supports it)
+            
+        Raises:
+            IOError: If the remote file cannot be created
+        """
+        try:
+            with self.sftp_channel() as sftp, sftp.open(remote_path, 'wb') as f:
+                if size > 0:
+                    f.truncate(size)
+        finally:
+            self.dir_cache.invalidate_parent(remote_path)
+    
+    @timed(ssh_method_seconds)
+    def delete_file(self, remote_path: str) -> bool:
+        """
+        Delete a single remote file over SFTP
+        
+        Unlike remove(), this never runs a shell command and is meant for
+        files the application created itself, such as partial uploads.
+        
+        Args:
+            remote_path: Path of the file to delete
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            with self.sftp_channel() as sftp:
+                sftp.remove(remote_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {remote_path}: {str(e)}")
+            return False
+        finally:
+            self.dir_cache.invalidate_parent(remote_path)
+    
+    @timed(ssh_method_seconds)
+    def exec_command(self, command: str, timeout: Optional[float] = None) -> Tuple[int, bytes, bytes]:
+        """
+        Run a command on a new session channel of the existing transport
+        
+        Args:
+            command: Shell command to run on the remote server
+            timeout: Optional timeout in seconds for opening the channel
+            
+        Returns:
+            Tuple of (exit_status, stdout, stderr)
+        """
+        channel = self.transport.open_session(timeout=timeout)
+        try:
+            channel.exec_command(command)
+            
+            # Read both streams as data arrives: the window only reopens as
+            # data is consumed, so reading stdout to EOF before touching
+            # stderr would stall a command with a lot of error output
+            stdout, stderr = bytearray(), bytearray()
+            while True:
+                if channel.recv_ready():
+                    stdout += channel.recv(COMMAND_READ_SIZE)
+                elif channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(COMMAND_READ_SIZE)
+                elif channel.eof_received or channel.closed:
+                    break
+                else:
+                    select.select([channel], [], [], RemoteCommandStream.POLL_INTERVAL)
+            
+            exit_status = channel.recv_exit_status()
+            return exit_status, bytes(stdout), bytes(stderr)
+        finally:
+            channel.close()
+    
+    def open_command(self, command: str) -> RemoteCommandStream:
+        """
+        Start a command whose output is streamed instead of collected
+        
+        Args:
+            command: Shell command to run on the remote server
+            
+        Returns:
+            RemoteCommandStream yielding the command's standard output
+            
+        Raises:
+            paramiko.SSHException: If the command cannot be started
+        """
+        channel = self.transport.open_session()
+        try:
+            return RemoteCommandStream(channel, command, settings.transfer_chunk_size)
+        except Exception:
+            channel.close()
+            raise
+    
+    def has_command(self, name: str) -> bool:
+        """
+        Check whether a program can be run on the remote server
+        
+        The answer is cached for the lifetime of the client. Servers that
+        only allow SFTP (no exec) report every command as missing.
+        
+        Args:
+            name: Program name, e.g. 'tar'
+            
+        Returns:
+            True if the program is on the remote PATH
+        """
+        if name not in self._commands:
+            try:
+                exit_status, _, _ = self.exec_command(f'command -v {shlex.quote(name)} >/dev/null 2>&1')
+                self._commands[name] = exit_status == 0
+            except Exception as e:
+                logger.info(f"Cannot run commands on {self.ip}:{self.port}: {str(e)}")
+                self._commands[name] = False
+        return self._commands[name]
+    
+    @timed(ssh_method_seconds)
     def remove(self, file_path: str) -> bool:
         """
         Delete a file or directory on the remote server
@@ -243,11 +1071,8 @@ class SSHClient:
             logger.info(f"Removing {file_path}")
             
             # Use rm command for flexibility with directories and files
-            stdin, stdout, stderr = self.ssh.exec_command(f'rm -rf "{file_path}"')
-            
-            # Wait for command to complete and check exit status
-            exit_status = stdout.channel.recv_exit_status()
-            error = stderr.read().decode().strip()
+            exit_status, _, error = self.exec_command(f'rm -rf {shlex.quote(file_path)}')
+            error = error.decode(errors='replace').strip()
             
             if exit_status != 0 or error:
                 logger.error(f"Error removing {file_path}: {error}, exit status: {exit_status}")
@@ -256,8 +1081,7 @@ class SSHClient:
             # Verify file was deleted
             try:
                 # Try to stat the file - if this succeeds, it wasn't deleted
-                stdin, stdout, stderr = self.ssh.exec_command(f'stat "{file_path}" 2>/dev/null')
-                exit_status = stdout.channel.recv_exit_status()
+                exit_status, _, _ = self.exec_command(f'stat {shlex.quote(file_path)} 2>/dev/null')
                 
                 if exit_status == 0:
                     logger.error(f"File still exists after deletion attempt: {file_path}")
@@ -270,7 +1094,11 @@ class SSHClient:
         except Exception as e:
             logger.error(f"Error removing {file_path}: {str(e)}")
             return False
+        finally:
+            self.dir_cache.invalidate_parent(file_path)
+            self.dir_cache.invalidate_tree(file_path)
     
+    @timed(ssh_method_seconds)
     def rename(self, old_path: str, new_path: str) -> bool:
         """
         Rename a file or directory on the remote server
@@ -284,12 +1112,100 @@ class SSHClient:
         """
         try:
             logger.info(f"Renaming {old_path} to {new_path}")
-            self.sftp.rename(old_path, new_path)
+            with self.sftp_channel() as sftp:
+                sftp.rename(old_path, new_path)
             return True
         except Exception as e:
             logger.error(f"Error renaming {old_path} to {new_path}: {str(e)}")
             return False
+        finally:
+            self._invalidate_move(old_path, new_path)
+    
+    @timed(ssh_method_seconds)
+    def replace(self, old_path: str, new_path: str) -> bool:
+        """
+        Move a file into place, overwriting any existing destination
+        
+        Args:
+            old_path: Current path
+            new_path: Destination path
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            logger.info(f"Replacing {new_path} with {old_path}")
+            with self.sftp_channel() as sftp:
+                try:
+                    sftp.posix_rename(old_path, new_path)
+                except IOError:
+                    # Server lacks posix-rename; plain rename refuses to overwrite
+                    try:
+                        sftp.remove(new_path)
+                    except IOError:
+                        pass
+                    sftp.rename(old_path, new_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing {new_path} with {old_path}: {str(e)}")
+            return False
+        finally:
+            self._invalidate_move(old_path, new_path)
+    
+    @timed(ssh_method_seconds)
+    def copy(self, old_path: str, new_path: str) -> Dict[str, Any]:
+        """
+        Copy a file or directory on the remote server without downloading it
+        
+        Args:
+            old_path: Existing path
+            new_path: Destination path, which must not exist
+            
+        Returns:
+            Summary with the copy method used
+            
+        Raises:
+            IOError: If the copy is not possible or fails
+        """
+        logger.info(f"Copying {old_path} to {new_path}")
+        return RemoteCopier(self).copy(old_path, new_path)
+    
+    @timed(ssh_method_seconds)
+    def move(self, old_path: str, new_path: str) -> Dict[str, Any]:
+        """
+        Move a file or directory, falling back to copy and delete across filesystems
+        
+        Args:
+            old_path: Existing path
+            new_path: Destination path, which must not exist
+            
+        Returns:
+            Summary with the move method used
+            
+        Raises:
+            IOError: If the move is not possible or fails
+        """
+        logger.info(f"Moving {old_path} to {new_path}")
+        return RemoteCopier(self).move(old_path, new_path)
+    
+    def _invalidate_move(self, old_path: str, new_path: str):
+        """
+        Drop cached listings affected by moving a path
+        """
+        for path in (old_path, new_path):
+            self.dir_cache.invalidate_parent(path)
+            self.dir_cache.invalidate_tree(path)
+    
+    def _publish_dir_change(self, path: str, recursive: bool):
+        """
+        Notify this session's event subscribers that a directory changed
+        """
+        event_hub.publish(
+            [self.key], "dir", {"path": path, "recursive": recursive},
+            key=f"dir:{path}:{recursive}"
+        )
     
+    @timed(ssh_method_seconds)
     def mkdir(self, dir_path: str) -> bool:
         """
         Create a new directory on the remote server
@@ -302,12 +1218,16 @@ class SSHClient:
         """
         try:
             logger.info(f"Creating directory {dir_path}")
-            self.sftp.mkdir(dir_path)
+            with self.sftp_channel() as sftp:
+                sftp.mkdir(dir_path)
             return True
         except Exception as e:
             logger.error(f"Error creating directory {dir_path}: {str(e)}")
             return False
+        finally:
+            self.dir_cache.invalidate_parent(dir_path)
     
+    @timed(ssh_method_seconds)
     def get_history(self) -> List[str]:
         """
         Get command history from the remote server
@@ -317,10 +1237,10 @@ class SSHClient:
         """
         try:
             logger.info(f"Getting command history for {self.username}")
-            stdin, stdout, stderr = self.ssh.exec_command("cat ~/.bash_history")
+            _, output, _ = self.exec_command("cat ~/.bash_history")
             
             history = []
-            for line in stdout.readlines():
+            for line in output.decode(errors='replace').splitlines():
                 line = line.strip()
                 if line and not line.startswith('#'):
                     history.append(line)
@@ -330,6 +1250,7 @@ class SSHClient:
             logger.error(f"Error getting command history: {str(e)}")
             return []
     
+    @timed(ssh_method_seconds)
     def get_df(self) -> List[str]:
         """
         Get disk usage information from the remote server
@@ -339,10 +1260,10 @@ class SSHClient:
         """
         try:
             logger.info(f"Getting disk usage for {self.ip}")
-            stdin, stdout, stderr = self.ssh.exec_command("df -h")
+            _, output, _ = self.exec_command("df -h")
             
             df_output = []
-            for line in stdout.readlines():
+            for line in output.decode(errors='replace').splitlines():
                 df_output.append(line.strip())
             
             return df_output
@@ -0,0 +1,320 @@
+"""
+Parallel range-based transfer engine for large files
+
+A file is split into contiguous byte ranges. Each range is moved on its own
+SFTP channel with a window of pipelined read or write requests in flight, so
+throughput on high-latency links is no longer bounded by a single
+request/response stream.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+import paramiko
+from app.config import get_settings
+from app.services.remote_io import RemoteFileReader, RemoteFileWriter
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+ProgressCallback = Callable[[int, int], None]
+# Channel function yielded by SSHClient.dedicated_channels()
+ChannelFactory = Callable[..., paramiko.SFTPClient]
+
+_END = object()
+
+
+def split_ranges(size: int, parts: int, min_part_size: int) -> List[Tuple[int, int]]:
+    """
+    Split a byte count into contiguous (offset, length) ranges
+
+    Args:
+        size: Total number of bytes
+        parts: Maximum number of ranges
+        min_part_size: Smallest range worth its own channel
+
+    Returns:
+        List of (offset, length) tuples covering the whole size
+    """
+    if size <= 0:
+        return [(0, 0)]
+
+    parts = max(1, min(parts, size // max(1, min_part_size)))
+    part_size = -(-size // parts)
+
+    ranges = []
+    offset = 0
+    while offset < size:
+        length = min(part_size, size - offset)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+class _Progress:
+    """
+    Thread-safe byte counter feeding a paramiko-style progress callback
+    """
+    def __init__(self, total: int, callback: Optional[ProgressCallback]):
+        self.total = total
+        self.transferred = 0
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, count: int):
+        with self._lock:
+            self.transferred += count
+            transferred = self.transferred
+        if self._callback:
+            self._callback(transferred, self.total)
+
+
+def _plan(size: int) -> List[Tuple[int, int]]:
+    """
+    Choose the ranges for a transfer of the given size
+    """
+    if size < settings.transfer_parallel_threshold:
+        return [(0, size)]
+    return split_ranges(size, settings.transfer_channels, settings.transfer_parallel_threshold // 2)
+
+
+@contextmanager
+def _channel(ssh_client, channels: Optional[ChannelFactory]) -> Iterator[paramiko.SFTPClient]:
+    """
+    Get an SFTP channel for the calling thread
+
+    The thread's own channel from a dedicated_channels() function if one is
+    given, else a channel borrowed from the client's pool.
+    """
+    if channels is None:
+        with ssh_client.sftp_channel() as sftp:
+            yield sftp
+    else:
+        yield channels()
+
+
+def _run_ranges(ranges: List[Tuple[int, int]], worker: Callable[[int, int], None]):
+    """
+    Run one worker per range and re-raise the first failure
+    """
+    if len(ranges) == 1:
+        worker(*ranges[0])
+        return
+
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="sftp-range") as pool:
+        futures = [pool.submit(worker, offset, length) for offset, length in ranges]
+        for future in futures:
+            future.result()
+
+
+def download(
+    ssh_client,
+    remote_path: str,
+    local_path: str,
+    callback: Optional[ProgressCallback] = None,
+    channels: Optional[ChannelFactory] = None
+) -> int:
+    """
+    Download a remote file to a local path using parallel ranges
+
+    Args:
+        ssh_client: Connected SSHClient
+        remote_path: Path to the remote file
+        local_path: Destination file path
+        callback: Optional callback(bytes_transferred, total_bytes)
+        channels: Optional dedicated_channels() function to take the SFTP
+            channels from instead of the client's pool
+
+    Returns:
+        Number of bytes transferred
+    """
+    with _channel(ssh_client, channels) as sftp:
+        size = sftp.stat(remote_path).st_size
+    ranges = _plan(size)
+    progress = _Progress(size, callback)
+
+    # Pre-size the local file so every range can write at its own offset
+    with open(local_path, 'wb') as f:
+        f.truncate(size)
+
+    def worker(offset: int, length: int):
+        with _channel(ssh_client, channels) as sftp, open(local_path, 'r+b') as f:
+            f.seek(offset)
+            reader = RemoteFileReader(
+                sftp, remote_path, offset, length,
+                chunk_size=settings.transfer_chunk_size,
+                pipeline_depth=settings.transfer_pipeline_depth
+            )
+            try:
+                for data in reader:
+                    f.write(data)
+                    progress.add(len(data))
+            finally:
+                reader.close()
+
+    logger.debug(f"Downloading {remote_path} in {len(ranges)} range(s)")
+    _run_ranges(ranges, worker)
+    return progress.transferred
+
+
+def upload(
+    ssh_client,
+    local_path: str,
+    remote_path: str,
+    callback: Optional[ProgressCallback] = None,
+    channels: Optional[ChannelFactory] = None
+) -> int:
+    """
+    Upload a local file to a remote path using parallel ranges
+
+    Args:
+        ssh_client: Connected SSHClient
+        local_path: Source file path
+        remote_path: Destination path on the remote server
+        callback: Optional callback(bytes_transferred, total_bytes)
+        channels: Optional dedicated_channels() function to take the SFTP
+            channels from instead of the client's pool
+
+    Returns:
+        Number of bytes transferred
+    """
+    size = os.path.getsize(local_path)
+    ranges = _plan(size)
+    progress = _Progress(size, callback)
+
+    # Create or truncate the remote file before the ranges write into it
+    with _channel(ssh_client, channels) as sftp:
+        sftp.open(remote_path, 'wb').close()
+
+    def worker(offset: int, length: int):
+        with _channel(ssh_client, channels) as sftp, open(local_path, 'rb') as f:
+            writer = RemoteFileWriter(sftp, remote_path, offset=offset)
+            try:
+                f.seek(offset)
+                remaining = length
+                while remaining > 0:
+                    data = f.read(min(settings.transfer_chunk_size, remaining))
+                    if not data:
+                        break
+                    writer.write(data)
+                    remaining -= len(data)
+                    progress.add(len(data))
+            finally:
+                writer.close()
+
+    logger.debug(f"Uploading {local_path} in {len(ranges)} range(s)")
+    _run_ranges(ranges, worker)
+    return progress.transferred
+
+
+def _put(ring: "queue.Queue", item, stopped: threading.Event) -> bool:
+    """
+    Put an item into a ring, giving up once the consumer has stopped
+    """
+    while not stopped.is_set():
+        try:
+            ring.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def relay(
+    src_client,
+    src_path: str,
+    dst_client,
+    dst_path: str,
+    callback: Optional[ProgressCallback] = None,
+    src_channels: Optional[ChannelFactory] = None,
+    dst_channels: Optional[ChannelFactory] = None
+) -> int:
+    """
+    Copy a file from one connection to another without touching local disk
+
+    Each range is read from the source by its own reader thread into a ring
+    of settings.relay_buffers blocks, which the range's writer drains into
+    the destination with pipelined writes. Both hosts stay busy at the same
+    time, and at most one ring of blocks per range is held in memory.
+
+    Args:
+        src_client: Connected SSHClient holding the file
+        src_path: Path to the file on the source host
+        dst_client: Connected SSHClient to write to
+        dst_path: Destination path on the destination host
+        callback: Optional callback(bytes_transferred, total_bytes)
+        src_channels: Optional dedicated_channels() function of src_client
+            to take the SFTP channels from instead of its pool
+        dst_channels: Same for dst_client
+
+    Returns:
+        Number of bytes transferred
+    """
+    with _channel(src_client, src_channels) as sftp:
+        size = sftp.stat(src_path).st_size
+    ranges = _plan(size)
+    progress = _Progress(size, callback)
+
+    # Create or truncate the destination before the ranges write into it
+    with _channel(dst_client, dst_channels) as sftp:
+        sftp.open(dst_path, 'wb').close()
+
+    def read(offset: int, length: int, ring: "queue.Queue", stopped: threading.Event):
+        try:
+            with _channel(src_client, src_channels) as sftp:
+                reader = RemoteFileReader(
+                    sftp, src_path, offset, length,
+                    chunk_size=settings.transfer_chunk_size,
+                    pipeline_depth=settings.transfer_pipeline_depth
+                )
+                try:
+                    for data in reader:
+                        if not _put(ring, data, stopped):
+                            return
+                finally:
+                    reader.close()
+            _put(ring, _END, stopped)
+        except Exception as e:
+            _put(ring, e, stopped)
+
+    def worker(offset: int, length: int):
+        ring = queue.Queue(maxsize=max(1, settings.relay_buffers))
+        stopped = threading.Event()
+        reader = threading.Thread(
+            target=read, args=(offset, length, ring, stopped), name="relay-read", daemon=True
+        )
+        reader.start()
+        try:
+            with _channel(dst_client, dst_channels) as sftp:
+                writer = RemoteFileWriter(sftp, dst_path, offset=offset)
+                try:
+                    while True:
+                        data = ring.get()
+                        if data is _END:
+                            break
+                        if isinstance(data, Exception):
+                            raise data
+                        writer.write(data)
+                        progress.add(len(data))
+                finally:
+                    writer.close()
+        finally:
+            stopped.set()
+            reader.join()
+
+    logger.debug(f"Relaying {src_path} to {dst_path} in {len(ranges)} range(s)")
+    try:
+        with dst_client.track_operation():
+            _run_ranges(ranges, worker)
+    except Exception:
+        # Do not leave a partial copy behind
+        try:
+            with _channel(dst_client, dst_channels) as sftp:
+                sftp.remove(dst_path)
+        except IOError:
+            pass
+        raise
+    return progress.transferred
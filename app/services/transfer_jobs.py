@@ -0,0 +1,522 @@
+"""
+Background transfer jobs with priorities, cancellation and bandwidth caps
+
+A job runs on the server independently of the request that queued it, so
+closing the browser tab neither aborts the transfer nor leaves a
+half-written file behind: a failed or cancelled job removes its partial
+output. Jobs wait in priority lanes; unless the caller picks a lane, files
+smaller than settings.jobs_small_file_size go to the "high" lane and
+overtake large ones. A queued job starts once a global slot and a slot on
+every host it touches are free, and running jobs share global and per-host
+bandwidth limits.
+"""
+import os
+import posixpath
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import quote
+from app.config import get_settings
+from app.services.client_manager import client_manager
+from app.services.event_hub import event_hub
+from app.services.workers import new_id
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+JOB_KINDS = ("download", "transfer")
+# Lanes in the order they are served
+PRIORITIES = ("high", "normal", "low")
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a running job once it has been cancelled
+    """
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every transfer that counts against one limit
+    """
+    def __init__(self, rate: int):
+        """
+        Args:
+            rate: Bytes per second; 0 or less disables the limit
+        """
+        self.rate = rate
+        # Monotonic time at which the bytes granted so far are paid off
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, count: int) -> float:
+        """
+        Account for transferred bytes
+
+        Returns:
+            Seconds the caller should wait to stay within the rate
+        """
+        if self.rate <= 0 or count <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + count / self.rate
+            return self._next - now
+
+
+class TransferJob:
+    """
+    A queued, running or finished background transfer
+
+    Endpoints are dicts with the "host", "username" and "path" of one side
+    of the transfer; download jobs have no remote destination.
+    """
+    def __init__(
+        self,
+        kind: str,
+        source: Dict[str, str],
+        destination: Optional[Dict[str, str]],
+        size: int,
+        priority: str
+    ):
+        self.id = new_id()
+        self.kind = kind
+        self.source = source
+        self.destination = destination
+        self.size = size
+        self.priority = priority
+        self.status = "queued"
+        self.transferred = 0
+        self.error: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def hosts(self) -> List[str]:
+        """
+        Hosts whose concurrency and bandwidth limits the job counts against
+        """
+        hosts = [self.source["host"]]
+        if self.destination and self.destination["host"] not in hosts:
+            hosts.append(self.destination["host"])
+        return hosts
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE_STATES
+
+    def advance(self, transferred: int) -> int:
+        """
+        Record the bytes transferred so far
+
+        Range workers report concurrently, so totals may arrive out of order.
+
+        Returns:
+            Number of bytes added since the previous report
+        """
+        with self._lock:
+            delta = max(0, transferred - self.transferred)
+            self.transferred += delta
+            return delta
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the job for API responses
+        """
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0
+        rate = self.transferred / elapsed if elapsed > 0 else 0
+        eta = None
+        if self.status == "running" and rate > 0:
+            eta = round((self.size - self.transferred) / rate, 1)
+        return {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "source": self.source,
+            "destination": self.destination,
+            "size": self.size,
+            "transferred": self.transferred,
+            "bytesPerSecond": int(rate),
+            "etaSeconds": eta,
+            "error": self.error,
+            "result": self.result,
+            "createdAt": self.created,
+            "startedAt": self.started,
+            "finishedAt": self.finished,
+        }
+
+
+class TransferScheduler:
+    """
+    Singleton queue and runner of background transfer jobs
+
+    At most settings.jobs_max_concurrent jobs run at once, and at most
+    settings.jobs_host_max_concurrent of them on any one host. Listeners
+    registered with subscribe(), and the sessions on either side of a job
+    through the event hub, are told about every state change and,
+    throttled to settings.jobs_progress_interval, about progress.
+    """
+    _instance = None
+    _jobs: Dict[str, TransferJob] = {}
+    _lock = threading.RLock()
+    _running = 0
+    _running_hosts: Dict[str, int] = {}
+    _limiter = RateLimiter(settings.jobs_max_bandwidth)
+    _host_limiters: Dict[str, RateLimiter] = {}
+    _listeners: List[Callable[[TransferJob], None]] = []
+    _executor: Optional[ThreadPoolExecutor] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TransferScheduler, cls).__new__(cls)
+        return cls._instance
+
+    def submit(
+        self,
+        kind: str,
+        source: Dict[str, str],
+        destination: Optional[Dict[str, str]],
+        size: int,
+        priority: Optional[str] = None
+    ) -> TransferJob:
+        """
+        Queue a transfer
+
+        Args:
+            kind: 'download' (remote file into share_path) or 'transfer'
+                (remote file to another logged-in host)
+            source: Endpoint holding the file
+            destination: Endpoint to write to, for 'transfer' jobs
+            size: Size of the source file in bytes
+            priority: Lane, one of PRIORITIES (default: by size)
+
+        Returns:
+            The queued TransferJob
+
+        Raises:
+            ValueError: If kind or priority is unknown, or a transfer has no
+                destination
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if kind == "transfer" and not destination:
+            raise ValueError("Transfer jobs need a destination")
+        if priority is None:
+            priority = "high" if size < settings.jobs_small_file_size else "normal"
+        elif priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        job = TransferJob(kind, source, destination if kind == "transfer" else None, size, priority)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+
+        logger.info(f"Queued {kind} job {job.id} for {source['path']} ({size} bytes, {priority} priority)")
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[TransferJob]:
+        """
+        Get a job by its id
+        """
+        return self._jobs.get(job_id)
+
+    def list(self, host: Optional[str] = None, username: Optional[str] = None,
+             status: Optional[str] = None) -> List[TransferJob]:
+        """
+        List jobs in the order they were queued
+
+        Args:
+            host: Only jobs reading from or writing to this host
+            username: Only jobs of this user on either side
+            status: Only jobs in this state
+
+        Returns:
+            Matching jobs
+        """
+        with self._lock:
+            self._prune()
+            jobs = list(self._jobs.values())
+
+        def matches(job: TransferJob) -> bool:
+            endpoints = [job.source] + ([job.destination] if job.destination else [])
+            return (
+                (status is None or job.status == status)
+                and any(
+                    (host is None or endpoint["host"] == host)
+                    and (username is None or endpoint["username"] == username)
+                    for endpoint in endpoints
+                )
+            )
+
+        return [job for job in jobs if matches(job)]
+
+    def cancel(self, job_id: str) -> Optional[TransferJob]:
+        """
+        Cancel a queued or running job
+
+        A queued job is cancelled at once; a running one stops at its next
+        block and removes its partial output.
+
+        Returns:
+            The job, or None if it does not exist
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return job
+            job.cancelled.set()
+            queued = job.status == "queued"
+            if queued:
+                job.status = "cancelled"
+                job.finished = time.time()
+
+        if queued:
+            logger.info(f"Cancelled queued job {job_id}")
+            self._notify(job)
+        return job
+
+    def remove(self, job_id: str) -> Optional[TransferJob]:
+        """
+        Forget a finished job and delete the local file it produced
+
+        Returns:
+            The removed job, or None if it does not exist or is still active
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.done:
+                return None
+            del self._jobs[job_id]
+        self._discard(job)
+        return job
+
+    def subscribe(self, listener: Callable[[TransferJob], None]) -> Callable[[], None]:
+        """
+        Register a listener for job updates
+
+        Listeners are called from worker threads and must not block.
+
+        Returns:
+            Function that unregisters the listener
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def shutdown(self):
+        """
+        Cancel every job and release the worker threads
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancelled.set()
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.finished = time.time()
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+        logger.info("Transfer scheduler shut down")
+
+    def _topics(self, job: TransferJob) -> List[str]:
+        """
+        Event topics of the sessions on either side of a job
+        """
+        topics = []
+        for endpoint in (job.source, job.destination):
+            client = client_manager.get_client(endpoint["host"], endpoint["username"]) if endpoint else None
+            if client is not None and client.key not in topics:
+                topics.append(client.key)
+        return topics
+
+    def _notify(self, job: TransferJob):
+        topics = self._topics(job)
+        if event_hub.has_subscribers(topics):
+            event_hub.publish(topics, "job", job.to_dict(), key=f"job:{job.id}")
+        for listener in list(self._listeners):
+            try:
+                listener(job)
+            except Exception as e:
+                logger.error(f"Error in job listener: {str(e)}")
+
+    def _dispatch(self):
+        """
+        Start queued jobs while global and per-host slots are free
+        """
+        started = []
+        with self._lock:
+            while self._running < settings.jobs_max_concurrent:
+                job = self._next_job()
+                if job is None:
+                    break
+                job.status = "running"
+                job.started = time.time()
+                self._running += 1
+                for host in job.hosts:
+                    self._running_hosts[host] = self._running_hosts.get(host, 0) + 1
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.jobs_max_concurrent,
+                        thread_name_prefix="transfer-job"
+                    )
+                self._executor.submit(self._run, job)
+                started.append(job)
+
+        for job in started:
+            self._notify(job)
+
+    def _next_job(self) -> Optional[TransferJob]:
+        """
+        Pick the first queued job, by lane then age, whose hosts have a free slot
+        """
+        queued = [job for job in self._jobs.values() if job.status == "queued"]
+        queued.sort(key=lambda job: (PRIORITIES.index(job.priority), job.created))
+        for job in queued:
+            if all(self._running_hosts.get(host, 0) < settings.jobs_host_max_concurrent for host in job.hosts):
+                return job
+        return None
+
+    def _run(self, job: TransferJob):
+        """
+        Worker: run one job and record its outcome
+        """
+        error = None
+        try:
+            if job.kind == "download":
+                job.result = self._download(job)
+            else:
+                job.result = self._transfer(job)
+            status = "completed"
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            status, error = "failed", str(e)
+
+        with self._lock:
+            job.status = status
+            job.error = error
+            job.finished = time.time()
+            self._running -= 1
+            for host in job.hosts:
+                self._running_hosts[host] -= 1
+                if not self._running_hosts[host]:
+                    del self._running_hosts[host]
+
+        logger.info(f"Job {job.id} {status} after {job.transferred} bytes")
+        self._notify(job)
+        self._dispatch()
+
+    def _client(self, endpoint: Dict[str, str]):
+        client = client_manager.get_client(endpoint["host"], endpoint["username"])
+        if client is None:
+            raise IOError(f"Not logged in to {endpoint['username']}@{endpoint['host']}")
+        return client
+
+    def _host_limiter(self, host: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._host_limiters.get(host)
+            if limiter is None:
+                limiter = self._host_limiters[host] = RateLimiter(settings.jobs_host_max_bandwidth)
+            return limiter
+
+    def _progress(self, job: TransferJob) -> Callable[[int, int], None]:
+        """
+        Build the progress callback that meters, throttles and cancels a job
+
+        The transfer engine calls it after every block from each range
+        worker; raising JobCancelled there stops the transfer.
+        """
+        limiters = [self._limiter] + [self._host_limiter(host) for host in job.hosts]
+        last_notified = 0.0
+
+        def callback(transferred: int, total: int):
+            nonlocal last_notified
+            if job.cancelled.is_set():
+                raise JobCancelled()
+
+            delta = job.advance(transferred)
+            delay = max(limiter.reserve(delta) for limiter in limiters)
+            if delay > 0 and job.cancelled.wait(delay):
+                raise JobCancelled()
+
+            now = time.monotonic()
+            if now - last_notified >= settings.jobs_progress_interval:
+                last_notified = now
+                self._notify(job)
+
+        return callback
+
+    def _download(self, job: TransferJob) -> Dict[str, Any]:
+        """
+        Download the source file into share_path/<job id>/
+
+        The file is written under a temporary name and renamed once
+        complete, so /share never serves a partial download.
+        """
+        client = self._client(job.source)
+        name = posixpath.basename(job.source["path"].rstrip('/'))
+        local_dir = os.path.join(settings.share_path, job.id)
+        local_path = os.path.join(local_dir, name)
+        os.makedirs(local_dir, exist_ok=True)
+        try:
+            # Jobs run on their own channels, never on those serving requests
+            with client.track_operation(), client.dedicated_channels() as channels:
+                size = client.fetch(job.source["path"], local_path + ".part", self._progress(job), channels)
+            os.replace(local_path + ".part", local_path)
+        except BaseException:
+            shutil.rmtree(local_dir, ignore_errors=True)
+            raise
+        return {"bytes": size, "url": f"/share/{job.id}/{quote(name)}"}
+
+    def _transfer(self, job: TransferJob) -> Dict[str, Any]:
+        """
+        Stream the source file to the destination host
+        """
+        src_client = self._client(job.source)
+        dst_client = self._client(job.destination)
+        with src_client.track_operation(), src_client.dedicated_channels() as channels, \
+                dst_client.dedicated_channels() as dest_channels:
+            size = src_client.send_file(
+                dst_client, job.source["path"], job.destination["path"], self._progress(job),
+                channels, dest_channels
+            )
+        return {"bytes": size, "path": job.destination["path"]}
+
+    def _discard(self, job: TransferJob):
+        if job.kind == "download":
+            shutil.rmtree(os.path.join(settings.share_path, job.id), ignore_errors=True)
+
+    def _prune(self):
+        """
+        Forget jobs that finished more than settings.jobs_history_ttl ago
+
+        Must be called with the lock held.
+        """
+        cutoff = time.time() - settings.jobs_history_ttl
+        expired = [job for job in self._jobs.values() if job.done and job.finished < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            self._discard(job)
+
+
+# Create a singleton instance
+transfer_scheduler = TransferScheduler()
@@ -0,0 +1,265 @@
+"""
+Transport profiles for SSH connections
+
+A profile bundles the transport parameters that suit a kind of link: the
+channel window (how much data may be in flight per channel, which must
+cover the bandwidth-delay product), the maximum packet size, algorithm
+preference order and a default compression policy. paramiko does most of
+its per-byte work per packet, so larger packets and AEAD ciphers (one pass
+instead of cipher plus MAC) save CPU on fast links.
+
+Built-in profiles can be overridden or extended by settings.transport_profiles
+and assigned to hosts by settings.transport_host_profiles. The ``auto``
+profile connects like ``wan`` and then sizes the window from the round-trip
+time and bandwidth measured on the new transport.
+"""
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import paramiko
+from app.config import get_settings
+from app.services.compression import COMPRESSION_MODES
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+AUTO_PROFILE = "auto"
+
+# Window sizes chosen by auto-tuning stay within these bounds
+MIN_AUTO_WINDOW = 2 * 1024 * 1024
+MAX_AUTO_WINDOW = 64 * 1024 * 1024
+
+# Links with a shorter round trip and a higher bandwidth count as LANs
+LAN_MAX_RTT = 0.002
+LAN_MIN_BANDWIDTH = 50 * 1024 * 1024
+
+_AEAD_CIPHERS = ("aes128-gcm@openssh.com", "aes256-gcm@openssh.com")
+_FAST_KEX = ("curve25519-sha256@libssh.org", "ecdh-sha2-nistp256")
+
+BUILTIN_PROFILES: Dict[str, Dict[str, Any]] = {
+    "lan": {
+        "window_size": 4 * 1024 * 1024,
+        "max_packet_size": 65536,
+        "ciphers": _AEAD_CIPHERS + ("aes128-ctr",),
+        "macs": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+        "kex": _FAST_KEX,
+        "compression": "off",
+    },
+    "wan": {
+        "window_size": 8 * 1024 * 1024,
+        "max_packet_size": 32768,
+        "ciphers": _AEAD_CIPHERS + ("aes128-ctr",),
+        "macs": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+        "kex": _FAST_KEX,
+        "compression": None,
+    },
+    "high-bdp": {
+        "window_size": 64 * 1024 * 1024,
+        "max_packet_size": 65536,
+        "ciphers": _AEAD_CIPHERS + ("aes128-ctr",),
+        "macs": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+        "kex": _FAST_KEX,
+        "compression": None,
+    },
+    "low-cpu": {
+        "window_size": 2 * 1024 * 1024,
+        "max_packet_size": 65536,
+        "ciphers": ("aes128-gcm@openssh.com", "aes128-ctr"),
+        "macs": ("hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"),
+        "kex": _FAST_KEX,
+        "compression": "off",
+    },
+}
+
+
+class TransportProfile(NamedTuple):
+    """
+    Transport parameters for one connection
+
+    Algorithm tuples list the preferred algorithms first; paramiko's other
+    supported algorithms follow them, so a server lacking every preferred
+    one can still be reached. compression None keeps settings.compression.
+    """
+    name: str
+    window_size: int
+    max_packet_size: int
+    ciphers: Tuple[str, ...] = ()
+    macs: Tuple[str, ...] = ()
+    kex: Tuple[str, ...] = ()
+    compression: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "windowSize": self.window_size,
+            "maxPacketSize": self.max_packet_size,
+            "ciphers": list(self.ciphers),
+            "macs": list(self.macs),
+            "kex": list(self.kex),
+            "compression": self.compression,
+        }
+
+
+def profile_names() -> Tuple[str, ...]:
+    return tuple(sorted(set(BUILTIN_PROFILES) | set(settings.transport_profiles))) + (AUTO_PROFILE,)
+
+
+def _preference(wanted: Tuple[str, ...], supported: Dict[str, Any], kind: str) -> Tuple[str, ...]:
+    unknown = [name for name in wanted if name not in supported]
+    if unknown:
+        raise ValueError(f"Unsupported {kind}: {', '.join(unknown)}")
+    return tuple(wanted)
+
+
+def get_profile(name: Optional[str] = None, ip: Optional[str] = None, port: int = 22) -> TransportProfile:
+    """
+    Resolve a transport profile
+
+    Args:
+        name: Profile name; when None, the profile that
+            settings.transport_host_profiles assigns to 'ip:port' or 'ip',
+            else settings.transport_profile
+        ip: Hostname or IP address of the server
+        port: SSH port of the server
+
+    Returns:
+        TransportProfile; for 'auto' the profile to connect with before tuning
+
+    Raises:
+        ValueError: If the profile is unknown or names an unsupported
+            algorithm or compression mode
+    """
+    if name is None:
+        hosts = settings.transport_host_profiles
+        name = hosts.get(f"{ip}:{port}", hosts.get(ip or '', settings.transport_profile))
+
+    base = "wan" if name == AUTO_PROFILE else name
+    if base not in BUILTIN_PROFILES and base not in settings.transport_profiles:
+        raise ValueError(f"Unknown transport profile {name}, expected one of {', '.join(profile_names())}")
+    options = dict(BUILTIN_PROFILES.get(base, BUILTIN_PROFILES["wan"]))
+    options.update(settings.transport_profiles.get(base, {}))
+
+    compression = options.get("compression")
+    if compression is not None and compression not in COMPRESSION_MODES:
+        raise ValueError(f"Invalid compression mode in transport profile {name}: {compression}")
+
+    return TransportProfile(
+        name=name,
+        window_size=int(options["window_size"]),
+        max_packet_size=int(options["max_packet_size"]),
+        ciphers=_preference(tuple(options.get("ciphers", ())), paramiko.Transport._cipher_info, "cipher"),
+        macs=_preference(tuple(options.get("macs", ())), paramiko.Transport._mac_info, "MAC"),
+        kex=_preference(tuple(options.get("kex", ())), paramiko.Transport._kex_info, "key exchange"),
+        compression=compression,
+    )
+
+
+def apply_algorithms(transport: paramiko.Transport, profile: TransportProfile):
+    """
+    Put a profile's preferred algorithms first in the transport's offer
+
+    Must be called before the handshake. Algorithms this paramiko build
+    cannot use (e.g. curve25519 without its backend) are left out.
+    """
+    options = transport.get_security_options()
+    for attribute, wanted in (("ciphers", profile.ciphers), ("digests", profile.macs), ("kex", profile.kex)):
+        if not wanted:
+            continue
+        current = getattr(options, attribute)
+        setattr(options, attribute, tuple(name for name in wanted if name in current) + tuple(
+            name for name in current if name not in wanted
+        ))
+
+
+class LinkEstimate(NamedTuple):
+    """
+    Round-trip time and bandwidth measured on a new transport
+    """
+    rtt: float
+    bandwidth: Optional[float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rttMs": round(self.rtt * 1000, 3),
+            "bandwidth": None if self.bandwidth is None else int(self.bandwidth),
+        }
+
+
+def measure_link(transport: paramiko.Transport) -> LinkEstimate:
+    """
+    Estimate the round-trip time and download bandwidth of a transport
+
+    The round trip is the fastest of a few global requests, which every
+    server answers. Bandwidth is measured by streaming random bytes from
+    ``head`` on the server over a channel with the largest window, for at
+    most settings.transport_probe_seconds; servers without exec yield no
+    bandwidth.
+
+    Args:
+        transport: Authenticated transport
+
+    Returns:
+        LinkEstimate (bandwidth in bytes per second)
+    """
+    rtt = None
+    for _ in range(3):
+        start = time.perf_counter()
+        transport.global_request("keepalive@openssh.com", wait=True)
+        elapsed = time.perf_counter() - start
+        rtt = elapsed if rtt is None else min(rtt, elapsed)
+
+    bandwidth = None
+    try:
+        channel = transport.open_session(window_size=MAX_AUTO_WINDOW, max_packet_size=65536)
+    except Exception as e:
+        logger.info(f"Could not open a channel to probe bandwidth: {str(e)}")
+        return LinkEstimate(rtt, None)
+
+    try:
+        channel.settimeout(settings.transport_probe_seconds + rtt * 4 + 1)
+        channel.exec_command(f"head -c {settings.transport_probe_bytes} /dev/urandom")
+        # Time from the first byte, so channel setup is not counted
+        first = channel.recv(65536)
+        start = time.perf_counter()
+        deadline = start + settings.transport_probe_seconds
+        received = 0
+        while first:
+            data = channel.recv(1048576)
+            if not data:
+                break
+            received += len(data)
+            if time.perf_counter() >= deadline:
+                break
+        elapsed = time.perf_counter() - start
+        if received >= 65536 and elapsed > 0:
+            bandwidth = received / elapsed
+    except Exception as e:
+        logger.info(f"Bandwidth probe failed: {str(e)}")
+    finally:
+        channel.close()
+
+    return LinkEstimate(rtt, bandwidth)
+
+
+def tune_profile(profile: TransportProfile, estimate: LinkEstimate) -> TransportProfile:
+    """
+    Size a profile's window and packets for a measured link
+
+    The window covers twice the bandwidth-delay product, within
+    MIN_AUTO_WINDOW and MAX_AUTO_WINDOW; without a bandwidth figure the
+    round trip alone picks between the lan and high-bdp windows. LANs get
+    the lan profile's larger packets.
+
+    Returns:
+        Copy of profile with window_size and max_packet_size replaced
+    """
+    lan = get_profile("lan")
+    if estimate.bandwidth is None:
+        window = lan.window_size if estimate.rtt < LAN_MAX_RTT else get_profile("high-bdp").window_size
+    else:
+        window = int(2 * estimate.bandwidth * estimate.rtt)
+    window = max(MIN_AUTO_WINDOW, min(MAX_AUTO_WINDOW, window))
+
+    is_lan = estimate.rtt < LAN_MAX_RTT and (estimate.bandwidth or 0) >= LAN_MIN_BANDWIDTH
+    packet = lan.max_packet_size if is_lan else profile.max_packet_size
+    return profile._replace(window_size=window, max_packet_size=packet)
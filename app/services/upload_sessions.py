@@ -0,0 +1,165 @@
+"""
+Server-side state for resumable chunked uploads
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from app.config import get_settings
+from app.services.workers import new_id
+from app.utils.logger import get_logger
+
+logger = get_logger()
+settings = get_settings()
+
+
+class UploadSession:
+    """
+    A single chunked upload and the byte ranges received so far
+
+    Chunks are written directly into a ``.part`` file next to the final
+    destination, which is renamed into place once every byte has arrived.
+    """
+    def __init__(self, host_ip: str, username: str, remote_path: str, size: int):
+        self.id = new_id()
+        self.host_ip = host_ip
+        self.username = username
+        self.remote_path = remote_path
+        self.part_path = f"{remote_path}.part"
+        self.size = size
+        self.created = time.time()
+        self.updated = self.created
+        self._received: List[Tuple[int, int]] = []
+        self._lock = threading.Lock()
+
+    def add_range(self, offset: int, length: int):
+        """
+        Record that bytes [offset, offset + length) are stored remotely
+        """
+        if length <= 0:
+            return
+        with self._lock:
+            ranges = self._received + [(offset, offset + length)]
+            ranges.sort()
+
+            merged = [ranges[0]]
+            for start, end in ranges[1:]:
+                last_start, last_end = merged[-1]
+                if start <= last_end:
+                    merged[-1] = (last_start, max(last_end, end))
+                else:
+                    merged.append((start, end))
+
+            self._received = merged
+            self.updated = time.time()
+
+    def received_ranges(self) -> List[List[int]]:
+        """
+        Get the received byte ranges as [start, end) pairs
+        """
+        with self._lock:
+            return [[start, end] for start, end in self._received]
+
+    def missing_ranges(self) -> List[List[int]]:
+        """
+        Get the byte ranges still to be uploaded as [start, end) pairs
+        """
+        missing = []
+        position = 0
+        for start, end in self.received_ranges():
+            if start > position:
+                missing.append([position, start])
+            position = max(position, end)
+        if position < self.size:
+            missing.append([position, self.size])
+        return missing
+
+    def is_complete(self) -> bool:
+        """
+        Check whether every byte of the file has been received
+        """
+        return not self.missing_ranges()
+
+    def to_dict(self) -> Dict:
+        """
+        Describe the upload for API responses
+        """
+        received = self.received_ranges()
+        return {
+            "uploadId": self.id,
+            "remotePath": self.remote_path,
+            "size": self.size,
+            "chunkSize": settings.upload_chunk_size,
+            "received": received,
+            "missing": self.missing_ranges(),
+            "bytesReceived": sum(end - start for start, end in received),
+        }
+
+
+class UploadSessionManager:
+    """
+    Singleton registry of in-progress chunked uploads
+    """
+    _instance = None
+    _sessions: Dict[str, UploadSession] = {}
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UploadSessionManager, cls).__new__(cls)
+        return cls._instance
+
+    def create(self, host_ip: str, username: str, remote_path: str, size: int) -> UploadSession:
+        """
+        Register a new upload
+
+        Args:
+            host_ip: Hostname/IP of the owning connection
+            username: SSH username of the owning connection
+            remote_path: Final destination path on the remote server
+            size: Total file size in bytes
+
+        Returns:
+            The new UploadSession
+        """
+        session = UploadSession(host_ip, username, remote_path, size)
+        with self._lock:
+            self._sessions[session.id] = session
+        logger.info(f"Started chunked upload {session.id} for {remote_path} ({size} bytes)")
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Get an upload by its id
+        """
+        return self._sessions.get(upload_id)
+
+    def remove(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Forget an upload
+
+        Returns:
+            The removed UploadSession, or None if it did not exist
+        """
+        with self._lock:
+            return self._sessions.pop(upload_id, None)
+
+    def expire_stale(self) -> List[UploadSession]:
+        """
+        Drop uploads that have not received data within upload_session_ttl
+
+        Returns:
+            The expired sessions, so callers can remove their partial files
+        """
+        cutoff = time.time() - settings.upload_session_ttl
+        with self._lock:
+            stale = [session for session in self._sessions.values() if session.updated < cutoff]
+            for session in stale:
+                del self._sessions[session.id]
+
+        for session in stale:
+            logger.info(f"Expired chunked upload {session.id} for {session.remote_path}")
+        return stale
+
+
+# Create a singleton instance
+upload_session_manager = UploadSessionManager()
@@ -0,0 +1,78 @@
+"""
+Identity of this process in a multi-worker deployment
+
+With settings.workers above one, main.py starts that many session-owner
+processes behind a router (see session_router). Every SSH session lives in
+exactly one owner, chosen by consistent hashing of its connection key, so
+all requests for a session reach the process that holds it. Ids an owner
+hands out, like job and upload ids, carry its index so that requests naming
+only an id can be routed as well.
+"""
+import bisect
+import hashlib
+import os
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+WORKER_INDEX_ENV = "SFTP_WORKER_INDEX"
+
+# Points per owner on the hash ring; more points spread keys more evenly
+VIRTUAL_NODES = 160
+
+_TAGGED_ID = re.compile(r"w(\d+)-[0-9a-f]+")
+
+_index = os.environ.get(WORKER_INDEX_ENV)
+WORKER_INDEX: Optional[int] = int(_index) if _index else None
+
+
+def connection_key(host_ip: str, username: str) -> str:
+    """
+    Key identifying an SSH session, as used by ClientManager
+    """
+    return f"{host_ip}{username}"
+
+
+def new_id() -> str:
+    """
+    Generate a unique id, tagged with the owner index in a session worker
+    """
+    ident = uuid.uuid4().hex
+    return ident if WORKER_INDEX is None else f"w{WORKER_INDEX}-{ident}"
+
+
+def id_owner(ident: str) -> Optional[int]:
+    """
+    Get the index of the worker that generated an id
+
+    Returns:
+        Worker index, or None for an untagged id
+    """
+    match = _TAGGED_ID.fullmatch(ident)
+    return int(match.group(1)) if match else None
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to worker indexes
+
+    The ring only depends on the number of workers, so every router
+    process computes the same owner for a key without coordination.
+    """
+
+    def __init__(self, workers: int, virtual_nodes: int = VIRTUAL_NODES):
+        points: List[Tuple[int, int]] = sorted(
+            (_hash(f"worker-{index}#{point}"), index)
+            for index in range(workers)
+            for point in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def owner(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[position]
@@ -0,0 +1,120 @@
+"""
+Incremental multipart/form-data parsing for streamed uploads
+"""
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import multipart
+from multipart.multipart import parse_options_header
+from fastapi import Request
+
+# Event types yielded by iter_multipart
+PART_BEGIN = "part_begin"
+PART_DATA = "part_data"
+PART_END = "part_end"
+
+
+class MultipartStreamError(ValueError):
+    """
+    Raised when a request body is not a parseable multipart form
+    """
+
+
+def _safe_filename(raw: Optional[bytes], keep_path: bool = False) -> Optional[str]:
+    """
+    Decode a part filename and strip any client-side directory components
+
+    With keep_path the directory components are kept (with '/' separators)
+    for the caller to validate.
+    """
+    if raw is None:
+        return None
+    name = raw.decode("utf-8", errors="replace").replace("\\", "/")
+    if not keep_path:
+        name = name.rsplit("/", 1)[-1]
+    return name or None
+
+
+async def iter_multipart(request: Request, keep_paths: bool = False) -> AsyncIterator[Tuple]:
+    """
+    Parse a multipart request body as it arrives from the client
+
+    Nothing is spooled to memory or disk; every slice of part data is handed
+    to the caller as soon as the parser has seen it.
+
+    Args:
+        request: Incoming request with a multipart/form-data body
+        keep_paths: Report part filenames with their relative directories
+            instead of the base name only
+
+    Yields:
+        (PART_BEGIN, field_name, filename), (PART_DATA, bytes) and
+        (PART_END,) tuples in body order
+
+    Raises:
+        MultipartStreamError: If the body is not multipart/form-data, or
+            ends before its closing boundary
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise MultipartStreamError("Expected a multipart/form-data body")
+
+    events: List[Tuple] = []
+    headers: Dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    ended = False
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("latin-1")
+        events.append((PART_BEGIN, name, _safe_filename(disposition.get(b"filename"), keep_paths)))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append((PART_DATA, data[start:end]))
+
+    def on_part_end():
+        events.append((PART_END,))
+
+    def on_end():
+        nonlocal ended
+        ended = True
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    })
+
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+
+    parser.finalize()
+    for event in events:
+        yield event
+
+    # The parser does not check this itself; a body cut short would
+    # otherwise look like a complete form with a truncated last part
+    if not ended:
+        raise MultipartStreamError("Multipart body ended before its closing boundary")
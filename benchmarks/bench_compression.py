@@ -0,0 +1,125 @@
+"""
+Compression policy benchmark: off vs. on vs. auto
+
+Downloads and uploads a compressible (log-like text) and an incompressible
+(random) payload with each transport compression policy, on an unlimited
+loopback link and on a link capped to --bandwidth, and reports throughput
+and encrypted bytes on the wire.
+
+In auto mode the connection first transfers a warm-up file so the policy
+has measured the link, as it would have after the first transfers of a
+real session.
+
+Usage:
+    python -m benchmarks.bench_compression [--size MB] [--bandwidth MBPS]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional
+from app.services.ssh_client import SSHClient
+from benchmarks.loopback_server import LoopbackSSHServer
+
+POLICIES = ("off", "on", "auto")
+
+
+def _compressible(size: int) -> bytes:
+    rng = random.Random(42)
+    lines = []
+    total = 0
+    while total < size:
+        line = json.dumps({
+            "ts": 1700000000 + total,
+            "level": rng.choice(["INFO", "INFO", "INFO", "WARNING", "ERROR"]),
+            "path": rng.choice(["/listFiles", "/getFile", "/uploadfile", "/status"]),
+            "status": rng.choice([200, 200, 200, 404, 500]),
+            "duration_ms": round(rng.random() * 250, 3),
+            "request_id": "%032x" % rng.getrandbits(128),
+        }) + "\n"
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def _run(
+    server: LoopbackSSHServer,
+    policy: str,
+    remote_dir: str,
+    local_dir: str,
+    name: str
+) -> Dict[str, float]:
+    client = SSHClient(server.host, server.port, server.username, server.password, compression=policy)
+    try:
+        if policy == "auto":
+            client.get_file(os.path.join(remote_dir, "warmup.bin"), local_dir)
+
+        results = {}
+        for direction in ("download", "upload"):
+            wire_before = server.bytes_sent + server.bytes_received
+            start = time.perf_counter()
+            if direction == "download":
+                ok = client.get_file(os.path.join(remote_dir, name), local_dir)
+            else:
+                ok = client.put(os.path.join(local_dir, name), os.path.join(remote_dir, "up-" + name))
+            elapsed = time.perf_counter() - start
+            if not ok:
+                raise RuntimeError(f"{direction} of {name} failed with policy {policy}")
+
+            size = os.path.getsize(os.path.join(remote_dir, name))
+            results[direction] = {
+                "mb_per_s": size / elapsed / 1e6,
+                "wire_mb": (server.bytes_sent + server.bytes_received - wire_before) / 1e6,
+                "compressed": client.compression_active,
+            }
+        return results
+    finally:
+        client.close()
+
+
+def _scenario(bandwidth: Optional[float], size: int, payloads: Dict[str, bytes]):
+    remote_dir = tempfile.mkdtemp(prefix="bench-remote-")
+    local_dir = tempfile.mkdtemp(prefix="bench-local-")
+    server = LoopbackSSHServer(bandwidth=bandwidth).start()
+    try:
+        with open(os.path.join(remote_dir, "warmup.bin"), "wb") as f:
+            f.write(os.urandom(min(size, 4 * 1024 * 1024)))
+        for name, data in payloads.items():
+            with open(os.path.join(remote_dir, name), "wb") as f:
+                f.write(data)
+
+        link = "unlimited" if not bandwidth else f"{bandwidth / 1e6:.0f} MB/s"
+        print(f"\nlink: {link}, payload: {size / 1e6:.0f} MB")
+        print(f"{'payload':<18}{'policy':<8}{'direction':<10}{'MB/s':>10}{'wire MB':>10}  compressed")
+        for name in payloads:
+            for policy in POLICIES:
+                for direction, result in _run(server, policy, remote_dir, local_dir, name).items():
+                    print(f"{name:<18}{policy:<8}{direction:<10}{result['mb_per_s']:>10.1f}"
+                          f"{result['wire_mb']:>10.1f}  {result['compressed']}")
+    finally:
+        server.stop()
+        shutil.rmtree(remote_dir, ignore_errors=True)
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=float, default=16, help="payload size in MB")
+    parser.add_argument("--bandwidth", type=float, default=5, help="capped link speed in MB/s")
+    args = parser.parse_args()
+
+    size = int(args.size * 1e6)
+    payloads = {
+        "compressible.log": _compressible(size),
+        "random.bin": os.urandom(size),
+    }
+
+    for bandwidth in (None, args.bandwidth * 1e6):
+        _scenario(bandwidth, size, payloads)
+
+
+if __name__ == "__main__":
+    main()
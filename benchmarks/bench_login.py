@@ -0,0 +1,84 @@
+"""
+Login cost benchmark: single transport vs. separate exec connection
+
+Measures how long SSHClient takes to connect and how many TCP connections
+(and therefore SSH handshakes and server-side sessions) each login needs,
+against the previous behaviour of opening a second paramiko.SSHClient for
+command execution.
+
+Usage:
+    python -m benchmarks.bench_login [--iterations N]
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List
+import paramiko
+from app.services.ssh_client import EnhancedTransport, SSHClient
+from app.services.transport_profile import get_profile
+from benchmarks.loopback_server import LoopbackSSHServer
+
+
+def _login_single(server: LoopbackSSHServer):
+    client = SSHClient(server.host, server.port, server.username, server.password)
+    client.get_df()
+    client.close()
+
+
+def _login_legacy(server: LoopbackSSHServer):
+    transport = EnhancedTransport((server.host, server.port), get_profile(ip=server.host, port=server.port))
+    transport.connect(username=server.username, password=server.password)
+    sftp = paramiko.SFTPClient.from_transport(transport)
+
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(server.host, server.port, server.username, server.password,
+                allow_agent=False, look_for_keys=False)
+    _, stdout, _ = ssh.exec_command("df -h")
+    stdout.read()
+
+    sftp.close()
+    transport.close()
+    ssh.close()
+
+
+def _measure(server: LoopbackSSHServer, login: Callable, iterations: int) -> Dict[str, float]:
+    timings: List[float] = []
+    connections_before = server.connections
+    for _ in range(iterations):
+        start = time.perf_counter()
+        login(server)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "connections_per_login": (server.connections - connections_before) / iterations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    server = LoopbackSSHServer().start()
+    try:
+        # Warm up key generation and imports
+        _login_single(server)
+
+        results = {
+            "legacy (sftp + exec connection)": _measure(server, _login_legacy, args.iterations),
+            "single transport": _measure(server, _login_single, args.iterations),
+        }
+    finally:
+        server.stop()
+
+    print(f"{'mode':<34}{'median ms':>12}{'mean ms':>12}{'conns/login':>14}")
+    for mode, result in results.items():
+        print(f"{mode:<34}{result['median_ms']:>12.1f}{result['mean_ms']:>12.1f}"
+              f"{result['connections_per_login']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
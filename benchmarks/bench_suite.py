@@ -0,0 +1,485 @@
+"""
+End-to-end benchmark suite against a loopback SFTP server
+
+Runs each scenario twice: once calling SSHClient directly and once through
+the FastAPI routes over real HTTP (uvicorn in a thread, httpx as client).
+For every run it reports throughput, per-operation p50/p99 latency and the
+peak of Python heap allocations. tracemalloc slows allocation-heavy code
+several times over, so the peak comes from a second, traced pass of the
+scenario; the loopback server runs in the same process and is included.
+The loopback link can be given extra round-trip latency and a bandwidth
+cap.
+
+Scenarios:
+    listing          list a directory of --entries files, bypassing caches
+    small-upload     upload --files small files one by one
+    small-download   download --files small files one by one
+    large-upload     upload a --size MB file
+    large-download   download a --size MB file
+    sessions         --sessions logins downloading the large file at once
+
+Results can be written as JSON (--json) and checked against an earlier
+run (--compare); the exit status is 1 if any throughput fell by more than
+--tolerance percent.
+
+Usage:
+    python -m benchmarks.bench_suite [--latency MS] [--bandwidth MBPS]
+        [--size MB] [--files N] [--entries N] [--repeat N] [--sessions N]
+        [--scenarios NAME,...] [--interfaces client,http] [--no-memory]
+        [--json FILE] [--compare FILE] [--tolerance PCT]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+import paramiko
+import uvicorn
+from app.config import get_settings
+from app.services.ssh_client import SSHClient
+from benchmarks.loopback_server import LoopbackSSHServer
+
+SCENARIOS = ("listing", "small-upload", "small-download", "large-upload", "large-download", "sessions")
+INTERFACES = ("client", "http")
+SMALL_FILE_SIZE = 4096
+
+# A run returns per-operation timings in seconds and the bytes it moved
+Timings = Tuple[List[float], int]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class _ApiServer:
+    """
+    The application served by uvicorn on a loopback port in a thread
+    """
+    def __init__(self):
+        # Imported late: importing main reads the config and creates the
+        # work directories
+        import main
+
+        # Keep the application's per-request logging out of the report
+        logging.getLogger("sftp_client").setLevel(logging.WARNING)
+        port = _free_port()
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(
+            main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=self.server.run, name="bench-api", daemon=True)
+
+    def start(self) -> "_ApiServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Suite:
+    """
+    Fixtures, connections and scenario runners for one benchmark run
+    """
+    def __init__(self, args: argparse.Namespace, server: LoopbackSSHServer, api: Optional[_ApiServer]):
+        self.args = args
+        self.server = server
+        self.api = api
+        self.remote_dir = tempfile.mkdtemp(prefix="bench-remote-")
+        self.local_dir = tempfile.mkdtemp(prefix="bench-local-")
+        self.large_size = int(args.size * 1e6)
+        self.client = SSHClient(server.host, server.port, "bench", server.password)
+        self.http = httpx.Client(base_url=api.url, timeout=None) if api else None
+        self._prepare()
+
+    def close(self):
+        self.client.close()
+        if self.http:
+            self.http.close()
+        shutil.rmtree(self.remote_dir, ignore_errors=True)
+        shutil.rmtree(self.local_dir, ignore_errors=True)
+
+    def _prepare(self):
+        listing_dir = os.path.join(self.remote_dir, "listing")
+        os.makedirs(listing_dir)
+        for index in range(self.args.entries):
+            open(os.path.join(listing_dir, f"entry-{index:06d}.dat"), "wb").close()
+
+        for base in (self.remote_dir, self.local_dir):
+            os.makedirs(os.path.join(base, "small"))
+            for index in range(self.args.files):
+                with open(os.path.join(base, "small", f"small-{index:05d}.bin"), "wb") as f:
+                    f.write(os.urandom(SMALL_FILE_SIZE))
+            with open(os.path.join(base, "large.bin"), "wb") as f:
+                for _ in range(0, self.large_size, 1 << 20):
+                    f.write(os.urandom(min(1 << 20, self.large_size - f.tell())))
+
+        os.makedirs(os.path.join(self.remote_dir, "uploads"))
+        os.makedirs(os.path.join(self.local_dir, "downloads"))
+
+        if self.http:
+            self._login("bench")
+
+    def _login(self, username: str):
+        response = self.http.post("/login", json={
+            "hostIp": self.server.host_ip, "username": username, "password": self.server.password
+        }).json()
+        if not response["status"]:
+            raise RuntimeError(f"Login as {username} failed: {response['msg']}")
+
+    def _params(self, username: str = "bench") -> Dict[str, str]:
+        return {"hostIp": self.server.host_ip, "username": username}
+
+    def _small_names(self) -> List[str]:
+        return sorted(os.listdir(os.path.join(self.local_dir, "small")))
+
+    # Scenario runners: one per (scenario, interface), each returning Timings
+
+    def listing_client(self) -> Timings:
+        path = os.path.join(self.remote_dir, "listing")
+        timings = []
+        for _ in range(self.args.repeat):
+            start = time.perf_counter()
+            entries = self.client.list_dir_entries(path, use_cache=False)
+            timings.append(time.perf_counter() - start)
+            assert len(entries) == self.args.entries
+        return timings, 0
+
+    def listing_http(self) -> Timings:
+        body = dict(self._params(), location=os.path.join(self.remote_dir, "listing"), refresh=True)
+        timings = []
+        for _ in range(self.args.repeat):
+            start = time.perf_counter()
+            response = self.http.post("/listFiles", json=body).json()
+            timings.append(time.perf_counter() - start)
+            assert len(response["data"]) == self.args.entries, response["msg"]
+        return timings, 0
+
+    def small_upload_client(self) -> Timings:
+        timings = []
+        for name in self._small_names():
+            start = time.perf_counter()
+            ok = self.client.put(
+                os.path.join(self.local_dir, "small", name), os.path.join(self.remote_dir, "uploads", name)
+            )
+            timings.append(time.perf_counter() - start)
+            assert ok
+        return timings, len(timings) * SMALL_FILE_SIZE
+
+    def small_upload_http(self) -> Timings:
+        headers = {"upload-params": json.dumps(dict(self._params(), location=os.path.join(self.remote_dir, "uploads")))}
+        timings = []
+        for name in self._small_names():
+            with open(os.path.join(self.local_dir, "small", name), "rb") as f:
+                start = time.perf_counter()
+                response = self.http.post("/uploadfile", headers=headers, files={"file": (name, f)}).json()
+                timings.append(time.perf_counter() - start)
+            assert response["status"], response["msg"]
+        return timings, len(timings) * SMALL_FILE_SIZE
+
+    def small_download_client(self) -> Timings:
+        timings = []
+        for name in self._small_names():
+            start = time.perf_counter()
+            self.client.fetch(
+                os.path.join(self.remote_dir, "small", name), os.path.join(self.local_dir, "downloads", name)
+            )
+            timings.append(time.perf_counter() - start)
+        return timings, len(timings) * SMALL_FILE_SIZE
+
+    def small_download_http(self) -> Timings:
+        timings = []
+        for name in self._small_names():
+            start = time.perf_counter()
+            response = self.http.get(
+                "/download", params=dict(self._params(), path=os.path.join(self.remote_dir, "small", name))
+            )
+            timings.append(time.perf_counter() - start)
+            assert len(response.content) == SMALL_FILE_SIZE
+        return timings, len(timings) * SMALL_FILE_SIZE
+
+    def large_upload_client(self) -> Timings:
+        timings = []
+        for _ in range(self.args.repeat):
+            start = time.perf_counter()
+            ok = self.client.put(
+                os.path.join(self.local_dir, "large.bin"), os.path.join(self.remote_dir, "uploads", "large.bin")
+            )
+            timings.append(time.perf_counter() - start)
+            assert ok
+        return timings, len(timings) * self.large_size
+
+    def large_upload_http(self) -> Timings:
+        headers = {"upload-params": json.dumps(dict(self._params(), location=os.path.join(self.remote_dir, "uploads")))}
+        timings = []
+        for _ in range(self.args.repeat):
+            with open(os.path.join(self.local_dir, "large.bin"), "rb") as f:
+                start = time.perf_counter()
+                response = self.http.post("/uploadfile", headers=headers, files={"file": ("large.bin", f)}).json()
+                timings.append(time.perf_counter() - start)
+            assert response["status"], response["msg"]
+        return timings, len(timings) * self.large_size
+
+    def large_download_client(self) -> Timings:
+        timings = []
+        for _ in range(self.args.repeat):
+            start = time.perf_counter()
+            size = self.client.fetch(
+                os.path.join(self.remote_dir, "large.bin"), os.path.join(self.local_dir, "downloads", "large.bin")
+            )
+            timings.append(time.perf_counter() - start)
+            assert size == self.large_size
+        return timings, len(timings) * self.large_size
+
+    def _stream_download(self, http: httpx.Client, username: str) -> float:
+        received = 0
+        start = time.perf_counter()
+        params = dict(self._params(username), path=os.path.join(self.remote_dir, "large.bin"))
+        with http.stream("GET", "/download", params=params) as response:
+            for block in response.iter_bytes():
+                received += len(block)
+        assert received == self.large_size
+        return time.perf_counter() - start
+
+    def large_download_http(self) -> Timings:
+        timings = [self._stream_download(self.http, "bench") for _ in range(self.args.repeat)]
+        return timings, len(timings) * self.large_size
+
+    def sessions_client(self) -> Timings:
+        clients = [
+            SSHClient(self.server.host, self.server.port, f"bench-{index}", self.server.password)
+            for index in range(self.args.sessions)
+        ]
+
+        def download(index: int) -> float:
+            start = time.perf_counter()
+            clients[index].fetch(
+                os.path.join(self.remote_dir, "large.bin"),
+                os.path.join(self.local_dir, "downloads", f"large-{index}.bin")
+            )
+            return time.perf_counter() - start
+
+        try:
+            return self._concurrently(download)
+        finally:
+            for client in clients:
+                client.close()
+
+    def sessions_http(self) -> Timings:
+        for index in range(self.args.sessions):
+            self._login(f"bench-{index}")
+
+        def download(index: int) -> float:
+            with httpx.Client(base_url=self.api.url, timeout=None) as http:
+                return self._stream_download(http, f"bench-{index}")
+
+        return self._concurrently(download)
+
+    def _concurrently(self, download: Callable[[int], float]) -> Timings:
+        """
+        Run one download per session at once; the scenario's elapsed time
+        is the wall time of the whole batch, set via self.wall_time
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.sessions) as pool:
+            timings = list(pool.map(download, range(self.args.sessions)))
+        self.wall_time = time.perf_counter() - start
+        return timings, len(timings) * self.large_size
+
+    def _peak_memory(self, runner: Callable[[], Timings]) -> float:
+        """
+        Run a scenario again under tracemalloc and return its peak in MB
+        """
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            runner()
+            return round((tracemalloc.get_traced_memory()[1] - baseline) / 1e6, 3)
+        finally:
+            tracemalloc.stop()
+
+    def run(self, scenario: str, interface: str, memory: bool = True) -> Dict[str, Any]:
+        """
+        Run one scenario on one interface and summarise it
+        """
+        runner = getattr(self, f"{scenario.replace('-', '_')}_{interface}")
+        self.wall_time = None
+        start = time.perf_counter()
+        timings, nbytes = runner()
+        elapsed = self.wall_time or time.perf_counter() - start
+
+        result = {
+            "scenario": scenario,
+            "interface": interface,
+            "ops": len(timings),
+            "bytes": nbytes,
+            "seconds": round(elapsed, 6),
+            "ops_per_s": round(len(timings) / elapsed, 3),
+            "mb_per_s": round(nbytes / elapsed / 1e6, 3) if nbytes else None,
+            "p50_ms": round(_percentile(timings, 50) * 1000, 3),
+            "p99_ms": round(_percentile(timings, 99) * 1000, 3),
+            "peak_mem_mb": self._peak_memory(runner) if memory else None,
+        }
+        return result
+
+
+def _metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    settings = get_settings()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "paramiko": paramiko.__version__,
+        "platform": platform.platform(),
+        "latency_ms": args.latency,
+        "bandwidth_mb_per_s": args.bandwidth,
+        "size_mb": args.size,
+        "files": args.files,
+        "entries": args.entries,
+        "repeat": args.repeat,
+        "sessions": args.sessions,
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "transfer_chunk_size", "transfer_pipeline_depth", "transfer_channels",
+                "transfer_parallel_threshold", "executor_max_workers", "max_ops_per_connection",
+                "compression",
+            )
+        },
+    }
+
+
+def _print_table(results: List[Dict[str, Any]]):
+    print(f"{'scenario':<16}{'interface':<10}{'ops':>6}{'MB/s':>10}{'ops/s':>10}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for result in results:
+        mb_per_s = f"{result['mb_per_s']:.1f}" if result["mb_per_s"] is not None else "-"
+        peak = f"{result['peak_mem_mb']:.1f}" if result["peak_mem_mb"] is not None else "-"
+        print(f"{result['scenario']:<16}{result['interface']:<10}{result['ops']:>6}{mb_per_s:>10}"
+              f"{result['ops_per_s']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{peak:>10}")
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    """
+    Print the change against a baseline run
+
+    Returns:
+        True if no throughput dropped by more than tolerance percent
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["interface"]): r for r in json.load(f)["results"]}
+
+    ok = True
+    print(f"\ncompared with {baseline_path}")
+    print(f"{'scenario':<16}{'interface':<10}{'throughput':>12}{'p99':>10}")
+    for result in results:
+        before = baseline.get((result["scenario"], result["interface"]))
+        if before is None:
+            continue
+        key = "mb_per_s" if result["mb_per_s"] is not None else "ops_per_s"
+        change = (result[key] / before[key] - 1) * 100 if before[key] else 0.0
+        p99_change = (result["p99_ms"] / before["p99_ms"] - 1) * 100 if before["p99_ms"] else 0.0
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"{result['scenario']:<16}{result['interface']:<10}{change:>+11.1f}%{p99_change:>+9.1f}%"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0, help="added round-trip latency in ms")
+    parser.add_argument("--bandwidth", type=float, default=None, help="link cap in MB/s per direction")
+    parser.add_argument("--size", type=float, default=64, help="large file size in MB")
+    parser.add_argument("--files", type=int, default=200, help="number of small files")
+    parser.add_argument("--entries", type=int, default=2000, help="entries in the listed directory")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of listing and large-file runs")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios")
+    parser.add_argument("--interfaces", default=",".join(INTERFACES), help="client, http or both")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced pass measuring memory")
+    parser.add_argument("--json", help="write results to this file ('-' for stdout)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=10, help="allowed throughput drop in percent")
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    interfaces = [name for name in args.interfaces.split(",") if name]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}")
+    for name in interfaces:
+        if name not in INTERFACES:
+            parser.error(f"unknown interface {name}")
+
+    server = LoopbackSSHServer(
+        bandwidth=args.bandwidth * 1e6 if args.bandwidth else None,
+        latency=args.latency / 1000,
+        any_user=True
+    ).start()
+    api = _ApiServer().start() if "http" in interfaces else None
+    suite = None
+    try:
+        suite = Suite(args, server, api)
+        results = []
+        for scenario in scenarios:
+            for interface in interfaces:
+                results.append(suite.run(scenario, interface, not args.no_memory))
+                print(f"finished {scenario} over {interface}", file=sys.stderr)
+    finally:
+        if suite:
+            suite.close()
+        if api:
+            api.stop()
+        server.stop()
+
+    report = {"meta": _metadata(args), "results": results}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        _print_table(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.compare and not _compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+"""
+Loopback SSH server with SFTP and exec support for local benchmarks
+
+The server serves the local filesystem over SFTP and runs exec requests
+through /bin/sh, so SSHClient can be exercised end to end without a remote
+host. It is meant for benchmarking only: there is no sandboxing and any
+password matching the configured one is accepted.
+"""
+import logging
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+from typing import List, Optional
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, SFTP_OK
+from paramiko.sftp import CMD_EXTENDED, SFTP_FAILURE
+
+
+def _entry_path(path: str) -> str:
+    """
+    Resolve a path's parent directory but not the entry itself, so that
+    operations on a symlink act on the link rather than its target
+    """
+    parent, name = os.path.split(path)
+    return os.path.join(os.path.realpath(parent or "."), name)
+
+
+class _LocalHandle(SFTPHandle):
+    """
+    SFTP file handle backed by a local file object
+    """
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            SFTPServer.set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class LocalSFTPServer(SFTPServerInterface):
+    """
+    SFTP server interface exposing the local filesystem
+    """
+    def list_folder(self, path):
+        path = os.path.realpath(path)
+        try:
+            entries = []
+            for name in os.listdir(path):
+                attr = SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)))
+                attr.filename = name
+                entries.append(attr)
+            return entries
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(os.path.realpath(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.lstat(_entry_path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        path = os.path.realpath(path)
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+        if (flags & os.O_CREAT) and attr is not None:
+            attr._flags &= ~attr.FLAG_PERMISSIONS
+            SFTPServer.set_file_attr(path, attr)
+
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+        handle = _LocalHandle(flags)
+        handle.filename = path
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(_entry_path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(_entry_path(oldpath), _entry_path(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        return self.rename(oldpath, newpath)
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(os.path.realpath(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(os.path.realpath(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            SFTPServer.set_file_attr(os.path.realpath(path), attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def readlink(self, path):
+        try:
+            return os.readlink(_entry_path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def symlink(self, target_path, path):
+        try:
+            os.symlink(target_path, _entry_path(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def canonicalize(self, path):
+        return os.path.realpath(path)
+
+
+class _LocalSFTPSubsystem(SFTPServer):
+    """
+    SFTP subsystem that also implements the copy-data extension, as the
+    OpenSSH sftp-server does since 9.0
+    """
+    def _process(self, t, request_number, msg):
+        if t == CMD_EXTENDED:
+            start = msg.packet.tell()
+            if msg.get_text() == "copy-data":
+                self._copy_data(request_number, msg)
+                return
+            msg.packet.seek(start)
+        super()._process(t, request_number, msg)
+
+    def _copy_data(self, request_number, msg):
+        source = self.file_table.get(msg.get_binary())
+        offset = msg.get_int64()
+        length = msg.get_int64()
+        target = self.file_table.get(msg.get_binary())
+        target_offset = msg.get_int64()
+        if source is None or target is None:
+            self._send_status(request_number, SFTP_FAILURE, "Invalid handle")
+            return
+
+        try:
+            source.readfile.flush()
+            target.writefile.flush()
+            read_fd, write_fd = source.readfile.fileno(), target.writefile.fileno()
+            remaining = length or None
+            while remaining is None or remaining > 0:
+                data = os.pread(read_fd, min(remaining or 1 << 20, 1 << 20), offset)
+                if not data:
+                    break
+                os.pwrite(write_fd, data, target_offset)
+                offset += len(data)
+                target_offset += len(data)
+                if remaining is not None:
+                    remaining -= len(data)
+        except OSError as e:
+            self._send_status(request_number, SFTPServer.convert_errno(e.errno))
+            return
+        self._send_status(request_number, SFTP_OK)
+
+
+class _PasswordServer(paramiko.ServerInterface):
+    """
+    Server interface accepting a single username/password pair, or any
+    username with the password when any_user is set
+    """
+    def __init__(self, username: str, password: str, any_user: bool = False):
+        self.username = username
+        self.password = password
+        self.any_user = any_user
+
+    def check_auth_password(self, username, password):
+        if (self.any_user or username == self.username) and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=_run_command, args=(channel, command), daemon=True).start()
+        return True
+
+    def check_global_request(self, kind, msg):
+        return True
+
+
+def _run_command(channel: paramiko.Channel, command: bytes):
+    """
+    Run an exec request locally, piping its output back to the channel
+    """
+    try:
+        process = subprocess.Popen(
+            command.decode(), shell=True,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+        def pump(source, send):
+            for block in iter(lambda: source.read1(32768), b""):
+                send(block)
+
+        stderr_thread = threading.Thread(target=pump, args=(process.stderr, channel.sendall_stderr))
+        stderr_thread.start()
+        pump(process.stdout, channel.sendall)
+        stderr_thread.join()
+        channel.send_exit_status(process.wait())
+    except Exception:
+        pass
+    finally:
+        channel.close()
+
+
+class _LastPacketCompressor:
+    """
+    Compress one more packet with an old compressor, then pass data through
+    """
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def __call__(self, data):
+        compressor, self.compressor = self.compressor, None
+        return data if compressor is None else compressor(data)
+
+
+class _ServerTransport(paramiko.Transport):
+    """
+    Server transport that can turn compression off again on rekey
+
+    paramiko keeps the previous compressor when a rekey negotiates "none",
+    and in server mode sends EXT_INFO right after NEWKEYS, so only NEWKEYS
+    may still go out compressed.
+    """
+    def _activate_outbound(self):
+        compressor = self.packetizer._Packetizer__compress_engine_out
+        if self.local_compression == "none" and compressor is not None:
+            self.packetizer.set_outbound_compressor(_LastPacketCompressor(compressor))
+        super()._activate_outbound()
+        if self.local_compression == "none":
+            self.packetizer.set_outbound_compressor(None)
+
+    def _activate_inbound(self):
+        super()._activate_inbound()
+        if self.remote_compression == "none":
+            self.packetizer.set_inbound_compressor(None)
+
+
+class _ShapedSocket:
+    """
+    Socket wrapper counting bytes and optionally capping bandwidth and
+    adding latency
+
+    The cap applies to each direction separately by delaying every send and
+    receive until the link would have carried the previous bytes. Latency
+    is added to the client-to-server direction only, which lengthens every
+    round trip by that much: a reader thread stamps data as it arrives and
+    recv() hands it over once it is old enough, so data in flight is not
+    limited by the delay.
+    """
+    def __init__(self, sock: socket.socket, server: "LoopbackSSHServer"):
+        self._sock = sock
+        self._server = server
+        self._free_at = {"send": 0.0, "recv": 0.0}
+        self._delayed: Optional[queue.Queue] = None
+        self._pending = b""
+        self._eof = False
+        if server.latency:
+            self._delayed = queue.Queue()
+            threading.Thread(target=self._delay_line, name="loopback-latency", daemon=True).start()
+
+    def _delay_line(self):
+        while True:
+            try:
+                data = self._sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                data = b""
+            self._delayed.put((time.monotonic() + self._server.latency, data))
+            if not data:
+                return
+
+    def _recv_delayed(self, size: int) -> bytes:
+        if not self._pending:
+            if self._eof:
+                return b""
+            try:
+                deliver_at, self._pending = self._delayed.get(timeout=self._sock.gettimeout())
+            except queue.Empty:
+                raise socket.timeout()
+            if not self._pending:
+                self._eof = True
+                return b""
+            delay = deliver_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def _shape(self, direction: str, nbytes: int):
+        if direction == "send":
+            self._server.bytes_sent += nbytes
+        else:
+            self._server.bytes_received += nbytes
+
+        bandwidth = self._server.bandwidth
+        if not bandwidth or nbytes <= 0:
+            return
+        now = time.monotonic()
+        free_at = max(now, self._free_at[direction]) + nbytes / bandwidth
+        self._free_at[direction] = free_at
+        if free_at > now:
+            time.sleep(free_at - now)
+
+    def send(self, data) -> int:
+        sent = self._sock.send(data)
+        self._shape("send", sent)
+        return sent
+
+    def recv(self, size: int) -> bytes:
+        data = self._sock.recv(size) if self._delayed is None else self._recv_delayed(size)
+        self._shape("recv", len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class LoopbackSSHServer:
+    """
+    Threaded SSH server listening on a loopback port
+
+    Every accepted connection is counted in ``connections`` so benchmarks can
+    report how many TCP connections and SSH handshakes a client needed, and
+    the encrypted bytes on the wire are counted in ``bytes_sent`` and
+    ``bytes_received``. ``bandwidth`` (bytes per second, None for unlimited)
+    emulates a slower link for each connection and direction, and
+    ``latency`` (seconds) is added to every round trip. With ``any_user``
+    every username is accepted, so one server can host many sessions.
+    """
+    def __init__(
+        self,
+        username: str = "bench",
+        password: str = "bench",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        bandwidth: Optional[float] = None,
+        latency: float = 0.0,
+        any_user: bool = False
+    ):
+        self.username = username
+        self.password = password
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.any_user = any_user
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.transports: List[paramiko.Transport] = []
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(128)
+        self.host, self.port = self.sock.getsockname()
+
+        self._thread = threading.Thread(target=self._serve, name="loopback-ssh", daemon=True)
+
+    @property
+    def host_ip(self) -> str:
+        """
+        Address in the hostname:port form used by the login API
+        """
+        return f"{self.host}:{self.port}"
+
+    def start(self) -> "LoopbackSSHServer":
+        # Clients closing their sockets are expected; keep the output readable
+        logging.getLogger("paramiko.transport").setLevel(logging.CRITICAL)
+        self._thread.start()
+        return self
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+
+            self.connections += 1
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = _ServerTransport(_ShapedSocket(conn, self))
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", _LocalSFTPSubsystem, LocalSFTPServer)
+            transport.use_compression()
+            self.transports.append(transport)
+
+            try:
+                transport.start_server(server=_PasswordServer(self.username, self.password, self.any_user))
+            except Exception:
+                pass
+
+    def stop(self):
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
@@ -10,7 +10,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 
 from app.config import get_settings
-from app.routes import auth, files, system
+from app.routes import auth, events, files, index, jobs, system, uploads
+from app.services.client_manager import client_manager
+from app.services.executor import shutdown_executor
+from app.services.metadata_index import index_manager
+from app.services.metrics import MetricsMiddleware, start_loop_monitor, stop_loop_monitor
+from app.services.transfer_jobs import transfer_scheduler
 from app.utils.logger import setup_logger
 
 # Initialize application
@@ -27,7 +32,8 @@ settings = get_settings()
 logger = setup_logger()
 
 # Initialize required directories
-for directory in [settings.tmp_path, settings.upload_tmp_path, settings.share_path]:
+for directory in [settings.tmp_path, settings.upload_tmp_path, settings.share_path, settings.index_path,
+                  settings.sync_path, settings.worker_socket_path]:
     if not os.path.exists(directory):
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
@@ -41,15 +47,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Record request latencies for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(files.router)
 app.include_router(system.router)
+app.include_router(uploads.router)
+app.include_router(jobs.router)
+app.include_router(events.router)
+app.include_router(index.router)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/share", StaticFiles(directory=settings.share_path), name="share")
 
+@app.on_event("startup")
+async def startup():
+    """
+    Start background maintenance of the connection pool and the
+    event-loop lag monitor
+    """
+    client_manager.start_maintenance()
+    start_loop_monitor()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Close remote connections and release worker threads on shutdown
+    """
+    stop_loop_monitor()
+    transfer_scheduler.shutdown()
+    index_manager.shutdown()
+    client_manager.cleanup()
+    shutdown_executor()
+
 # Root endpoint redirects to static HTML
 @app.get("/")
 async def root():
@@ -60,10 +93,16 @@ async def root():
 
 # Run the application
 if __name__ == "__main__":
-    logger.info(f"Starting Local SFTP Client on port {settings.port}")
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=settings.port,
-        access_log=False
-    )
\ No newline at end of file
+    if settings.workers > 1:
+        # Sessions are spread over worker processes behind a router
+        from app.services.session_router import serve
+        logger.info(f"Starting Local SFTP Client on port {settings.port} with {settings.workers} session workers")
+        serve()
+    else:
+        logger.info(f"Starting Local SFTP Client on port {settings.port}")
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=settings.port,
+            access_log=False
+        )
\ No newline at end of file
@@ -150,9 +150,10 @@ class ApiService {
      * List files in a directory
      * 
      * @param {string} location - Directory path
+     * @param {boolean} refresh - Bypass the server-side directory cache
      * @returns {Promise<Object>} Directory listing
      */
-    async listFiles(location) {
+    async listFiles(location, refresh = false) {
         if (!this.isConnected()) {
             return { status: false, msg: 'Not logged in', data: [{}] };
         }
@@ -162,7 +163,8 @@ class ApiService {
             body: JSON.stringify({
                 hostIp: this.connectionInfo.hostIp,
                 username: this.connectionInfo.username,
-                location: location
+                location: location,
+                refresh: refresh
             })
         });
     }
@@ -188,6 +190,75 @@ class ApiService {
         });
     }
 
+    /**
+     * Build a resumable download URL for a file
+     * 
+     * The GET endpoint honours Range/If-Range headers, so the browser's own
+     * download manager can stream, pause and resume the transfer.
+     * 
+     * @param {string} remotePath - Path to remote file
+     * @returns {string|null} Download URL, or null if not connected
+     */
+    getDownloadUrl(remotePath) {
+        if (!this.isConnected()) {
+            return null;
+        }
+        
+        const params = new URLSearchParams({
+            hostIp: this.connectionInfo.hostIp,
+            username: this.connectionInfo.username,
+            path: remotePath
+        });
+        
+        return `${this.baseUrl}/download?${params.toString()}`;
+    }
+
+    /**
+     * Build a URL streaming a directory as an archive
+     * 
+     * @param {string} remotePath - Path to remote directory
+     * @param {string} format - Archive format: 'zip', 'tar' or 'tgz'
+     * @returns {string|null} Download URL, or null if not connected
+     */
+    getArchiveUrl(remotePath, format = 'zip') {
+        if (!this.isConnected()) {
+            return null;
+        }
+        
+        const params = new URLSearchParams({
+            hostIp: this.connectionInfo.hostIp,
+            username: this.connectionInfo.username,
+            path: remotePath,
+            format: format
+        });
+        
+        return `${this.baseUrl}/downloadDir?${params.toString()}`;
+    }
+
+    /**
+     * Open the live event stream of the current session
+     * 
+     * @param {Object} handlers - Callbacks keyed by event type ('job',
+     *     'upload', 'dir', 'overflow'), each receiving the parsed event data
+     * @returns {EventSource|null} Open stream (call close() to stop), or null if not connected
+     */
+    subscribeEvents(handlers) {
+        if (!this.isConnected() || typeof EventSource === 'undefined') {
+            return null;
+        }
+        
+        const params = new URLSearchParams({
+            hostIp: this.connectionInfo.hostIp,
+            username: this.connectionInfo.username
+        });
+        
+        const source = new EventSource(`${this.baseUrl}/events?${params.toString()}`);
+        for (const [type, handler] of Object.entries(handlers)) {
+            source.addEventListener(type, event => handler(JSON.parse(event.data)));
+        }
+        return source;
+    }
+
     /**
      * Upload a file
      * 
@@ -219,6 +290,143 @@ class ApiService {
         });
     }
 
+    /**
+     * Upload many files in one request
+     * 
+     * Each file is sent under its path relative to the destination
+     * (webkitRelativePath for folder uploads), after a manifest of all
+     * paths so the server can create the directories up front.
+     * 
+     * @param {File[]} files - Files to upload
+     * @param {string} location - Destination directory
+     * @returns {Promise<Object>} Upload response with per-file results
+     */
+    async uploadFiles(files, location) {
+        if (!this.isConnected()) {
+            return { status: false, msg: 'Not logged in', data: {} };
+        }
+        
+        const paths = files.map(file => file.webkitRelativePath || file.name);
+        const formData = new FormData();
+        formData.append('manifest', JSON.stringify(paths));
+        files.forEach((file, i) => formData.append('file', file, paths[i]));
+        
+        const uploadParams = {
+            hostIp: this.connectionInfo.hostIp,
+            username: this.connectionInfo.username,
+            location: location
+        };
+        
+        return await this.request('/uploadBatch', {
+            method: 'POST',
+            headers: {
+                'upload-params': JSON.stringify(uploadParams)
+            },
+            body: formData
+        });
+    }
+
+    /**
+     * Upload a file in resumable chunks
+     * 
+     * Chunks are sent in parallel and written straight to the remote file at
+     * their offsets. The upload id is remembered in localStorage so that an
+     * interrupted upload of the same file resumes with only the missing
+     * ranges.
+     * 
+     * @param {File} file - File to upload
+     * @param {string} location - Destination directory
+     * @param {Object} options - Optional settings
+     * @param {number} options.parallel - Number of chunks in flight (default 4)
+     * @param {Function} options.onProgress - Called with (bytesSent, totalBytes)
+     * @returns {Promise<Object>} Upload response
+     */
+    async uploadFileChunked(file, location, options = {}) {
+        if (!this.isConnected()) {
+            return { status: false, msg: 'Not logged in', data: {} };
+        }
+        
+        const parallel = options.parallel || 4;
+        const onProgress = options.onProgress || (() => {});
+        const resumeKey = `upload:${this.connectionInfo.hostIp}:${this.connectionInfo.username}:` +
+            `${location}:${file.name}:${file.size}:${file.lastModified}`;
+        
+        // Resume a previous upload of the same file if the server still knows it
+        let state = null;
+        const previousId = localStorage.getItem(resumeKey);
+        if (previousId) {
+            const response = await this.request(`/upload/${previousId}`, { method: 'GET' });
+            if (response.status) {
+                state = response.data;
+            }
+        }
+        
+        if (!state) {
+            const response = await this.request('/upload/init', {
+                method: 'POST',
+                body: JSON.stringify({
+                    hostIp: this.connectionInfo.hostIp,
+                    username: this.connectionInfo.username,
+                    location: location,
+                    fileName: file.name,
+                    size: file.size
+                })
+            });
+            if (!response.status) {
+                return response;
+            }
+            state = response.data;
+            localStorage.setItem(resumeKey, state.uploadId);
+        }
+        
+        // Split the missing ranges into chunk-sized pieces
+        const queue = [];
+        for (const [start, end] of state.missing) {
+            for (let offset = start; offset < end; offset += state.chunkSize) {
+                queue.push([offset, Math.min(offset + state.chunkSize, end)]);
+            }
+        }
+        
+        let bytesSent = state.bytesReceived;
+        let failure = null;
+        onProgress(bytesSent, file.size);
+        
+        const sendChunk = async ([start, end]) => {
+            for (let attempt = 0; attempt < 3; attempt++) {
+                const response = await this.request(`/upload/${state.uploadId}?offset=${start}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(start, end)
+                });
+                if (response.status) {
+                    bytesSent += end - start;
+                    onProgress(bytesSent, file.size);
+                    return;
+                }
+                failure = response;
+            }
+            throw new Error(failure.msg || 'Chunk upload failed');
+        };
+        
+        const worker = async () => {
+            while (queue.length && !failure) {
+                await sendChunk(queue.shift());
+            }
+        };
+        
+        try {
+            await Promise.all(Array.from({ length: Math.min(parallel, queue.length) }, worker));
+        } catch (error) {
+            return { status: false, msg: error.message, data: {} };
+        }
+        
+        const response = await this.request(`/upload/${state.uploadId}/finalize`, { method: 'POST' });
+        if (response.status) {
+            localStorage.removeItem(resumeKey);
+        }
+        return response;
+    }
+
     /**
      * Create a new directory
      * 
@@ -284,6 +492,79 @@ class ApiService {
         });
     }
 
+    /**
+     * Copy a file or directory on the server
+     * 
+     * @param {string} oldPath - Source path
+     * @param {string} newPath - Destination path (must not exist)
+     * @returns {Promise<Object>} Copy response with the method used
+     */
+    async copy(oldPath, newPath) {
+        if (!this.isConnected()) {
+            return { status: false, msg: 'Not logged in', data: {} };
+        }
+        
+        return await this.request('/copy', {
+            method: 'POST',
+            body: JSON.stringify({
+                hostIp: this.connectionInfo.hostIp,
+                username: this.connectionInfo.username,
+                oldPath: oldPath,
+                newPath: newPath
+            })
+        });
+    }
+
+    /**
+     * Move a file or directory, also across filesystems
+     * 
+     * @param {string} oldPath - Source path
+     * @param {string} newPath - Destination path (must not exist)
+     * @returns {Promise<Object>} Move response with the method used
+     */
+    async move(oldPath, newPath) {
+        if (!this.isConnected()) {
+            return { status: false, msg: 'Not logged in', data: {} };
+        }
+        
+        return await this.request('/move', {
+            method: 'POST',
+            body: JSON.stringify({
+                hostIp: this.connectionInfo.hostIp,
+                username: this.connectionInfo.username,
+                oldPath: oldPath,
+                newPath: newPath
+            })
+        });
+    }
+
+    /**
+     * Transfer a file from the current host to another logged-in host
+     *
+     * @param {string} path - Source file path
+     * @param {string} destHostIp - Destination host
+     * @param {string} destUsername - Destination username
+     * @param {string} destPath - Destination file path or existing directory
+     * @returns {Promise<Object>} Transfer response with the bytes transferred
+     */
+    async transfer(path, destHostIp, destUsername, destPath) {
+        if (!this.isConnected()) {
+            return { status: false, msg: 'Not logged in', data: {} };
+        }
+
+        return await this.request('/transfer', {
+            method: 'POST',
+            body: JSON.stringify({
+                hostIp: this.connectionInfo.hostIp,
+                username: this.connectionInfo.username,
+                path: path,
+                destHostIp: destHostIp,
+                destUsername: destUsername,
+                destPath: destPath
+            })
+        });
+    }
+
     /**
      * Get disk usage information
      * 
@@ -2,6 +2,12 @@
  * Main application controller for the SFTP client
  */
 
+// Files larger than this are uploaded with the resumable chunked protocol
+const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+
+// Directory change notices arriving this soon after a reload are already shown
+const CHANGE_REFRESH_GRACE_MS = 1000;
+
 /**
  * SFTP Client application
  */
@@ -16,6 +22,9 @@ class SftpClientApp {
         this.api = apiService;
         this.ui = uiService;
         this.currentPath = '/';
+        this.events = null;
+        this.lastRefresh = 0;
+        this.refreshTimer = null;
         
         // Event handlers (bind to keep 'this' context)
         this.handlers = {
@@ -24,7 +33,9 @@ class SftpClientApp {
             navigateTo: this.navigateTo.bind(this),
             createNewFolder: this.createNewFolder.bind(this),
             refreshFileList: this.refreshFileList.bind(this),
+            forceRefresh: () => this.refreshFileList(true),
             downloadFile: this.downloadFile.bind(this),
+            downloadFolder: this.downloadFolder.bind(this),
             deleteFile: this.deleteFile.bind(this),
             uploadFile: this.uploadFile.bind(this)
         };
@@ -67,6 +78,7 @@ class SftpClientApp {
                 // Initialize file listing
                 this.currentPath = '/';
                 await this.refreshFileList();
+                this.startEvents();
                 
                 // Get disk usage (optional)
                 this.api.getDiskUsage();
@@ -79,10 +91,65 @@ class SftpClientApp {
         }
     }
 
+    /**
+     * Follow changes pushed by the server instead of polling
+     */
+    startEvents() {
+        if (this.events) {
+            this.events.close();
+        }
+        
+        this.events = this.api.subscribeEvents({
+            dir: change => {
+                const path = this.currentPath;
+                const affected = change.path === path
+                    || (change.recursive && path.startsWith(change.path.replace(/\/$/, '') + '/'));
+                if (affected) {
+                    this.scheduleRefresh();
+                }
+            },
+            overflow: () => this.scheduleRefresh(),
+            job: job => this.showJobProgress(job)
+        });
+    }
+
+    /**
+     * Reload the listing once a burst of change notices has settled
+     */
+    scheduleRefresh() {
+        clearTimeout(this.refreshTimer);
+        this.refreshTimer = setTimeout(() => {
+            if (Date.now() - this.lastRefresh > CHANGE_REFRESH_GRACE_MS) {
+                this.refreshFileList();
+            }
+        }, 250);
+    }
+
+    /**
+     * Show the progress of a background transfer job in the status bar
+     * 
+     * @param {Object} job - Job state pushed by the server
+     */
+    showJobProgress(job) {
+        const name = job.source.path.split('/').pop();
+        if (job.status === 'running') {
+            const percent = job.size ? Math.floor((job.transferred / job.size) * 100) : 100;
+            const rate = formatFileSize(job.bytesPerSecond);
+            const eta = job.etaSeconds !== null ? `, ${Math.ceil(job.etaSeconds)}s left` : '';
+            this.ui.showStatus(`Transferring ${name}: ${percent}% (${rate}/s${eta})`);
+        } else if (job.status === 'completed') {
+            this.ui.showStatus(`Transferred ${name} successfully`, 'success');
+        } else if (job.status === 'failed') {
+            this.ui.showStatus(`Transfer of ${name} failed: ${job.error}`, 'error');
+        }
+    }
+
     /**
      * Refresh file listing
+     * 
+     * @param {boolean} force - Re-read the directory instead of using the server cache
      */
-    async refreshFileList() {
+    async refreshFileList(force = false) {
         if (!this.api.isConnected()) {
             this.ui.showStatus('Not connected to any server', 'error');
             return;
@@ -95,7 +162,8 @@ class SftpClientApp {
             this.ui.showStatus(`Loading files from ${this.currentPath}...`);
             
             // Call API
-            const response = await this.api.listFiles(this.currentPath);
+            const response = await this.api.listFiles(this.currentPath, force === true);
+            this.lastRefresh = Date.now();
             
             // Always hide loading state, regardless of response
             this.ui.setButtonLoading('refreshBtn', false);
@@ -210,6 +278,9 @@ class SftpClientApp {
     /**
      * Download a file
      * 
+     * The browser fetches the file directly from the resumable download
+     * endpoint, so it is streamed to disk instead of buffered in a Blob.
+     * 
      * @param {string} path - Path to file
      * @param {Event} event - Click event
      */
@@ -222,58 +293,44 @@ class SftpClientApp {
         // Extract filename from path
         const filename = path.split('/').pop();
         
-        // Get the button element from event if provided
-        let downloadBtn = null;
-        if (event && event.currentTarget) {
-            downloadBtn = event.currentTarget;
-            const originalHTML = downloadBtn.innerHTML;
-            downloadBtn.innerHTML = '<div class="loader"></div>';
-            downloadBtn.disabled = true;
+        // Create a temporary link to download the file
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = this.api.getDownloadUrl(path);
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        this.ui.showStatus(`Download of ${filename} started`, 'success');
+    }
+
+    /**
+     * Download a directory as a zip archive
+     * 
+     * The archive is built while it is streamed, so the download starts
+     * immediately and its total size is not known in advance.
+     * 
+     * @param {string} path - Path to directory
+     * @param {Event} event - Click event
+     */
+    async downloadFolder(path, event) {
+        if (!this.api.isConnected()) {
+            this.ui.showStatus('Not connected to any server', 'error');
+            return;
         }
         
-        this.ui.showStatus(`Downloading ${filename}...`);
+        const filename = (path.replace(/\/+$/, '').split('/').pop() || 'root') + '.zip';
         
-        try {
-            // Call API
-            const response = await this.api.getFile(path);
-            
-            // Restore button if provided
-            if (downloadBtn) {
-                downloadBtn.innerHTML = '<i class="fas fa-download"></i>';
-                downloadBtn.disabled = false;
-            }
-            
-            if (response instanceof Response) {
-                // Handle successful file download
-                const blob = await response.blob();
-                const url = window.URL.createObjectURL(blob);
-                
-                // Create a temporary link to download the file
-                const a = document.createElement('a');
-                a.style.display = 'none';
-                a.href = url;
-                a.download = filename;
-                document.body.appendChild(a);
-                a.click();
-                
-                // Clean up
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
-                
-                this.ui.showStatus(`Downloaded ${filename} successfully`, 'success');
-            } else {
-                // Handle error response
-                this.ui.showStatus(`Download failed: ${response.msg}`, 'error');
-            }
-        } catch (error) {
-            // Restore button if provided
-            if (downloadBtn) {
-                downloadBtn.innerHTML = '<i class="fas fa-download"></i>';
-                downloadBtn.disabled = false;
-            }
-            
-            this.ui.showStatus(`Error: ${error.message}`, 'error');
-        }
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = this.api.getArchiveUrl(path, 'zip');
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        
+        this.ui.showStatus(`Download of ${filename} started`, 'success');
     }
 
     /**
@@ -331,7 +388,7 @@ class SftpClientApp {
     }
 
     /**
-     * Upload a file
+     * Upload the selected file, files or folder
      */
     async uploadFile() {
         if (!this.api.isConnected()) {
@@ -339,21 +396,40 @@ class SftpClientApp {
             return;
         }
         
-        const fileInput = this.ui.elements.fileUpload;
-        if (!fileInput.files.length) {
+        const files = [
+            ...this.ui.elements.fileUpload.files,
+            ...this.ui.elements.folderUpload.files
+        ];
+        if (!files.length) {
             this.ui.showStatus('Please select a file to upload', 'error');
             return;
         }
         
-        const file = fileInput.files[0];
+        if (files.length > 1 || files[0].webkitRelativePath) {
+            await this.uploadFiles(files);
+            return;
+        }
+        
+        const file = files[0];
         
         try {
             // Show loading state
             this.ui.setButtonLoading('uploadBtn', true);
             this.ui.showStatus(`Uploading ${file.name} to ${this.currentPath}...`);
             
-            // Call API
-            const response = await this.api.uploadFile(file, this.currentPath);
+            // Large files use the resumable chunked protocol
+            let lastPercent = -1;
+            const response = file.size > CHUNKED_UPLOAD_THRESHOLD
+                ? await this.api.uploadFileChunked(file, this.currentPath, {
+                    onProgress: (sent, total) => {
+                        const percent = Math.floor((sent / total) * 10) * 10;
+                        if (percent !== lastPercent) {
+                            lastPercent = percent;
+                            this.ui.showStatus(`Uploading ${file.name}: ${percent}%`);
+                        }
+                    }
+                })
+                : await this.api.uploadFile(file, this.currentPath);
             
             // Hide loading state
             this.ui.setButtonLoading('uploadBtn', false);
@@ -370,6 +446,35 @@ class SftpClientApp {
             this.ui.showStatus(`Error: ${error.message}`, 'error');
         }
     }
+
+    /**
+     * Upload several files or a folder with one batch request
+     * 
+     * @param {File[]} files - Selected files
+     */
+    async uploadFiles(files) {
+        try {
+            this.ui.setButtonLoading('uploadBtn', true);
+            this.ui.showStatus(`Uploading ${files.length} files to ${this.currentPath}...`);
+            
+            const response = await this.api.uploadFiles(files, this.currentPath);
+            
+            this.ui.setButtonLoading('uploadBtn', false);
+            
+            if (response.status) {
+                this.ui.showStatus(`Uploaded ${response.data.uploaded} files successfully`, 'success');
+            } else {
+                const failed = (response.data.results || []).filter(r => r.status === 'error');
+                const details = failed.slice(0, 3).map(r => `${r.path}: ${r.error}`).join('; ');
+                this.ui.showStatus(`Upload failed: ${response.msg}${details ? ` (${details})` : ''}`, 'error');
+            }
+            this.ui.resetForms();
+            await this.refreshFileList();
+        } catch (error) {
+            this.ui.setButtonLoading('uploadBtn', false);
+            this.ui.showStatus(`Error: ${error.message}`, 'error');
+        }
+    }
 }
 
 // Initialize the application when DOM is loaded
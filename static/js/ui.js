@@ -21,6 +21,7 @@ class UiService {
             currentPath: document.getElementById('currentPath'),
             uploadForm: document.getElementById('uploadForm'),
             fileUpload: document.getElementById('fileUpload'),
+            folderUpload: document.getElementById('folderUpload'),
             connectionStatus: document.getElementById('connectionStatus'),
             statusArea: document.getElementById('statusArea'),
             dirStats: document.getElementById('dirStats'),
@@ -42,7 +43,7 @@ class UiService {
         // Navigation
         this.elements.upDirBtn.addEventListener('click', handlers.navigateUp);
         this.elements.newFolderBtn.addEventListener('click', handlers.createNewFolder);
-        this.elements.refreshBtn.addEventListener('click', handlers.refreshFileList);
+        this.elements.refreshBtn.addEventListener('click', handlers.forceRefresh);
         
         // Upload
         this.elements.uploadForm.addEventListener('submit', (e) => {
@@ -147,11 +148,9 @@ class UiService {
                     </div>
                 </div>
                 <div class="item-actions">
-                    ${file.type === 'file' ? `
-                        <button class="btn btn-secondary download-btn">
-                            <i class="fas fa-download"></i>
-                        </button>
-                    ` : ''}
+                    <button class="btn btn-secondary download-btn">
+                        <i class="fas ${file.type === 'dir' ? 'fa-file-archive' : 'fa-download'}"></i>
+                    </button>
                     <button class="btn btn-danger delete-btn">
                         <i class="fas fa-trash-alt"></i>
                     </button>
@@ -167,12 +166,14 @@ class UiService {
                 });
             }
             
-            if (file.type === 'file') {
-                fileItem.querySelector('.download-btn').addEventListener('click', (e) => {
-                    e.stopPropagation();
+            fileItem.querySelector('.download-btn').addEventListener('click', (e) => {
+                e.stopPropagation();
+                if (file.type === 'dir') {
+                    handlers.downloadFolder(file.path);
+                } else {
                     handlers.downloadFile(file.path);
-                });
-            }
+                }
+            });
             
             fileItem.querySelector('.delete-btn').addEventListener('click', (e) => {
                 e.stopPropagation();
@@ -256,6 +257,7 @@ class UiService {
      */
     resetForms() {
         this.elements.fileUpload.value = '';
+        this.elements.folderUpload.value = '';
     }
 
     /**
@@ -0,0 +1,57 @@
+import pytest
+
+from app.utils.http_range import (
+    MAX_RANGES, RangeNotSatisfiable, if_range_matches, make_etag, make_last_modified, parse_range_header
+)
+
+ETAG = make_etag(1000, 1700000000)
+LAST_MODIFIED = make_last_modified(1700000000)
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-9", "bytes=", "bytes=abc", "bytes=5", "bytes=9-3"])
+def test_full_response_for_missing_or_malformed_header(header):
+    assert parse_range_header(header, 1000) is None
+
+
+def test_single_and_open_ended_ranges():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=900-5000", 1000) == [(900, 999)]
+
+
+def test_suffix_ranges():
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 999)]
+    assert parse_range_header("bytes=-0, 0-0", 1000) == [(0, 0)]
+
+
+def test_overlapping_ranges_are_kept_in_request_order():
+    assert parse_range_header("bytes=500-599, 0-99, 50-149", 1000) == [(500, 599), (0, 99), (50, 149)]
+
+
+def test_ranges_outside_the_resource_are_dropped():
+    assert parse_range_header("bytes=0-9, 2000-2100", 1000) == [(0, 9)]
+
+
+def test_unsatisfiable_ranges():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-1999", 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=-0", 1000)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=0-", 0)
+
+
+def test_too_many_ranges_serve_the_full_resource():
+    allowed = ",".join(f"{index * 10}-{index * 10 + 4}" for index in range(MAX_RANGES))
+    assert len(parse_range_header(f"bytes={allowed}", 1000)) == MAX_RANGES
+    assert parse_range_header(f"bytes={allowed},900-909", 1000) is None
+
+
+def test_if_range_matches():
+    assert if_range_matches(None, ETAG, LAST_MODIFIED)
+    assert if_range_matches(ETAG, ETAG, LAST_MODIFIED)
+    assert if_range_matches(f" {LAST_MODIFIED} ", ETAG, LAST_MODIFIED)
+    assert not if_range_matches(make_etag(1001, 1700000000), ETAG, LAST_MODIFIED)
+    assert not if_range_matches(f"W/{ETAG}", ETAG, LAST_MODIFIED)
+    assert not if_range_matches(make_last_modified(1600000000), ETAG, LAST_MODIFIED)
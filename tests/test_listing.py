@@ -0,0 +1,69 @@
+import pytest
+
+from app.services.listing import DirEntry, InvalidCursor, ListingQuery, encode_cursor, paginate
+
+ENTRIES = [
+    DirEntry(f"file{index:02d}", f"/data/file{index:02d}", size, 1700000000 + index, False)
+    for index, size in enumerate([30, 10, 20, 10, 50, 40, 10])
+] + [DirEntry("logs", "/data/logs", 0, 1700000100, True)]
+
+
+def names(entries):
+    return [entry.name for entry in entries]
+
+
+def collect(query, limit):
+    pages = []
+    cursor = None
+    while True:
+        page, cursor, total = paginate(ENTRIES, query, cursor, limit)
+        pages.append(names(page))
+        if cursor is None:
+            return pages, total
+
+
+def test_first_page_without_cursor():
+    page, cursor, total = paginate(ENTRIES, ListingQuery(), None, 3)
+    assert names(page) == ["file00", "file01", "file02"]
+    assert cursor is not None
+    assert total == len(ENTRIES)
+
+
+def test_cursors_walk_every_entry_once():
+    pages, total = collect(ListingQuery(), 3)
+    assert pages == [["file00", "file01", "file02"], ["file03", "file04", "file05"], ["file06", "logs"]]
+    assert total == 8
+
+
+def test_size_order_breaks_ties_by_name():
+    pages, _ = collect(ListingQuery(sort_by="size", file_type="file"), 2)
+    assert pages == [["file01", "file03"], ["file06", "file02"], ["file00", "file05"], ["file04"]]
+
+
+def test_descending_cursors():
+    pages, _ = collect(ListingQuery(sort_by="mtime", descending=True), 4)
+    assert pages == [["logs", "file06", "file05", "file04"], ["file03", "file02", "file01", "file00"]]
+
+
+def test_cursor_survives_removed_entry():
+    page, cursor, _ = paginate(ENTRIES, ListingQuery(), None, 2)
+    remaining = [entry for entry in ENTRIES if entry.name != "file02"]
+    page, _, _ = paginate(remaining, ListingQuery(), cursor, 2)
+    assert names(page) == ["file03", "file04"]
+
+
+def test_cursor_past_the_end_returns_empty_page():
+    page, cursor, total = paginate(ENTRIES, ListingQuery(), encode_cursor(("zzz",)), 3)
+    assert page == [] and cursor is None and total == 8
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", encode_cursor(("file03",))[:-2]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        paginate(ENTRIES, ListingQuery(), cursor, 3)
+
+
+def test_cursor_from_another_sort_order():
+    _, cursor, _ = paginate(ENTRIES, ListingQuery(), None, 3)
+    with pytest.raises(InvalidCursor):
+        paginate(ENTRIES, ListingQuery(sort_by="size"), cursor, 3)
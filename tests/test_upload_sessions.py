@@ -0,0 +1,46 @@
+from app.services.upload_sessions import UploadSession
+
+
+def make_session(size=100):
+    return UploadSession("127.0.0.1", "user", "/tmp/file.bin", size)
+
+
+def test_new_session_is_missing_everything():
+    session = make_session()
+    assert session.received_ranges() == []
+    assert session.missing_ranges() == [[0, 100]]
+    assert not session.is_complete()
+
+
+def test_overlapping_and_adjacent_ranges_merge():
+    session = make_session()
+    session.add_range(40, 20)
+    session.add_range(0, 10)
+    session.add_range(50, 20)
+    session.add_range(10, 5)
+    assert session.received_ranges() == [[0, 15], [40, 70]]
+    assert session.missing_ranges() == [[15, 40], [70, 100]]
+
+
+def test_range_covering_others_replaces_them():
+    session = make_session()
+    session.add_range(10, 5)
+    session.add_range(30, 5)
+    session.add_range(0, 50)
+    assert session.received_ranges() == [[0, 50]]
+
+
+def test_empty_ranges_are_ignored():
+    session = make_session()
+    session.add_range(10, 0)
+    session.add_range(10, -5)
+    assert session.received_ranges() == []
+
+
+def test_complete_once_every_byte_arrives():
+    session = make_session()
+    for offset in (75, 25, 50, 0):
+        session.add_range(offset, 25)
+    assert session.is_complete()
+    assert session.to_dict()["bytesReceived"] == 100
+    assert session.to_dict()["missing"] == []
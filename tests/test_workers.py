@@ -0,0 +1,40 @@
+from collections import Counter
+
+from app.services import workers
+from app.services.workers import HashRing, connection_key, id_owner
+
+KEYS = [connection_key(f"10.0.{index // 256}.{index % 256}", "deploy") for index in range(4000)]
+
+
+def test_owner_is_deterministic_across_rings():
+    first, second = HashRing(4), HashRing(4)
+    assert [first.owner(key) for key in KEYS] == [second.owner(key) for key in KEYS]
+
+
+def test_single_worker_owns_everything():
+    ring = HashRing(1)
+    assert {ring.owner(key) for key in KEYS} == {0}
+
+
+def test_keys_spread_over_all_workers():
+    counts = Counter(HashRing(4).owner(key) for key in KEYS)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(KEYS) / 4 * 0.6
+
+
+def test_adding_a_worker_only_moves_keys_to_it():
+    before, after = HashRing(4), HashRing(5)
+    moved = [key for key in KEYS if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == 4 for key in moved)
+    assert len(moved) < len(KEYS) / 3
+
+
+def test_id_owner(monkeypatch):
+    assert id_owner("w3-0123abcd") == 3
+    assert id_owner("0123abcd") is None
+    assert id_owner("w3-XYZ") is None
+
+    monkeypatch.setattr(workers, "WORKER_INDEX", 2)
+    assert id_owner(workers.new_id()) == 2
+    monkeypatch.setattr(workers, "WORKER_INDEX", None)
+    assert id_owner(workers.new_id()) is None